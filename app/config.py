@@ -1,3 +1,6 @@
+from contextlib import contextmanager
+from typing import Optional
+
 from loguru import logger
 
 
@@ -10,11 +13,65 @@ class DefaultConfig:
     crossover_type = "single_point"
     mutation_type = "random"
     parent_selection_type = "sss"
+    workers = 1  # acima de 1, a população é avaliada em um pool com esse número de processos
+    random_seed = None
+    fitness_batch_size = None  # indivíduos decodificados por chamada de fitness; None usa a população inteira
+    fitness_cache_size = 10_000  # genomas memorizados (LRU); 0 desativa o cache de fitness
+    fitness_cache_persist = True  # mantém o cache de fitness entre execuções do otimizador no mesmo processo
+    fitness_cache_path = None  # arquivo para salvar/carregar o cache de fitness entre processos
+    # estados salvos por decodificação para retomar genomas com o mesmo prefixo; 0 desativa. Cada estado é uma cópia
+    # do cache e das estruturas do decodificador, então a memória cresce com a instância: ligue só quando couber
+    decoder_checkpoints = 0
+    decoder_trie_size = 2_000  # estados mantidos na trie de prefixos
+    incremental_punishment = True  # soma a punição de cada sala ao registrar agendamentos (relativa ao zero_time)
+    time_budget = None  # segundos de relógio para o otimizador; None roda todas as `num_generations`
+    stall_generations = None  # para depois dessas gerações seguidas sem melhorar a melhor punição; None desativa
+    stop_at_lower_bound = True  # para quando a melhor punição atinge o limite inferior (SPT) da instância
+    seed_ratio = 0.2  # fração da população inicial trocada por genomas heurísticos (ver `seeding.HEURISTICS`)
+    warm_start = False  # `main` parte do plano salvo no banco em vez de otimizar do zero
+    warm_start_generations = 10  # gerações de uma reotimização com warm start
+    warm_start_time_budget = 10  # segundos de relógio de uma reotimização com warm start
+    reschedule_exhaustive_limit = 256  # genomas de um reagendamento avaliados todos, sem algoritmo genético
+    reschedule_time_budget = 0.3  # segundos de relógio de um reagendamento até o fim da busca (ver `reschedule`)
+    reschedule_window = 120  # minutos, depois do trecho atingido, em que um reagendamento mexe no plano; None: todo
+    decompose = True  # otimiza separadamente os componentes independentes da instância (ver `Solver.components`)
+    islands = 1  # acima de 1, `main` usa o `IslandOptimizer` com esse número de populações
+    migration_interval = 5  # gerações de cada época das ilhas, entre duas migrações
+    migrants = 2  # genomas que cada ilha envia à seguinte em cada migração
+    engine = "ga"  # busca de `Optimizer.run`: "ga" (pygad) ou um motor de `engines.ENGINES` ("annealing", "tabu")
+    polish_engine = None  # motor de `engines.ENGINES` que refina a melhor solução ao final; None desativa
+    engine_evaluations = 500  # genomas avaliados por um motor de busca local
+    annealing_temperature = 0.05  # temperatura inicial do recozimento, em fração da punição do genoma de partida
+    annealing_cooling = 0.99  # fator de resfriamento a cada iteração do recozimento
+    tabu_neighbours = 10  # vizinhos avaliados por iteração da busca tabu
+    tabu_tenure = 7  # iterações em que desfazer um movimento fica proibido na busca tabu
+    checkpoint_path = None  # arquivo do checkpoint do algoritmo genético, para retomar uma execução interrompida
+    checkpoint_interval = 10  # gerações entre dois checkpoints
+    decoder = "python"  # decodificação de `main` e do pywebio_app: "python" ou "numba" (só sem features)
+
+
+@contextmanager
+def configured(**values):
+    """Troca valores do `DefaultConfig` durante o bloco."""
+    saved = {key: getattr(DefaultConfig, key) for key in values}
+    for key, value in values.items():
+        setattr(DefaultConfig, key, value)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            setattr(DefaultConfig, key, value)
 
 
 class LogConfig:
     algorithm_details: bool = False
     optimizer_details: bool = False
+    # arquivos com as estatísticas do MoonLogger gravados ao final de `main` (None para não gravar; ex.:
+    # "moonlogger_stats.json" e "moonlogger_stats.prom")
+    stats_json_path: Optional[str] = None
+    stats_prometheus_path: Optional[str] = None
+    # com MOONLOGGER_TRACE=1, cada execução grava `<prefixo>_<data>.json` (Chrome) e `.folded` (flamegraph)
+    trace_prefix: str = "moonlogger_trace"
 
 
 additional_tests = True
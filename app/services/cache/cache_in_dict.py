@@ -1,14 +1,18 @@
-from copy import deepcopy
+from copy import copy
 from datetime import datetime, timedelta
-from typing import Optional, Any, List, Type, Sequence, TypeVar
+from typing import Optional, Any, Iterable, List, Type, Sequence, TypeVar
 
 from loguru import logger
 from sqlmodel import Session, SQLModel, select
 
-from app.config import LogConfig
+from app.config import LogConfig, DefaultConfig
 from app.models import Team, Professional, Patient, Schedule, Surgery, SurgeryPossibleTeams, Room, SurgeryPossibleRooms
 from app.models.empty_schedule import EmptySchedule
 from app.services.cache.core.cache_manager import CacheManager
+from app.services.cache.core.interval_index import IntervalIndex
+from app.services.cache.core.records import ScheduleRecord, is_empty_schedule
+from app.services.cache.core.schedule_columns import ScheduleColumns
+from app.services.cache.core.time_axis import TimeAxis
 from app.services.logic.schedule_builders.functions.additional_tests import additional_test
 from moonlogger import MoonLogger
 
@@ -16,18 +20,105 @@ T = TypeVar("T")
 M = TypeVar("M", bound=SQLModel)
 
 
+def _copy_nested(value: Any) -> Any:
+    """Copia dicionários e listas aninhados, mantendo as linhas (objetos do modelo) compartilhadas."""
+    if isinstance(value, dict):
+        return {key: _copy_nested(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_nested(item) for item in value]
+    return value
+
+
 class CacheInDict(CacheManager):
+    # tabelas escritas durante a execução do algoritmo; as demais são tratadas como somente leitura
+    overlay_tables = (Schedule.__tablename__, EmptySchedule.__tablename__)
+
     def __init__(self, session: Optional[Session] = None):
         """Inicializa o cache e carrega os dados em memória de forma dinâmica."""
         if not hasattr(self, 'data'):
             self.data: dict[str, Any] = {cls.__tablename__: [] for cls in self.get_table_classes()}
             self.indexes = {}
+            self.static_indexes = {}
+            self.interval_indexes = {}
+            self.columns: Optional[ScheduleColumns] = None
+            self.time_axis: Optional[TimeAxis] = None
             if session:
                 self.load_all_data(session)
 
     def __copy__(self):
+        """
+        Cópia copy-on-write: as tabelas estáticas e seus índices são compartilhados com o cache original,
+        apenas as tabelas de agendamento (overlay) ganham uma lista própria.
+        """
         _new = CacheInDict()
-        _new.data = deepcopy(self.data)
+        _new.data = {
+            tablename: list(rows) if tablename in self.overlay_tables else rows
+            for tablename, rows in self.data.items()
+        }
+        _new.static_indexes = self.static_indexes
+        _new.time_axis = self.time_axis
+        _new.columns = copy(self.columns)
+        return _new
+
+    def snapshot(self) -> "CacheInDict":
+        """
+        Cópia que também duplica os índices já construídos das tabelas de agendamento, para retomar uma decodificação
+        a partir deste ponto sem reconstruí-los.
+        """
+        _new = copy(self)
+        _new.indexes = _copy_nested(self.indexes)
+        _new.interval_indexes = {
+            key: {value: copy(intervals) for value, intervals in index.items()}
+            for key, index in self.interval_indexes.items()
+        }
+        return _new
+
+    def with_schedules(self, count: int) -> "CacheInDict":
+        """Cópia em que existem apenas os `count` primeiros agendamentos (o cache naquele ponto da decodificação)."""
+        _new = copy(self)
+        _new.data[Schedule.__tablename__] = _new.data[Schedule.__tablename__][:count]
+        _new.columns = None
+        return _new
+
+    def with_plan(self, surgeries: Sequence[Surgery], schedules: Sequence[Any]) -> "CacheInDict":
+        """
+        Cópia com outra tabela de cirurgias e outro plano, sem horários vazios (ex.: subproblema de um reagendamento).
+        As possibilidades de equipe e sala ficam só as dessas cirurgias; as demais tabelas continuam compartilhadas e
+        os índices estáticos são refeitos porque as cirurgias mudam.
+        """
+        _new = copy(self)
+        surgery_ids = {surgery.id for surgery in surgeries}
+        for table in (SurgeryPossibleTeams, SurgeryPossibleRooms):
+            _new.data[table.__tablename__] = [row for row in self.data[table.__tablename__]
+                                              if row.surgery_id in surgery_ids]
+        _new.data[Surgery.__tablename__] = list(surgeries)
+        _new.data[Schedule.__tablename__] = list(schedules)
+        _new.data[EmptySchedule.__tablename__] = []
+        _new.static_indexes = {}
+        _new.columns = None
+        return _new
+
+    def subset(self, surgery_ids: Iterable[int], team_ids: Iterable[int], room_ids: Iterable[int]) -> "CacheInDict":
+        """
+        Cópia restrita a algumas cirurgias, equipes e salas (ex.: um componente independente da instância), com as
+        possibilidades dessas cirurgias e os agendamentos e horários vazios dessas salas. As linhas são as mesmas
+        do cache original.
+        """
+        surgery_ids, team_ids, room_ids = set(surgery_ids), set(team_ids), set(room_ids)
+        _new = copy(self)
+        keep = {
+            Surgery: lambda row: row.id in surgery_ids,
+            Team: lambda row: row.id in team_ids,
+            Room: lambda row: row.id in room_ids,
+            SurgeryPossibleTeams: lambda row: row.surgery_id in surgery_ids and row.team_id in team_ids,
+            SurgeryPossibleRooms: lambda row: row.surgery_id in surgery_ids and row.room_id in room_ids,
+            Schedule: lambda row: row.room_id in room_ids,
+            EmptySchedule: lambda row: row.room_id in room_ids,
+        }
+        for table, condition in keep.items():
+            _new.data[table.__tablename__] = [row for row in self.data[table.__tablename__] if condition(row)]
+        _new.static_indexes = {}
+        _new.columns = None
         return _new
 
     @staticmethod
@@ -43,27 +134,39 @@ class CacheInDict(CacheManager):
         for model in self.get_table_classes():
             table_name = model.__tablename__
             self.data[table_name] = self.load_table(session, model)
+        # os índices antigos apontam para as linhas anteriores; cópias já feitas continuam com os seus
+        self.indexes = {}
+        self.static_indexes = {}
+        self.interval_indexes = {}
+        self.columns = None
+
+    def _indexes_for(self, tablename: str) -> dict[str, Any]:
+        """Índices das tabelas estáticas são compartilhados entre as cópias, os do overlay não."""
+        return self.indexes if tablename in self.overlay_tables else self.static_indexes
 
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def _build_index(self, table: Type[M]):
         tablename = table.__tablename__
-        if tablename not in self.indexes:
-            self.indexes[tablename] = {row.id: row for row in self.data.get(tablename, [])}
+        indexes = self._indexes_for(tablename)
+        if tablename not in indexes:
+            indexes[tablename] = {row.id: row for row in self.data.get(tablename, [])}
 
     # @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def _build_attribute_index(self, table: Type[M], attribute: str):
         tablename = table.__tablename__
+        indexes = self._indexes_for(tablename)
         # Garante a estrutura do índice por tabela e atributo
-        if tablename not in self.indexes:
-            self.indexes[tablename] = {}
-        if attribute not in self.indexes[tablename]:
+        if tablename not in indexes:
+            indexes[tablename] = {}
+        if attribute not in indexes[tablename]:
             # Cria o índice para o atributo específico
-            self.indexes[tablename][attribute] = {}
+            index = {}
             for row in self.data.get(tablename, []):
                 attr_value = getattr(row, attribute, None)
-                if attr_value not in self.indexes[tablename][attribute]:
-                    self.indexes[tablename][attribute][attr_value] = []
-                self.indexes[tablename][attribute][attr_value].append(row)
+                if attr_value not in index:
+                    index[attr_value] = []
+                index[attr_value].append(row)
+            indexes[tablename][attribute] = index
 
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def get_by_id(self, table: Type[M], _id: int) -> M:
@@ -72,8 +175,9 @@ class CacheInDict(CacheManager):
         self._build_index(table)  # Garante que o índice existe
 
         tablename = table.__tablename__
-        if _id in self.indexes[tablename]:
-            return self.indexes[tablename][_id]
+        index = self._indexes_for(tablename)[tablename]
+        if _id in index:
+            return index[_id]
 
         raise ValueError(f"ID {_id} não encontrado na tabela '{tablename}'.")
 
@@ -85,7 +189,51 @@ class CacheInDict(CacheManager):
 
         # Recupera e retorna as linhas correspondentes ao valor do atributo
         tablename = table.__tablename__
-        return self.indexes[tablename][attribute].get(value, [])
+        return self._indexes_for(tablename)[tablename][attribute].get(value, [])
+
+    def set_time_origin(self, origin: datetime):
+        """Define a origem dos ticks inteiros usados pelos índices de intervalos (normalmente o `zero_time`)."""
+        if self.time_axis is None or self.time_axis.origin != origin:
+            self.time_axis = TimeAxis(origin)
+            self.interval_indexes = {}
+            self.columns = None
+
+    def to_ticks(self, time: datetime) -> int:
+        if self.time_axis is None:
+            self.time_axis = TimeAxis(time)
+        return self.time_axis.to_ticks(time)
+
+    def to_datetime(self, ticks: int) -> datetime:
+        return self.time_axis.to_datetime(ticks)
+
+    def _row_interval(self, row: Schedule | EmptySchedule) -> tuple[int, int]:
+        start = self.to_ticks(row.start_time)
+        if is_empty_schedule(row):
+            return start, start + TimeAxis.minutes(row.duration)
+        return start, start + TimeAxis.minutes(self.get_by_id(Surgery, row.surgery_id).duration)
+
+    def _build_interval_index(self, table: Type[M], attribute: str):
+        key = (table.__tablename__, attribute)
+        if key not in self.interval_indexes:
+            index: dict[Any, IntervalIndex] = {}
+            for row in self.data.get(table.__tablename__, []):
+                start, end = self._row_interval(row)
+                index.setdefault(getattr(row, attribute), IntervalIndex()).add(start, end, row)
+            self.interval_indexes[key] = index
+
+    def schedule_columns(self) -> ScheduleColumns:
+        """Colunas (sala, início) dos agendamentos, construídas na primeira consulta e atualizadas a cada registro."""
+        if self.columns is None:
+            columns = ScheduleColumns(accumulate=DefaultConfig.incremental_punishment)
+            for row in self.get_table(Schedule):
+                columns.add(row.room_id, self.to_ticks(row.start_time))
+            self.columns = columns
+        return self.columns
+
+    def get_intervals(self, table: Type[M], attribute: str, value: Any) -> IntervalIndex:
+        """Retorna os intervalos ocupados das linhas da tabela com `attribute == value`, ordenados pelo início."""
+        self._build_interval_index(table, attribute)
+        return self.interval_indexes[(table.__tablename__, attribute)].get(value) or IntervalIndex()
 
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def load_table(self, session: Session, model: Type[T]) -> Sequence[Type[T]]:
@@ -116,37 +264,46 @@ class CacheInDict(CacheManager):
             logger.success(
                 f"Registering surgery {surgery.name} for team {team.name} in room {room.name} at {start_time}")
 
-        # Criação do objeto Schedule
-        new_schedule = Schedule(
+        # Criação do agendamento (registro leve; vira Schedule apenas ao persistir)
+        new_schedule = ScheduleRecord(
             start_time=start_time,
             surgery_id=surgery.id,
             room_id=room.id,
             team_id=team.id
         )
 
+        # Índices adicionais por atributos importantes; construídos antes de inserir para não perder as linhas
+        # que já estavam no overlay (ex.: agendamentos fixos carregados do banco)
+        attributes = ['surgery_id', 'room_id', 'team_id', 'start_time']
+        for attribute in attributes:
+            self._build_attribute_index(Schedule, attribute)
+        for attribute in ['room_id', 'team_id']:
+            self._build_interval_index(Schedule, attribute)
+        columns = self.schedule_columns()
+
         # Adiciona ao cache
         tablename = 'schedule'
         self.data[tablename].append(new_schedule)
 
-        # Atualiza os índices (usando a chave composta)
-        if tablename not in self.indexes:
-            self.indexes[tablename] = {}  # Garante a inicialização
-
         # Índice pela chave composta: (surgery_id, room_id, team_id)
         composite_key = (new_schedule.surgery_id, new_schedule.room_id, new_schedule.team_id)
         if 'composite_key' not in self.indexes[tablename]:
             self.indexes[tablename]['composite_key'] = {}
         self.indexes[tablename]['composite_key'][composite_key] = new_schedule
 
-        # Índices adicionais por atributos importantes
-        for attribute in ['surgery_id', 'room_id', 'team_id', 'start_time']:
-            if attribute not in self.indexes[tablename]:
-                self.indexes[tablename][attribute] = {}
+        for attribute in attributes:
             attr_value = getattr(new_schedule, attribute)
             if attr_value not in self.indexes[tablename][attribute]:
                 self.indexes[tablename][attribute][attr_value] = []
             self.indexes[tablename][attribute][attr_value].append(new_schedule)
 
+        # Índices de intervalos já construídos (sala/equipe) recebem o novo agendamento
+        start, end = self._row_interval(new_schedule)
+        columns.add(new_schedule.room_id, start)
+        for (interval_table, attribute), index in self.interval_indexes.items():
+            if interval_table == tablename:
+                index.setdefault(getattr(new_schedule, attribute), IntervalIndex()).add(start, end, new_schedule)
+
     @additional_test
     def check_preexistence_sch(self, surgery):
         if self.get_by_attribute(Schedule, "surgery_id", surgery.id):
@@ -157,14 +314,13 @@ class CacheInDict(CacheManager):
     @additional_test
     def check_superposition(self, room, start_time, surgery):
         # verificar se sobrepõe com outra cirurgia
-        for schedule in self.get_table(Schedule):
-            if schedule.room_id == room.id:
-                other_surgery = self.get_by_id(Surgery, schedule.surgery_id)
-                other_end_time = schedule.start_time + timedelta(minutes=other_surgery.duration)
-                if (schedule.start_time < start_time < other_end_time) or \
-                        (schedule.start_time < start_time + timedelta(minutes=surgery.duration) < other_end_time):
-                    logger.error(f"this surgery overlaps with another surgery: {surgery}")
-                    logger.error(f"{surgery.name}: {start_time} -> {start_time + timedelta(minutes=surgery.duration)}")
-                    logger.error(f"{schedule.surgery_id}: {schedule.start_time} -> {other_end_time}")
-                    logger.error(f"{schedule=}")
-                    quit()
+        start = self.to_ticks(start_time)
+        end = start + TimeAxis.minutes(surgery.duration)
+        for other_start, other_end, schedule in self.get_intervals(Schedule, "room_id", room.id).overlapping(start, end):
+            if (other_start < start < other_end) or (other_start < end < other_end):
+                other_end_time = self.to_datetime(other_end)
+                logger.error(f"this surgery overlaps with another surgery: {surgery}")
+                logger.error(f"{surgery.name}: {start_time} -> {start_time + timedelta(minutes=surgery.duration)}")
+                logger.error(f"{schedule.surgery_id}: {schedule.start_time} -> {other_end_time}")
+                logger.error(f"{schedule=}")
+                quit()
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from datetime import datetime, timedelta
-from typing import Type, List, Any, Union, Tuple, Dict, TypeVar
+from typing import Type, List, Any, Union, Tuple, Dict, TypeVar, Optional
 
 from loguru import logger
 from sqlmodel import SQLModel
@@ -8,6 +8,8 @@ from sqlmodel import SQLModel
 from app.config import LogConfig, additional_tests
 from app.models import Surgery, Team, Room, Schedule
 from app.models.empty_schedule import EmptySchedule
+from app.services.cache.core.interval_index import IntervalIndex
+from app.services.cache.core.schedule_columns import ScheduleColumns
 from moonlogger import MoonLogger
 
 M = TypeVar("M", bound=SQLModel)
@@ -26,6 +28,20 @@ class CacheManager(ABC):
     def get_by_attribute(self, table: Type[M], attribute: str, value: Any) -> List[M]:
         raise NotImplementedError
 
+    @abstractmethod
+    def get_intervals(self, table: Type[M], attribute: str, value: Any) -> IntervalIndex:
+        raise NotImplementedError
+
+    @abstractmethod
+    def schedule_columns(self) -> ScheduleColumns:
+        """Sala e início (em ticks) de todos os agendamentos, em colunas."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def to_ticks(self, time: datetime) -> int:
+        """Converte um horário para os ticks inteiros usados pelos índices de intervalos."""
+        raise NotImplementedError
+
     @abstractmethod
     def register_surgery(self, surgery: Surgery, team: Team, room: Room, start_time: datetime):
         raise NotImplementedError
@@ -36,37 +52,23 @@ class CacheManager(ABC):
 
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def is_team_busy(self, team_id: int, check_time: datetime) -> bool:
-        schedules = self.get_by_attribute(Schedule, "team_id", team_id)
-        if not schedules:
-            return False
-
-        for schedule in schedules:
-            start_time = schedule.start_time
-            end_time = start_time + timedelta(minutes=self.get_by_id(Surgery, schedule.surgery_id).duration)
-            if start_time <= check_time < end_time:
-                return True
-        return False
+        return self.get_intervals(Schedule, "team_id", team_id).is_busy(self.to_ticks(check_time))
 
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def is_room_busy(self, room_id: int, check_time: datetime) -> bool:
-        schedules = self.get_by_attribute(Schedule, "room_id", room_id)
-        if not schedules and LogConfig.algorithm_details:
+        intervals = self.get_intervals(Schedule, "room_id", room_id)
+        if not intervals and LogConfig.algorithm_details:
             logger.warning(f"No schedules found for room {room_id}: {self.get_table(Schedule)}")
 
-        for schedule in schedules:
-            start_time = schedule.start_time
-            end_time = start_time + timedelta(minutes=self.get_by_id(Surgery, schedule.surgery_id).duration)
-
-            if start_time <= check_time < end_time:
-                return True
-        return False
+        return intervals.is_busy(self.to_ticks(check_time))
 
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def get_available_teams(self, check_time: datetime) -> List[Team]:
         available_teams = []
+        ticks = self.to_ticks(check_time)
 
         for team in self.get_table(Team):
-            if not self.is_team_busy(team.id, check_time):
+            if not self.get_intervals(Schedule, "team_id", team.id).is_busy(ticks):
                 available_teams.append(team)
 
         return available_teams
@@ -96,41 +98,47 @@ class CacheManager(ABC):
             -> Union[tuple[Surgery, Schedule], tuple[None, None], tuple[None, EmptySchedule]]:
         """Procura por uma cirurgia agendada para o horário e sala específicos."""
         last_value: Union[tuple[Surgery, Schedule], tuple[None, None], tuple[None, EmptySchedule], None] = None
+        ticks = self.to_ticks(time)
+
+        for _, schedule in self.get_intervals(Schedule, "room_id", room.id).covering(ticks):
+            value = self.get_by_id(Surgery, schedule.surgery_id), schedule
+            if additional_tests:
+                if not last_value:
+                    last_value = value
+                else:
+                    logger.error(f"More than one surgery found for room {room.name} at {time}: "
+                                 f"{last_value}, {value}")
+                    logger.error(f"{last_value[0].name}: \t {last_value[1].start_time} -> "
+                                 f"{last_value[1].start_time + timedelta(minutes=last_value[0].duration)}")
+                    logger.error(f"{value[0].name}: \t {value[1].start_time} -> "
+                                 f"{schedule.start_time + timedelta(minutes=value[0].duration)}")
+                    quit()
+            else:
+                return value
 
-        for schedule in self.get_table(Schedule):
-            if schedule.room_id == room.id:
-                final = schedule.start_time + timedelta(minutes=self.get_by_id(Surgery, schedule.surgery_id).duration)
-                if schedule.start_time <= time < final:
-                    value = self.get_by_id(Surgery, schedule.surgery_id), schedule
-                    if additional_tests:
-                        if not last_value:
-                            last_value = value
-                        else:
-                            logger.error(f"More than one surgery found for room {room.name} at {time}: "
-                                         f"{last_value}, {value}")
-                            logger.error(f"{last_value[0].name}: \t {last_value[1].start_time} -> "
-                                         f"{last_value[1].start_time + timedelta(minutes=last_value[0].duration)}")
-                            logger.error(f"{value[0].name}: \t {value[1].start_time} -> "
-                                         f"{schedule.start_time + timedelta(minutes=value[0].duration)}")
-                            quit()
-                    else:
-                        return value
-
-        for emptysch in self.get_table(EmptySchedule):
-            if emptysch.room_id == room.id:
-                final = emptysch.start_time + timedelta(minutes=emptysch.duration)
-                if emptysch.start_time <= time < final:
-                    value = None, emptysch
-                    if not last_value:
-                        last_value = None, emptysch
-                    else:
-                        logger.error(f"More than one schedule found for room {room.name} at {time}")
+        for _, emptysch in self.get_intervals(EmptySchedule, "room_id", room.id).covering(ticks):
+            if not last_value:
+                last_value = None, emptysch
+            else:
+                logger.error(f"More than one schedule found for room {room.name} at {time}")
 
         if last_value:
             return last_value
         else:
             return None, None
 
+    @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
+    def get_next_schedule_in_room(self, room_id: int, check_time: datetime) -> Optional[Schedule | EmptySchedule]:
+        """Retorna o agendamento (ou horário vazio) da sala que começa mais cedo a partir de `check_time`."""
+        ticks = self.to_ticks(check_time)
+        schedule = self.get_intervals(Schedule, "room_id", room_id).next_starting(ticks)
+        emptysch = self.get_intervals(EmptySchedule, "room_id", room_id).next_starting(ticks)
+        if schedule and emptysch:
+            return schedule[1] if schedule[0] <= emptysch[0] else emptysch[1]
+        if schedule or emptysch:
+            return (schedule or emptysch)[1]
+        return None
+
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def _get_room_schedule_intervals(self, room: Room) -> List[Tuple[datetime, datetime]]:
         """Gera a lista de intervalos ocupados em uma sala."""
@@ -159,10 +167,10 @@ class CacheManager(ABC):
         _dict = {}
         for room in self.get_table(Room):
             surgery, schedule = self.get_surgery_by_time_and_room(time, room)
-            if surgery and type(schedule) == Schedule:
+            if surgery and schedule is not None:
                 _dict[
                     room.name] = f"{self.get_by_id(Team, schedule.team_id).name} - {surgery.name} - {surgery.duration}min"
-            elif not surgery and type(schedule) == EmptySchedule:
+            elif not surgery and schedule is not None:
                 _dict[room.name] = f"Empty Schedule - {schedule.duration}min"
             else:
                 _dict[room.name] = "None"
@@ -176,16 +184,9 @@ class CacheManager(ABC):
             logger.warning("No schedules found in cache.")
             return 0
 
-        per_room = {}
-        global_total = 0
+        return sum(self.calculate_punishment_by_room(zero_time).values())
 
-        for room in self.get_table(Room):
-            local_total = 0
-            for schedule in self.get_by_attribute(Schedule, "room_id", room.id):
-                waiting_time = schedule.start_time - zero_time
-                if waiting_time.total_seconds() > 0:
-                    local_total += int(waiting_time.total_seconds() // 60)
-            per_room[room.id] = local_total
-            global_total += local_total
-
-        return global_total
+    def calculate_punishment_by_room(self, zero_time: datetime) -> Dict[int, int]:
+        """Punição de cada sala: minutos inteiros de espera dos agendamentos desde o `zero_time`."""
+        per_room = self.schedule_columns().punishment_by_room(self.to_ticks(zero_time))
+        return {room.id: per_room.get(room.id, 0) for room in self.get_table(Room)}
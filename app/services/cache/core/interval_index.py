@@ -0,0 +1,91 @@
+from bisect import bisect_left, bisect_right
+from typing import Any, List, Optional, Tuple
+
+
+class IntervalIndex:
+    """
+    Intervalos [início, fim) de uma sala ou equipe, ordenados pelo início.
+
+    Guarda também o maior fim acumulado até cada posição, o que permite responder "está ocupado em t?" com uma
+    busca binária e encontrar os ocupantes de um horário sem percorrer todos os agendamentos.
+
+    Custos (adaptação aceita de uma árvore balanceada, que não compensa nos tamanhos de uma sala ou equipe):
+
+    - `add` é O(1) amortizado quando o intervalo começa depois de todos (o caso do algoritmo, que agenda em ordem
+      de tempo) e O(n) no meio, pelo `list.insert` e pela atualização dos fins acumulados à direita;
+    - `is_busy` e `next_starting` são O(log n);
+    - `covering` e `overlapping` são O(log n + k) quando os intervalos do índice não se sobrepõem, que é a regra
+      para uma sala ou uma equipe (`check_superposition`): aí o fim acumulado é o próprio fim e a volta para
+      no primeiro intervalo que já terminou. Com sobreposições (ex.: um bloco longo que contém outros), a volta
+      percorre todos os intervalos que começam dentro do bloco.
+    """
+
+    def __init__(self):
+        self.starts: List[Any] = []
+        self.ends: List[Any] = []
+        self.max_ends: List[Any] = []
+        self.rows: List[Any] = []
+        self.seqs: List[int] = []  # ordem de inserção, para desempatar como a varredura da tabela fazia
+        self._next_seq = 0
+
+    def __copy__(self):
+        _new = IntervalIndex()
+        _new.starts = list(self.starts)
+        _new.ends = list(self.ends)
+        _new.max_ends = list(self.max_ends)
+        _new.rows = list(self.rows)
+        _new.seqs = list(self.seqs)
+        _new._next_seq = self._next_seq
+        return _new
+
+    def __len__(self):
+        return len(self.starts)
+
+    def add(self, start: Any, end: Any, row: Any):
+        """Insere um intervalo mantendo a ordenação (O(1) amortizado no final, O(n) no meio)."""
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.rows.insert(i, row)
+        self.seqs.insert(i, self._next_seq)
+        self._next_seq += 1
+
+        self.max_ends.insert(i, end)
+        running = self.max_ends[i - 1] if i else end
+        for j in range(i, len(self.ends)):
+            if self.ends[j] > running:
+                running = self.ends[j]
+            self.max_ends[j] = running
+
+    def is_busy(self, time: Any) -> bool:
+        """Indica se algum intervalo contém o horário (início <= time < fim)."""
+        i = bisect_right(self.starts, time)
+        return i > 0 and self.max_ends[i - 1] > time
+
+    def covering(self, time: Any) -> List[Tuple[int, Any]]:
+        """Retorna (ordem de inserção, linha) de todos os intervalos que contêm o horário."""
+        found = []
+        j = bisect_right(self.starts, time) - 1
+        while j >= 0 and self.max_ends[j] > time:
+            if self.ends[j] > time:
+                found.append((self.seqs[j], self.rows[j]))
+            j -= 1
+        found.sort(key=lambda x: x[0])
+        return found
+
+    def overlapping(self, start: Any, end: Any) -> List[Tuple[Any, Any, Any]]:
+        """Retorna (início, fim, linha) dos intervalos que começam antes de `end` e terminam depois de `start`."""
+        found = []
+        j = bisect_left(self.starts, end) - 1
+        while j >= 0 and self.max_ends[j] > start:
+            if self.ends[j] > start:
+                found.append((self.starts[j], self.ends[j], self.rows[j]))
+            j -= 1
+        return found
+
+    def next_starting(self, time: Any) -> Optional[Tuple[Any, Any]]:
+        """Retorna (início, linha) do primeiro intervalo que começa em `time` ou depois, se houver."""
+        i = bisect_left(self.starts, time)
+        if i == len(self.starts):
+            return None
+        return self.starts[i], self.rows[i]
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlmodel import SQLModel
+
+from app.models import Schedule
+from app.models.empty_schedule import EmptySchedule
+
+
+class _Record:
+    """
+    Linha leve (com `__slots__`) usada durante a otimização no lugar dos modelos SQLModel, que pagam validação e
+    instrumentação do SQLAlchemy a cada instância criada. Só vira modelo (`to_model`) na hora de persistir.
+    """
+    __slots__ = ()
+    model: type = SQLModel
+
+    def model_dump(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def to_model(self) -> SQLModel:
+        return self.model(**self.model_dump())
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class ScheduleRecord(_Record):
+    __slots__ = ("start_time", "fixed", "surgery_id", "room_id", "team_id")
+    model = Schedule
+
+    def __init__(self, start_time: datetime, surgery_id: int, room_id: int, team_id: int, fixed: bool = False):
+        self.start_time = start_time
+        self.fixed = fixed
+        self.surgery_id = surgery_id
+        self.room_id = room_id
+        self.team_id = team_id
+
+
+class EmptyScheduleRecord(_Record):
+    __slots__ = ("id", "room_id", "start_time", "duration")
+    model = EmptySchedule
+
+    def __init__(self, room_id: int, start_time: datetime, duration: int, id: Optional[int] = None):
+        self.id = id
+        self.room_id = room_id
+        self.start_time = start_time
+        self.duration = duration
+
+    @property
+    def end_time(self) -> datetime:
+        return self.start_time + timedelta(minutes=self.duration)
+
+
+def is_empty_schedule(row: Any) -> bool:
+    """Horários vazios (EmptySchedule ou o registro equivalente) são os únicos com duração própria."""
+    return hasattr(row, "duration")
+
+
+def to_model(row: Any) -> SQLModel:
+    """Converte um registro em modelo SQLModel para persistência; modelos são retornados como estão."""
+    return row.to_model() if isinstance(row, _Record) else row
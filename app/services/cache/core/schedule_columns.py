@@ -0,0 +1,47 @@
+from array import array
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.services.cache.core.time_axis import TimeAxis
+
+
+class ScheduleColumns:
+    """
+    Sala e início (em ticks) de cada agendamento em colunas contíguas, para calcular a punição de forma vetorizada.
+
+    Com `accumulate`, também soma a punição de cada sala em relação à origem dos ticks a cada `add`; assim a punição
+    de uma decodificação já está pronta quando ela termina.
+    """
+
+    def __init__(self, accumulate: bool = False):
+        self.room_ids = array("q")
+        self.starts = array("q")
+        self.accumulated: Optional[Dict[int, int]] = {} if accumulate else None
+
+    def __copy__(self):
+        _new = ScheduleColumns()
+        _new.room_ids = array("q", self.room_ids)
+        _new.starts = array("q", self.starts)
+        _new.accumulated = None if self.accumulated is None else dict(self.accumulated)
+        return _new
+
+    def __len__(self):
+        return len(self.starts)
+
+    def add(self, room_id: int, start: int):
+        self.room_ids.append(room_id)
+        self.starts.append(start)
+        if self.accumulated is not None and start > 0:
+            self.accumulated[room_id] = self.accumulated.get(room_id, 0) + TimeAxis.whole_minutes(start)
+
+    def punishment_by_room(self, base: int) -> Dict[int, int]:
+        """Minutos inteiros de espera depois de `base` somados por sala (apenas salas com agendamentos)."""
+        if base == 0 and self.accumulated is not None:
+            return dict(self.accumulated)
+
+        waiting = np.frombuffer(self.starts, dtype=np.int64) - base
+        late = waiting > 0
+        room_ids, positions = np.unique(np.frombuffer(self.room_ids, dtype=np.int64)[late], return_inverse=True)
+        totals = np.bincount(positions, weights=TimeAxis.whole_minutes(waiting[late]), minlength=len(room_ids))
+        return {int(room_id): int(total) for room_id, total in zip(room_ids, totals)}
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+TICK = timedelta(microseconds=1)
+TICKS_PER_MINUTE = 60_000_000
+
+
+class TimeAxis:
+    """
+    Representa horários como inteiros (ticks de 1 microssegundo) contados a partir de uma origem.
+
+    O algoritmo usa `zero_time` como origem; assim comparações e somas de durações viram aritmética de inteiros,
+    sem criar objetos datetime/timedelta a cada consulta. A resolução em microssegundos mantém o resultado idêntico
+    ao cálculo com datetime, mesmo para horários que não caem em minutos inteiros (ex.: `datetime.now()`).
+    """
+
+    def __init__(self, origin: datetime):
+        self.origin = origin
+
+    def to_ticks(self, time: datetime) -> int:
+        return (time - self.origin) // TICK
+
+    def to_datetime(self, ticks: int) -> datetime:
+        return self.origin + timedelta(microseconds=ticks)
+
+    @staticmethod
+    def minutes(duration: int) -> int:
+        """Converte uma duração em minutos para ticks."""
+        return duration * TICKS_PER_MINUTE
+
+    @staticmethod
+    def whole_minutes(ticks):
+        """Quantidade de minutos inteiros (arredondada para baixo) em um intervalo de ticks, ou em um vetor deles."""
+        return ticks // TICKS_PER_MINUTE
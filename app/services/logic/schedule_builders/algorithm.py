@@ -1,18 +1,26 @@
+from bisect import bisect_right
 from copy import copy
 from datetime import datetime, timedelta
-from typing import List, Tuple, Union, Optional
+from typing import List, Tuple, Union, Optional, Dict, Any
 
+import numpy as np
 import pandas as pd
 from loguru import logger
 from sqlmodel import SQLModel
 from tabulate import tabulate
 
-from app.config import LogConfig
+from app.config import LogConfig, DefaultConfig
 from app.models import Surgery, Schedule, Room, Team, SurgeryPossibleTeams
 from app.models.empty_schedule import EmptySchedule
 from app.services.cache.cache_in_dict import CacheInDict
 from app.services.cache.core.cache_manager import CacheManager
+from app.services.cache.core.records import is_empty_schedule
+from app.services.cache.core.time_axis import TimeAxis
 from app.services.logic.schedule_builders.functions.additional_tests import additional_test
+from app.services.logic.schedule_builders.structures.candidate_index import CandidateCatalog, CandidateIndex
+from app.services.logic.schedule_builders.structures.prefix_trie import PrefixTrie
+from app.services.logic.schedule_builders.structures.tracked_genome import TrackedGenome
+from app.services.logic.schedule_builders.structures.vacancy_tracker import VacancyTracker
 from moonlogger import MoonLogger
 
 
@@ -21,23 +29,155 @@ class Algorithm:
         assert type(cache) == CacheInDict, f"Invalid cache type: {type(cache)}"
 
         self.cache = copy(cache)
-        self.surgeries: List[Surgery] = copy(surgeries)
+        self.cache.set_time_origin(zero_time)
+        self.candidate_catalog: Optional[CandidateCatalog] = None
+        self.surgeries = surgeries
         self.zero_time = zero_time
         self.next_vacany = zero_time
         self.next_vacany_room = self.get_first_next_vacany_room()
         self._step = 0
-        self.rooms_according_to_time = []
+        self.fitness_only = False
+        self._timeline: List[Tuple[datetime, int]] = []
         self.fixed_schedules_considered = list[Schedule]()
         self.empty_schedules_considered = list[EmptySchedule]()
         self.solution = []
         self.available_teams = []
+        self._vacancies: Optional[VacancyTracker] = None
+        self._last_vacancy: Optional[Tuple[Room, datetime]] = None
 
         self.fixed_schedules_disregarded = self.cache.get_by_attribute(Schedule, "fixed", True)
 
+    @classmethod
+    def evaluate_population(cls, population, surgeries: List[Surgery], cache: CacheManager, zero_time: datetime,
+                            catalog: Optional[CandidateCatalog] = None,
+                            checkpoints: Optional[PrefixTrie] = None) -> np.ndarray:
+        """
+        Decodifica uma população inteira (indivíduos x genes) e retorna o vetor de punições.
+
+        Os dados estáticos (índices do cache, origem do eixo de tempo e as candidatas de cada equipe) são preparados
+        uma única vez para o lote. Indivíduos cuja decodificação falha recebem punição infinita. Com `checkpoints`,
+        cada decodificação parte do maior prefixo de genes já decodificado (ver `execute`).
+        """
+        cache.set_time_origin(zero_time)
+        catalog = catalog or CandidateCatalog(cache)
+        punishments = np.zeros(len(population), dtype=float)
+
+        for i, solution in enumerate(population):
+            algorithm = cls(surgeries, cache, zero_time)
+            algorithm.candidate_catalog = catalog
+            algorithm.fitness_only = True
+            try:
+                algorithm.execute(solution, checkpoints)
+            except Exception as e:
+                logger.error(f"Error in fitness function: {e}")
+                punishments[i] = float("inf")
+                continue
+            punishments[i] = algorithm.cache.calculate_punishment(zero_time)
+            if LogConfig.optimizer_details:
+                logger.debug(f"Punishment: {punishments[i]}")
+
+        return punishments
+
+    @classmethod
+    def merge(cls, parts: List["Algorithm"], cache: CacheManager, zero_time: datetime) -> "Algorithm":
+        """
+        Junta as decodificações de componentes independentes (ver `Solver.components`) em uma só sobre o cache
+        completo: os agendamentos novos de cada parte são registrados em ordem de início e a linha do tempo passa a
+        ser a união das linhas do tempo das partes.
+        """
+        merged = cls([], cache, zero_time)
+        existing = len(merged.cache.get_table(Schedule))
+        known = {id(row) for row in cache.get_table(Schedule)}
+        rows = sorted((row for part in parts for row in part.cache.get_table(Schedule) if id(row) not in known),
+                      key=lambda row: (row.start_time, row.room_id))
+        for row in rows:
+            merged.cache.register_surgery(merged.cache.get_by_id(Surgery, row.surgery_id),
+                                          merged.cache.get_by_id(Team, row.team_id),
+                                          merged.cache.get_by_id(Room, row.room_id), row.start_time)
+
+        starts = [row.start_time for row in rows]
+        times = sorted({time for part in parts for time, _ in part._timeline})
+        merged._timeline = [(time, existing + bisect_right(starts, time)) for time in times]
+        return merged
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado da decodificação (cache, vagas, cirurgias restantes, passo...) para ser retomado por `restore`."""
+        return {name: self._copy_state(value) for name, value in self.__dict__.items() if name != "solution"}
+
+    def restore(self, state: Dict[str, Any]):
+        # o estado salvo continua na trie, então trabalhamos sobre uma cópia
+        self.__dict__.update({name: self._copy_state(value) for name, value in state.items()})
+
+    @staticmethod
+    def _copy_state(value: Any) -> Any:
+        if isinstance(value, CacheInDict):
+            return value.snapshot()
+        if isinstance(value, (list, dict, set, VacancyTracker, CandidateIndex)):
+            return copy(value)
+        return value
+
     @property
     def step(self):
         return self._step
 
+    @property
+    def rooms_according_to_time(self) -> List[Dict[str, Any]]:
+        """
+        O que ocorre em cada sala no horário de cada passo da decodificação, como estava naquele passo.
+
+        Durante a decodificação guardamos apenas (horário, agendamentos registrados até então); a tabela é montada
+        quando consultada (`print_table`, interface web).
+        """
+        rows, view, visible = [], None, None
+        for time, count in self._timeline:
+            if count != visible:
+                view, visible = self.cache.with_schedules(count), count
+            surgeries = view.get_dict_surgeries_by_time(time)
+            if surgeries is not None:
+                rows.append({"Tempo": time, **surgeries})
+        return rows
+
+    @property
+    def surgeries(self) -> List[Surgery]:
+        return self._surgeries
+
+    @surgeries.setter
+    def surgeries(self, value: List[Surgery]):
+        # as tabelas do cache são compartilhadas entre as cópias (copy-on-write), então nunca alteramos a lista
+        # recebida no lugar
+        self._surgeries = list(value)
+        self._candidates = None
+
+    @property
+    def candidates(self) -> CandidateIndex:
+        """Cirurgias restantes de cada equipe em ordem de prioridade, construídas na primeira consulta."""
+        if self._candidates is None:
+            self._check_schedulable(self.surgeries)
+            self._candidates = CandidateIndex(self.cache, self.surgeries, self.candidate_catalog)
+        return self._candidates
+
+    def _candidate_index_for(self, surgeries: List[Surgery]) -> CandidateIndex:
+        if surgeries is self.surgeries:
+            return self.candidates
+        # lista avulsa: monta um índice só para esta consulta
+        self._check_schedulable(surgeries)
+        return CandidateIndex(self.cache, surgeries, self.candidate_catalog)
+
+    def _check_schedulable(self, surgeries: List[Surgery]):
+        """Garante que nenhuma das cirurgias já foi agendada ou está fixada."""
+        scheduled = {sch.surgery_id for sch in self.cache.get_table(Schedule) if not sch.fixed}
+        for surgery in surgeries:
+            if surgery.id in scheduled:
+                logger.error(f"this surgery is already scheduled: {surgery.name}\n{surgery=}")
+                logger.error(f"{[sch for sch in self.cache.get_table(Schedule) if sch.surgery_id == surgery.id]=}")
+                quit()
+
+            if sch := self.cache.get_by_attribute(Schedule, "surgery_id", surgery.id):
+                if sch[0].fixed:
+                    logger.error(f"we can't schedule this surgery: {surgery.name} because it's fixed")
+                    logger.error(f"{sch[0]=}")
+                    quit()
+
     @property
     def fixed_schedules_disregarded(self):
         return self.__fixed_schedules_disregarded
@@ -60,6 +200,7 @@ class Algorithm:
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def fixed_schedules_considered(self, value):
         self.__fixed_schedules_considered = value
+        self._vacancies = None
 
     @property
     def empty_schedules_considered(self):
@@ -69,6 +210,41 @@ class Algorithm:
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def empty_schedules_considered(self, value):
         self.__empty_schedules_considered = value
+        self._vacancies = None
+
+    @property
+    def vacancies(self) -> VacancyTracker:
+        """Fila com o horário livre de cada sala (em ticks), construída na primeira consulta e atualizada a cada
+        agendamento registrado ou considerado."""
+        if self._vacancies is None:
+            tracker = VacancyTracker(self.cache.get_table(Room), self.cache.to_ticks(self.zero_time))
+            for schedule in self.cache.get_table(Schedule):
+                if self._counts_for_vacancy(schedule):
+                    tracker.extend(schedule.room_id, self._schedule_end(schedule))
+            for schedule in [*self.fixed_schedules_considered, *self.empty_schedules_considered]:
+                tracker.extend(schedule.room_id, self._schedule_end(schedule))
+            self._vacancies = tracker
+        return self._vacancies
+
+    def _counts_for_vacancy(self, schedule: Schedule) -> bool:
+        """Indica se um agendamento do cache ocupa a sala no cálculo da próxima vaga."""
+        return True
+
+    def _schedule_end(self, schedule: Schedule | EmptySchedule) -> int:
+        if is_empty_schedule(schedule):
+            duration = schedule.duration
+        else:
+            duration = self.cache.get_by_id(Surgery, schedule.surgery_id).duration
+        return self.cache.to_ticks(schedule.start_time) + TimeAxis.minutes(duration)
+
+    def _consider_schedule(self, schedule: Schedule | EmptySchedule):
+        """Passa a considerar um agendamento fixo (ou horário vazio) no cálculo das próximas vagas."""
+        if is_empty_schedule(schedule):
+            self.empty_schedules_considered.append(schedule)
+        else:
+            self.fixed_schedules_considered.append(schedule)
+        if self._vacancies is not None:
+            self._vacancies.extend(schedule.room_id, self._schedule_end(schedule))
 
     def get_first_next_vacany_room(self) -> Room:
         if v := self.cache.get_available_rooms(self.next_vacany):
@@ -82,94 +258,53 @@ class Algorithm:
         """Retorna um dicionário com as próximas vagas disponíveis em cada sala."""
         self._validate_cache()
         vacancies = []
-        schedules: list[Schedule | EmptySchedule] = self.cache.get_table(Schedule)
         rooms = self.cache.get_table(Room)
 
-        schedules.extend(fixed_schedules_considered)
-        schedules.extend(empty_schedules_considered)
-
         #assert schedules, "No schedules found in cache."
         assert rooms, "No rooms found in cache."
 
         for room in rooms:
-
-            local_schedules: list[Schedule | EmptySchedule] = [
-                schedule for schedule in schedules if schedule.room_id == room.id
-            ]
-
-            # assert local_schedules, f"No schedules found for room {room.name}: {schedules}"
-            if not local_schedules:
+            """
+            considerar a ultimo (max) agendamento agendado entre:
+            agendamentos não fixos + agendamentos fixos já CONSIDERADOS (fixed_schedules_considered)
+            """
+            intervals = self.cache.get_intervals(Schedule, "room_id", room.id)
+            ends = [intervals.max_ends[-1]] if intervals else []
+            for schedule in [*fixed_schedules_considered, *empty_schedules_considered]:
+                if schedule.room_id == room.id:
+                    ends.append(self.cache.to_ticks(schedule.start_time) + TimeAxis.minutes(
+                        self.cache.get_by_id(Surgery, schedule.surgery_id).duration
+                    ))
+
+            if not ends:
                 vacancies.append((room, zero_time))
             else:
-                """
-                considerar a ultimo (max) agendamento agendado entre:
-                agendamentos não fixos + agendamentos fixos já CONSIDERADOS (fixed_schedules_considered)
-                """
-                last_schedule = max(local_schedules, key=lambda x: x.start_time + timedelta(
-                    minutes=self.cache.get_by_id(Surgery, x.surgery_id).duration
-                ))
-                vacancies.append((
-                    room,
-                    last_schedule.start_time + timedelta(
-                        minutes=self.cache.get_by_id(Surgery, last_schedule.surgery_id).duration
-                    )
-                ))
+                vacancies.append((room, self.cache.to_datetime(max(ends))))
 
         return vacancies
 
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def get_next_surgery(self, surgeries: List[Surgery], team: Team) -> Union[Surgery, SQLModel, None]:
         """Retorna a próxima cirurgia a ser realizada por uma equipe específica."""
-        possibles = self.cache.get_by_attribute(SurgeryPossibleTeams, "team_id", team.id)
+        candidates = self._candidate_index_for(surgeries)
 
-        if not possibles:
+        if not candidates.has_possibilities(team.id):
             logger.error(f"this team didn't have any corresponding surgery "
                          f"{team.name} (ID={team.id}): ")
             # f"{self.data.get(SurgeryPossibleTeams.__tablename__)}")
             return None
 
-        for surgery in surgeries:
-            if surgery.id in [sch.surgery_id for sch in self.cache.get_table(Schedule) if not sch.fixed]:
-                logger.error(f"this surgery is already scheduled: {surgery.name}\n{surgery=}")
-                logger.error(f"{[sch for sch in self.cache.get_table(Schedule) if sch.surgery_id == surgery.id]=}")
-                quit()
-
-            if sch := self.cache.get_by_attribute(Schedule, "surgery_id", surgery.id):
-                if sch[0].fixed:
-                    logger.error(f"we can't schedule this surgery: {surgery.name} because it's fixed")
-                    logger.error(f"{sch[0]=}")
-                    quit()
-
-        psb_cgrs = []
-        for schedule in possibles:
-            # logger.debug(f"{schedule.team_id == team.id=}")
-            # logger.debug(f"{schedule.surgery_id in [surgery.id for surgery in surgeries]=}")
-            # logger.debug(f"{schedule.surgery_id not in [sch.surgery_id for sch in self.get_table(Schedule) if not sch.fixed]=}")
-            if schedule.team_id == team.id and schedule.surgery_id in [surgery.id for surgery in surgeries]:
-                if schedule.surgery_id not in [sch.surgery_id for sch in self.cache.get_table(Schedule) if not sch.fixed]:
-                    psb_cgrs.append(self.cache.get_by_id(Surgery, schedule.surgery_id))
-
-        if not psb_cgrs:
+        surgery_id = candidates.peek(team.id)
+        if surgery_id is None:
             if LogConfig.algorithm_details:
                 logger.error(f"no surgery found for team {team.name} (ID={team.id}) at this time")
             return None
 
-        surgeries = list(sorted(psb_cgrs, key=lambda x: x.duration / (x.priority or 1)))
-        return surgeries[0]
+        return self.cache.get_by_id(Surgery, surgery_id)
 
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def get_next_schedule(self, room_id: int, check_time: datetime) -> Optional[Schedule | EmptySchedule]:
-        schedules: list[Schedule | EmptySchedule] = []
-        schedules.extend(self.cache.get_by_attribute(Schedule, "room_id", room_id))
-        schedules.extend(self.cache.get_by_attribute(EmptySchedule, "room_id", room_id))
-
-        if schedules:
-            future_schs = [sch for sch in schedules if sch.start_time >= check_time]
-            if future_schs:
-                sch = min(future_schs, key=lambda x: self.how_close_schedule(x, check_time))
-                return sch
-            else:
-                return None
+        return self.cache.get_next_schedule_in_room(room_id, check_time)
 
     @step.setter
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
@@ -185,21 +320,23 @@ class Algorithm:
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def get_next_vacany(self) -> Tuple[Room, datetime]:
         """Retorna a próxima vaga disponível."""
+        self._validate_cache()
 
-        value = self._get_sorted_vacancies()[0]
-        self._check_duplicate_vacancy([value])
+        room, free_at = self.vacancies.peek()
+        value = room, self.cache.to_datetime(free_at)
+        self._check_duplicate_vacancy(value)
 
         return value
 
-    def _check_duplicate_vacancy(self, value, last_value=[None]):
+    def _check_duplicate_vacancy(self, value: Tuple[Room, datetime]):
         """Verifica se a próxima vaga é igual à última registrada."""
-        if value[0] == last_value[0]:
+        if value == self._last_vacancy:
             logger.error("The next vacancy is the same as the last one")
-            logger.error(f"{last_value[0]=}")
-            logger.error(f"{value[0]=}")
+            logger.error(f"{self._last_vacancy=}")
+            logger.error(f"{value=}")
             raise ValueError("Duplicate vacancy")
         else:
-            last_value[0] = value[0]
+            self._last_vacancy = value
 
     def _validate_cache(self):
         """Valida se o cache possui as tabelas necessárias."""
@@ -209,34 +346,55 @@ class Algorithm:
             raise ValueError("No rooms found in cache.")
 
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
-    def _get_sorted_vacancies(self) -> List[Tuple[Room, datetime]]:
-        """Obtém e ordena as vagas disponíveis."""
-        vacanies = self.get_next_vacancies(self.zero_time, self.fixed_schedules_considered,
-                                           self.empty_schedules_considered)
-        if not vacanies:
-            raise ValueError("No vacancies found.")
-        return sorted(vacanies, key=lambda x: x[1])
+    def execute(self, solution: List[int], checkpoints: Optional[PrefixTrie] = None) -> pd.DataFrame:
+        """
+        Decodifica a solução. Com `checkpoints`, retoma do maior prefixo de genes já decodificado e salva o estado
+        (a cada `DefaultConfig.decoder_checkpoints` trechos do genoma) para os próximos genomas.
 
-    @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
-    def execute(self, solution: List[int]) -> pd.DataFrame:
+        Com `fitness_only`, nada é guardado para relatórios (linha do tempo, dataframe final): só o cache é montado.
+
+        Se a decodificação falha no meio (gene sem equipe válida, sala sem agendamento anterior, vaga repetida), o erro
+        é registrado e ela para com o que já foi agendado, retornando None, com ou sem o `MoonLogger` ligado.
+        """
+        try:
+            return self._decode_solution(solution, checkpoints)
+        except Exception as e:
+            logger.opt(exception=True).error(f"The decoding stopped after {self.step} steps: {e!r}")
+            return None
+
+    def _decode_solution(self, solution: List[int], checkpoints: Optional[PrefixTrie]) -> pd.DataFrame:
         self.step = 0
 
         assert self.surgeries, "Sem cirurgias."
         assert self.cache.get_table(Team), "Sem equipes."
         assert self.cache.get_table(Room), "Sem salas."
         assert len(solution) == len(self.surgeries), f"Solução inválida. {len(solution)=}, {len(self.surgeries)=}"
-        self.solution = solution
+        self.solution = solution = TrackedGenome(int(gene) for gene in solution)
+
+        spacing = max(1, len(solution) // (DefaultConfig.decoder_checkpoints or 1))
+        if checkpoints is not None:
+            solution.read, state = checkpoints.longest_prefix(solution)
+            if state is not None:
+                self.restore(state)
+        next_checkpoint = solution.read + spacing
 
         while self.surgeries:
+            if checkpoints is not None and solution.read >= next_checkpoint:
+                # o estado neste ponto depende apenas dos genes lidos até aqui
+                checkpoints.insert(solution.prefix, self.snapshot())
+                next_checkpoint = solution.read + spacing
+
             self.available_teams = self.cache.get_available_teams(check_time=self.next_vacany)
             assert self.available_teams or self.step != 0, f"Sem equipes. {self.available_teams=}, {self.step=}"
 
             if self.available_teams:
-                self.process_room(solution, self.available_teams)
-                self.rooms_according_to_time.append({
-                    "Tempo": self.next_vacany,
-                    **self.cache.get_dict_surgeries_by_time(self.next_vacany)
-                })
+                try:
+                    self.process_room(solution, self.available_teams)
+                except Exception as e:
+                    # a vaga termina sem agendamento (como no decodificador compilado) e a decodificação segue
+                    logger.opt(exception=True).error(f"The vacancy ended without a schedule: {e!r}")
+                if not self.fitness_only:
+                    self._timeline.append((self.next_vacany, len(self.cache.get_table(Schedule))))
                 if LogConfig.algorithm_details:
                     self.print_table()
 
@@ -245,7 +403,13 @@ class Algorithm:
             self.next_vacany_room, self.next_vacany = self.get_next_vacany()
             self.check_non_use_of_time(self.available_teams, last_next_vacany)
 
-        # montar um dataframe de todos os agendamentos em função do tempo
+        self.check_remaining_surgeries()
+        if self.fitness_only:
+            return None
+        return self.schedules_report()
+
+    def schedules_report(self) -> pd.DataFrame:
+        """Monta um dataframe de todos os agendamentos em função do tempo."""
         schedules_dict = []
         for sch in self.cache.get_table(Schedule):
             schedules_dict.append([{
@@ -258,8 +422,6 @@ class Algorithm:
                 **self.cache.get_dict_surgeries_by_time(emptysch.start_time)
             }])
 
-        self.check_remaining_surgeries()
-
         df = pd.DataFrame([item for sublist in schedules_dict for item in sublist])
         if LogConfig.algorithm_details:
             logger.debug("\n" + str(tabulate(df, headers="keys", tablefmt="grid")))
@@ -291,14 +453,6 @@ class Algorithm:
                                                f"at {last_next_vacany} but it's not being scheduled.")
                                 logger.warning(f"{surg=}, {pss_sch=}, {available_teams=}")
 
-    @staticmethod
-    def how_close_schedule(sch: Schedule, ntime: datetime) -> timedelta:
-        n = sch.start_time - ntime
-        if n < timedelta():
-            return timedelta(days=999999999)
-        else:
-            return n
-
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def process_room(self, solution: List[int], available_teams: List[Team]):
         assert self.surgeries, "Sem cirurgias."
@@ -336,7 +490,11 @@ class Algorithm:
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def _register_surgery_and_update(self, surgery: Surgery, team: Team, room: Room, start_time: datetime):
         self.cache.register_surgery(surgery, team, room, start_time)
+        if self._vacancies is not None:
+            self._vacancies.extend(room.id, self.cache.to_ticks(start_time) + TimeAxis.minutes(surgery.duration))
         self.surgeries.remove(surgery)
+        if self._candidates is not None:
+            self._candidates.discard(surgery.id)
         self.step += 1
 
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
@@ -6,31 +6,24 @@ from loguru import logger
 from app.config import LogConfig
 from app.models import Schedule, Room, Team, Surgery
 from app.models.empty_schedule import EmptySchedule
+from app.services.cache.core.records import EmptyScheduleRecord
 from app.services.logic.schedule_builders.algorithm import Algorithm
 from moonlogger import MoonLogger
 
 
 class FixedSchedules:
+    def __init__(self: Algorithm):
+        # agendamentos fixos que começaram antes do zero_time (ex.: em andamento num reagendamento) já ocupam a sala
+        for schedule in self.cache.get_by_attribute(Schedule, "fixed", True):
+            if schedule.start_time < self.zero_time:
+                self._consider_schedule(schedule)
+
     def get_next_schedule(self: Algorithm, room_id: int, check_time: datetime) -> Optional[Schedule | EmptySchedule]:
-        schedules: list[Schedule | EmptySchedule] = []
-        schedules.extend(self.cache.get_by_attribute(Schedule, "room_id", room_id))
-        schedules.extend(self.cache.get_by_attribute(EmptySchedule, "room_id", room_id))
-
-        if schedules:
-            future_schs = [sch for sch in schedules if sch.start_time >= check_time]
-            if future_schs:
-                sch = min(future_schs, key=lambda x: self.how_close_schedule(x, check_time))
-                return sch
-            else:
-                return None
+        return self.cache.get_next_schedule_in_room(room_id, check_time)
 
-    @staticmethod
-    def how_close_schedule(sch: Schedule, ntime: datetime) -> timedelta:
-        n = sch.start_time - ntime
-        if n < timedelta():
-            return timedelta(days=999999999)
-        else:
-            return n
+    def _counts_for_vacancy(self: Algorithm, schedule: Schedule) -> bool:
+        # agendamentos fixos só ocupam a sala depois de considerados (fixed_schedules_considered)
+        return not schedule.fixed
 
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def _process_room_with_teams(self: Algorithm, room: Room, solution: List[int], available_teams: List[Team]):
@@ -52,7 +45,7 @@ class FixedSchedules:
 
         surgery = self.get_next_surgery(self.surgeries, team)
 
-        if any([sc.start_time > self.next_vacany for sc in self.cache.get_by_attribute(Schedule, "room_id", room.id)]):
+        if any([sc.start_time >= self.next_vacany for sc in self.cache.get_by_attribute(Schedule, "room_id", room.id)]):
             schedule = self.get_next_schedule(room.id, self.next_vacany)
 
             if surgery:
@@ -62,33 +55,33 @@ class FixedSchedules:
                     # não é possível encaixar a cirurgia no horário disponível
                     interval = schedule.start_time - self.next_vacany
                     if not self._try_other_teams(room, available_teams):
-                        empty_schedule = EmptySchedule(
+                        empty_schedule = EmptyScheduleRecord(
                             room_id=room.id,
                             start_time=self.next_vacany,
                             duration=int(interval.total_seconds() // 60)
                         )
                         if schedule.fixed:
                             if schedule not in self.fixed_schedules_considered:
-                                self.fixed_schedules_considered.append(schedule)
+                                self._consider_schedule(schedule)
                             if schedule in self.fixed_schedules_disregarded:
                                 self.fixed_schedules_disregarded.remove(schedule)
-                        self.empty_schedules_considered.append(empty_schedule)
+                        self._consider_schedule(empty_schedule)
                         logger.success(f"Empty schedule created at {self.next_vacany}. { EmptySchedule=}")
                         logger.success(f"New considered schedule: {empty_schedule}")
             else:
                 interval = schedule.start_time - self.next_vacany
                 if not self._try_other_teams(room, available_teams, interval=interval):
-                    empty_schedule = EmptySchedule(
+                    empty_schedule = EmptyScheduleRecord(
                         room_id=room.id,
                         start_time=self.next_vacany,
                         duration=int(interval.total_seconds() // 60)
                     )
                     if schedule.fixed:
                         if schedule not in self.fixed_schedules_considered:
-                            self.fixed_schedules_considered.append(schedule)
+                            self._consider_schedule(schedule)
                         if schedule in self.fixed_schedules_disregarded:
                             self.fixed_schedules_disregarded.remove(schedule)
-                    self.empty_schedules_considered.append(empty_schedule)
+                    self._consider_schedule(empty_schedule)
                     logger.success(f"Empty schedule created at {self.next_vacany}. { EmptySchedule=}")
                     logger.success(f"New considered schedule: {empty_schedule}")
 
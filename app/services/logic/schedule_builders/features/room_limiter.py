@@ -23,43 +23,23 @@ class RoomLimiter:
         surgeries_possible_room = self.cache.get_by_attribute(SurgeryPossibleRooms, "room_id", self.next_vacany_room.id)
         assert surgeries_possible_room, f"this room didn't have any corresponding surgery {team.name} (ID={self.next_vacany_room.id}): "
 
-        if not possibles:
+        candidates = self._candidate_index_for(surgeries)
+
+        if not candidates.has_possibilities(team.id):
             logger.error(f"this team didn't have any corresponding surgery "
                          f"{team.name} (ID={team.id}): ")
             # f"{self.data.get(SurgeryPossibleTeams.__tablename__)}")
             return None
 
-        for surgery in surgeries:
-            if surgery.id in [sch.surgery_id for sch in self.cache.get_table(Schedule) if not sch.fixed]:
-                logger.error(f"this surgery is already scheduled: {surgery.name}\n{surgery=}")
-                logger.error(f"{[sch for sch in self.cache.get_table(Schedule) if sch.surgery_id == surgery.id]=}")
-                quit()
-
-            if sch := self.cache.get_by_attribute(Schedule, "surgery_id", surgery.id):
-                if sch[0].fixed:
-                    logger.error(f"we can't schedule this surgery: {surgery.name} because it's fixed")
-                    logger.error(f"{sch[0]=}")
-                    quit()
-
-        psb_cgrs = []
-        for schedule in possibles:
-            # logger.debug(f"{schedule.team_id == team.id=}")
-            # logger.debug(f"{schedule.surgery_id in [surgery.id for surgery in surgeries]=}")
-            # logger.debug(f"{schedule.surgery_id not in [sch.surgery_id for sch in self.get_table(Schedule) if not sch.fixed]=}")
-            if schedule.team_id == team.id and schedule.surgery_id in [surgery.id for surgery in surgeries]:
-                if schedule.surgery_id not in [sch.surgery_id for sch in self.cache.get_table(Schedule) if not sch.fixed]:
-                    if schedule.surgery_id in [sch.surgery_id for sch in surgeries_possible_room]:
-                        psb_cgrs.append(self.cache.get_by_id(Surgery, schedule.surgery_id))
-
-        if not psb_cgrs:
+        surgery_id = candidates.peek(team.id, self.next_vacany_room.id)
+        if surgery_id is None:
             if LogConfig.algorithm_details:
                 logger.error(f"no surgery found for team {team.name} (ID={team.id}) at this time")
             return None
 
         self.check_agreement()
 
-        surgeries = list(sorted(psb_cgrs, key=lambda x: x.duration / (x.priority or 1)))
-        return surgeries[0]
+        return self.cache.get_by_id(Surgery, surgery_id)
 
     @MoonLogger.log_func(enabled=LogConfig.algorithm_details)
     def if_no_teams_for_room(self: "Algorithm | RoomLimiter"):
@@ -0,0 +1,24 @@
+from typing import Dict, Type
+
+from loguru import logger
+
+from app.config import DefaultConfig
+from app.services.logic.schedule_builders.algorithm import Algorithm
+from app.services.logic.schedule_builders.functions.apply_features import apply_features
+from app.services.logic.schedule_builders.numba_algorithm import NumbaAlgorithm
+
+DECODERS: Dict[str, Type[Algorithm]] = {"python": Algorithm, "numba": NumbaAlgorithm}
+
+
+def algorithm_class(*features: Type) -> Type[Algorithm]:
+    """
+    Classe do algoritmo com a decodificação escolhida em `DefaultConfig.decoder` e as `features` dadas.
+
+    A decodificação compilada (`NumbaAlgorithm`) só cobre o algoritmo sem features; com `FixedSchedules` ou
+    `RoomLimiter` ela recai na decodificação em Python.
+    """
+    base = DECODERS[DefaultConfig.decoder]
+    if features and base is not Algorithm:
+        logger.warning(f"The {DefaultConfig.decoder} decoder does not support features "
+                       f"({', '.join(feature.__name__ for feature in features)}); decoding in Python")
+    return apply_features(base, *features) if features else base
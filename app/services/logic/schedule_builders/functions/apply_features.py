@@ -17,6 +17,11 @@ def apply_features(base_class: Type, *features: Type) -> Type["Algorithm"]:
     combined_class = type(
         "CombinedAlgorithm",
         (*features, base_class),
-        {"__init__": combined_init},  # Define um único __init__
+        {
+            "__init__": combined_init,  # Define um único __init__
+            # classes criadas dinamicamente não são serializáveis; guardamos como recriá-las (ex.: em outro processo)
+            "__base_algorithm__": base_class,
+            "__features__": features,
+        },
     )
     return combined_class  # type: ignore
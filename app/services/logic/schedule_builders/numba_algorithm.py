@@ -0,0 +1,423 @@
+from copy import copy
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.config import LogConfig, additional_tests
+from app.models import Surgery, Schedule, Room, Team
+from app.services.cache.core.cache_manager import CacheManager
+from app.services.cache.core.time_axis import TICKS_PER_MINUTE
+from app.services.logic.schedule_builders.algorithm import Algorithm
+from app.services.logic.schedule_builders.structures.candidate_index import CandidateCatalog
+from app.services.logic.schedule_builders.structures.decoder_arrays import DecoderArrays
+from app.services.logic.schedule_builders.structures.prefix_trie import PrefixTrie
+
+try:
+    from numba import njit
+except ImportError:  # numba é opcional: sem ele os mesmos laços rodam em Python sobre os vetores NumPy
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# como a decodificação terminou (ver `_raise_for`)
+OK = 0
+NO_TEAMS = 1
+DUPLICATE_VACANCY = 2
+QUIT = 3
+
+# colunas do traço de cada iteração: cirurgia (-1 se nada foi agendado), equipe, sala, início, vaga e se havia
+# equipes livres (só então a iteração entra em `rooms_according_to_time`)
+TRACE_COLUMNS = 6
+
+
+@njit(cache=True)
+def _peek(team, team_order, team_order_len, pointer, remaining):
+    # as candidatas só saem de `remaining`, então o ponteiro de cada equipe só avança
+    p = pointer[team]
+    while p < team_order_len[team] and not remaining[team_order[team, p]]:
+        p += 1
+    pointer[team] = p
+    if p < team_order_len[team]:
+        return team_order[team, p]
+    return -1
+
+
+# posições dos escalares do estado da decodificação (ver `_initial_state`)
+COUNT = 0  # agendamentos registrados (os fixos primeiro)
+ROOM = 1  # sala da vaga atual
+TIME = 2  # início da vaga atual
+LAST_ROOM = 3
+LAST_TIME = 4
+STEP = 5  # cirurgias agendadas, ou seja, o gene da próxima iteração
+ITERATION = 6  # iterações registradas em `trace`
+FIXED = 7  # próximo agendamento fixo, na ordem de início, que ainda não começou
+PENDING = 8  # agendamentos em `pending`
+STATUS = 9
+
+# antes de qualquer horário: equipe sem agendamento começado
+NEVER = -(1 << 62)
+
+
+@njit(cache=True)
+def _initial_state(n, n_teams, n_rooms, fixed_start, fixed_end, fixed_team, fixed_room, first_room):
+    """
+    Estado da decodificação antes do primeiro gene: agendamentos (início, término, equipe e sala, com os fixos
+    primeiro), cirurgias restantes, ponteiros de `_peek`, vetor auxiliar das equipes livres, término de cada sala,
+    término de cada equipe, os fixos em ordem de início, os agendamentos que ainda não começaram e os escalares
+    (`COUNT` ... `STATUS`).
+
+    Como as vagas só andam para frente, uma equipe está ocupada na vaga exatamente quando `team_until` (o maior
+    término entre os agendamentos dela que já começaram) passa do horário da vaga: a verificação custa O(1), em vez
+    de percorrer os agendamentos. Os que começam depois da vaga (fixos, ou os agendados depois do último da sala)
+    entram em `team_until` quando a vaga chega ao início deles (ver `_start_pending`).
+    """
+    n_fixed = fixed_start.shape[0]
+    starts = np.empty(n_fixed + n, dtype=np.int64)
+    ends = np.empty(n_fixed + n, dtype=np.int64)
+    teams = np.empty(n_fixed + n, dtype=np.int64)
+    rooms = np.empty(n_fixed + n, dtype=np.int64)
+    starts[:n_fixed] = fixed_start
+    ends[:n_fixed] = fixed_end
+    teams[:n_fixed] = fixed_team
+    rooms[:n_fixed] = fixed_room
+
+    remaining = np.ones(n, dtype=np.bool_)
+    pointer = np.zeros(n_teams, dtype=np.int64)
+    available = np.empty(n_teams, dtype=np.int64)
+    free_at = np.zeros(n_rooms, dtype=np.int64)
+    counted = np.zeros(n_rooms, dtype=np.bool_)
+    team_until = np.full(n_teams, NEVER, dtype=np.int64)
+    fixed_order = np.argsort(fixed_start, kind="mergesort")
+    pending = np.empty(n, dtype=np.int64)
+    for k in range(n_fixed):
+        r = fixed_room[k]
+        if r >= 0 and (not counted[r] or fixed_end[k] > free_at[r]):
+            free_at[r] = fixed_end[k]
+            counted[r] = True
+
+    scalars = np.zeros(STATUS + 1, dtype=np.int64)
+    scalars[COUNT] = n_fixed
+    scalars[ROOM] = first_room
+    scalars[LAST_ROOM] = -1
+    scalars[STATUS] = OK
+    return (starts, ends, teams, rooms, remaining, pointer, available, free_at, counted, team_until, fixed_order,
+            pending, scalars)
+
+
+@njit(cache=True)
+def _start_pending(time, starts, ends, teams, team_until, fixed_order, pending, scalars):
+    """Passa para `team_until` os agendamentos (fixos e `pending`) que começam até `time`."""
+    f = scalars[FIXED]
+    while f < fixed_order.shape[0] and starts[fixed_order[f]] <= time:
+        k = fixed_order[f]
+        if teams[k] >= 0 and ends[k] > team_until[teams[k]]:
+            team_until[teams[k]] = ends[k]
+        f += 1
+    scalars[FIXED] = f
+
+    p = 0
+    while p < scalars[PENDING]:
+        k = pending[p]
+        if starts[k] <= time:
+            if ends[k] > team_until[teams[k]]:
+                team_until[teams[k]] = ends[k]
+            scalars[PENDING] -= 1
+            pending[p] = pending[scalars[PENDING]]
+        else:
+            p += 1
+
+
+@njit(cache=True)
+def _advance(gene, starts, ends, teams, rooms, remaining, pointer, available, free_at, counted, team_until,
+             fixed_order, pending, scalars, durations, team_order, team_order_len, empty_end, empty_room, conflict,
+             checks, trace):
+    """
+    Iterações de `Algorithm.execute` com o gene do passo atual, até agendar uma cirurgia ou a decodificação
+    terminar (`scalars[STATUS]` diferente de `OK`). Retorna (cirurgia, equipe) agendadas, ou (-1, -1).
+
+    Os erros que o `Algorithm` captura e registra no log (`execute`) têm o mesmo efeito aqui: a iteração
+    termina sem agendar nada (índice de equipe inválido, sala sem agendamento anterior) ou a decodificação para com o
+    que já foi agendado (sem equipes no primeiro passo, vaga repetida).
+    """
+    n = durations.shape[0]
+    n_teams = team_order.shape[0]
+    n_rooms = free_at.shape[0]
+    step = scalars[STEP]
+    scheduled_surgery = -1
+    scheduled_team = -1
+
+    while step < n and scalars[STEP] == step and scalars[STATUS] == OK:
+        count = scalars[COUNT]
+        room = scalars[ROOM]
+        time = scalars[TIME]
+        _start_pending(time, starts, ends, teams, team_until, fixed_order, pending, scalars)
+        n_available = 0
+        for team in range(n_teams):
+            if team_until[team] <= time:
+                available[n_available] = team
+                n_available += 1
+
+        if n_available == 0 and step == 0:
+            scalars[STATUS] = NO_TEAMS
+            break
+
+        surgery = -1
+        team = -1
+        start = time
+        if n_available > 0:
+            if gene >= n_available:
+                team = available[n_available - 1]
+            elif gene >= -n_available:
+                team = available[gene] if gene >= 0 else available[n_available + gene]
+
+        if team >= 0:
+            if step == 0 and conflict:
+                scalars[STATUS] = QUIT
+                break
+
+            surgery = _peek(team, team_order, team_order_len, pointer, remaining)
+            if surgery < 0:
+                for i in range(n_available):
+                    surgery = _peek(available[i], team_order, team_order_len, pointer, remaining)
+                    if surgery >= 0:
+                        team = available[i]
+                        break
+            if surgery < 0:
+                for other in range(n_teams):
+                    surgery = _peek(other, team_order, team_order_len, pointer, remaining)
+                    if surgery >= 0:
+                        team = other
+                        break
+                if surgery < 0:
+                    scalars[STATUS] = QUIT
+                    break
+
+                # nenhuma equipe livre tem cirurgias: agenda depois do último agendamento (ou horário vazio) da sala,
+                # cujo término é o `free_at` dela
+                found = counted[room]
+                if found:
+                    start = free_at[room]
+                for k in range(empty_end.shape[0]):
+                    if empty_room[k] == room and (not found or empty_end[k] > start):
+                        start = empty_end[k]
+                        found = True
+                if not found:
+                    surgery = -1
+
+        if surgery >= 0:
+            end = start + durations[surgery]
+            if checks:
+                overlap = False
+                for k in range(count):
+                    if rooms[k] == room and starts[k] < end and ends[k] > start:
+                        if (starts[k] < start and start < ends[k]) or (starts[k] < end and end < ends[k]):
+                            overlap = True
+                            break
+                if overlap:
+                    scalars[STATUS] = QUIT
+                    break
+
+            starts[count] = start
+            ends[count] = end
+            teams[count] = team
+            rooms[count] = room
+            scalars[COUNT] = count + 1
+            remaining[surgery] = False
+            if start <= time:
+                if end > team_until[team]:
+                    team_until[team] = end
+            else:
+                pending[scalars[PENDING]] = count
+                scalars[PENDING] += 1
+            scalars[STEP] = step + 1
+            scheduled_surgery = surgery
+            scheduled_team = team
+            if not counted[room] or end > free_at[room]:
+                free_at[room] = end
+                counted[room] = True
+
+        iteration = scalars[ITERATION]
+        trace[iteration, 0] = surgery
+        trace[iteration, 1] = team
+        trace[iteration, 2] = room
+        trace[iteration, 3] = start
+        trace[iteration, 4] = time
+        trace[iteration, 5] = n_available > 0
+        scalars[ITERATION] = iteration + 1
+
+        # próxima vaga: a sala livre mais cedo, com empates pela ordem das salas
+        best = -1
+        best_time = 0
+        for r in range(n_rooms):
+            value = free_at[r] if counted[r] else 0
+            if best < 0 or value < best_time:
+                best = r
+                best_time = value
+        if best == scalars[LAST_ROOM] and best_time == scalars[LAST_TIME]:
+            scalars[STATUS] = DUPLICATE_VACANCY
+            break
+        scalars[ROOM] = scalars[LAST_ROOM] = best
+        scalars[TIME] = scalars[LAST_TIME] = best_time
+
+    return scheduled_surgery, scheduled_team
+
+
+@njit(cache=True)
+def _decode(genes, durations, team_order, team_order_len, n_rooms, fixed_start, fixed_end, fixed_team, fixed_room,
+            empty_end, empty_room, first_room, conflict, checks, trace):
+    """Laço de `Algorithm.execute` sobre vetores (ver `_advance`). Retorna (término, iterações em `trace`, punição)."""
+    n = durations.shape[0]
+    state = _initial_state(n, team_order.shape[0], n_rooms, fixed_start, fixed_end, fixed_team, fixed_room,
+                           first_room)
+    starts, rooms, scalars = state[0], state[3], state[-1]
+
+    while scalars[STEP] < n and scalars[STATUS] == OK:
+        _advance(genes[scalars[STEP]], *state, durations, team_order, team_order_len, empty_end, empty_room,
+                 conflict, checks, trace)
+
+    if scalars[STATUS] == QUIT:
+        return QUIT, scalars[ITERATION], 0.0
+    punishment = 0
+    for k in range(scalars[COUNT]):
+        if rooms[k] >= 0 and starts[k] > 0:
+            punishment += starts[k] // TICKS_PER_MINUTE
+    return scalars[STATUS], scalars[ITERATION], float(punishment)
+
+
+@njit(cache=True)
+def _decode_population(population, durations, team_order, team_order_len, n_rooms, fixed_start, fixed_end,
+                       fixed_team, fixed_room, empty_end, empty_room, first_room, conflict, checks):
+    statuses = np.zeros(population.shape[0], dtype=np.int64)
+    punishments = np.zeros(population.shape[0], dtype=np.float64)
+    # sem agendar nada a próxima vaga se repete, então há no máximo uma iteração a mais que cirurgias
+    trace = np.empty((population.shape[1] + 1, TRACE_COLUMNS), dtype=np.int64)
+    for i in range(population.shape[0]):
+        statuses[i], _, punishments[i] = _decode(population[i], durations, team_order, team_order_len, n_rooms,
+                                                 fixed_start, fixed_end, fixed_team, fixed_room, empty_end,
+                                                 empty_room, first_room, conflict, checks, trace)
+    return statuses, punishments
+
+
+class DecoderState:
+    """
+    Decodificação compilada (sem as verificações de `additional_tests`) avançada um gene de cada vez, para escolher
+    cada gene depois de ver o efeito dele (ver `seeding.greedy_genome`). `copy` testa um gene sem perder o estado.
+    """
+
+    def __init__(self, arrays: DecoderArrays):
+        self.n = len(arrays.surgeries)
+        self.static = (arrays.durations, arrays.team_order, arrays.team_order_len, arrays.empty_end, arrays.empty_room,
+                       arrays.conflict, False)
+        self.vectors = _initial_state(self.n, arrays.team_order.shape[0], len(arrays.rooms), arrays.fixed_start,
+                                      arrays.fixed_end, arrays.fixed_team, arrays.fixed_room, arrays.first_room)
+        self.trace = np.empty((self.n + 1, TRACE_COLUMNS), dtype=np.int64)
+
+    def copy(self) -> "DecoderState":
+        state = copy(self)
+        # o traço não é lido aqui, então as cópias podem escrever no mesmo
+        state.vectors = tuple(vector.copy() for vector in self.vectors)
+        return state
+
+    def advance(self, gene: int) -> Optional[Tuple[int, int]]:
+        """Decodifica o próximo gene; retorna o par (cirurgia, equipe) agendado, ou None se a decodificação acabou."""
+        surgery, team = _advance(gene, *self.vectors, *self.static, self.trace)
+        return (surgery, team) if surgery >= 0 else None
+
+
+def _raise_for(status: int):
+    """Levanta o erro com que o `Algorithm` teria interrompido a decodificação."""
+    if status == QUIT:
+        logger.error("The surgeries could not be scheduled (already scheduled, overlapping or without any team).")
+        quit()
+    if status == NO_TEAMS:
+        raise AssertionError("Sem equipes.")
+    if status == DUPLICATE_VACANCY:
+        logger.error("The next vacancy is the same as the last one")
+        raise ValueError("Duplicate vacancy")
+
+
+class NumbaAlgorithm(Algorithm):
+    """
+    Mesma decodificação do `Algorithm`, compilada com numba sobre vetores planos (ver `DecoderArrays`).
+
+    `evaluate_population` calcula apenas as punições, sem montar agendamentos no cache; `execute` decodifica com o
+    laço compilado e depois registra os agendamentos resultantes no cache, produzindo o mesmo estado e o mesmo
+    relatório do `Algorithm`. As features (`apply_features`) dependem dos métodos do `Algorithm`, então classes com
+    features usam a decodificação em Python.
+    """
+
+    @classmethod
+    def evaluate_population(cls, population, surgeries: List[Surgery], cache: CacheManager, zero_time: datetime,
+                            catalog: Optional[CandidateCatalog] = None,
+                            checkpoints: Optional[PrefixTrie] = None) -> np.ndarray:
+        if getattr(cls, "__features__", ()):
+            return super().evaluate_population(population, surgeries, cache, zero_time, catalog, checkpoints)
+
+        # a decodificação compilada é barata o bastante para dispensar os checkpoints de prefixo
+        cache.set_time_origin(zero_time)
+        arrays = DecoderArrays(cache, surgeries, zero_time, catalog)
+        if arrays.first_room < 0:
+            raise ValueError(f"No rooms available at {zero_time}: {cache.get_table(Schedule)}")
+
+        # soluções recusadas pelas verificações de `execute` ficam apenas com os agendamentos já existentes
+        population = [[int(gene) for gene in solution] for solution in population]
+        punishments = np.full(len(population), float(arrays.fixed_punishment))
+        valid = [i for i, solution in enumerate(population) if len(solution) == len(surgeries)]
+        if not surgeries or not arrays.teams or not valid:
+            return punishments
+
+        genes = np.array([population[i] for i in valid], dtype=np.int64)
+        statuses, values = _decode_population(genes, *arrays.kernel_args(), additional_tests)
+        for i, status, punishment in zip(valid, statuses, values):
+            if status == QUIT:
+                _raise_for(status)
+            if status == OK and additional_tests and arrays.unscheduled:
+                logger.error(f"this surgery wasn't scheduled: {arrays.unscheduled[0]}")
+                quit()
+            punishments[i] = punishment
+            if LogConfig.optimizer_details:
+                logger.debug(f"Punishment: {punishments[i]}")
+
+        return punishments
+
+    def _decode_solution(self, solution: List[int], checkpoints: Optional[PrefixTrie]) -> pd.DataFrame:
+        if getattr(type(self), "__features__", ()):
+            return super()._decode_solution(solution, checkpoints)
+
+        self.step = 0
+
+        assert self.surgeries, "Sem cirurgias."
+        assert self.cache.get_table(Team), "Sem equipes."
+        assert self.cache.get_table(Room), "Sem salas."
+        assert len(solution) == len(self.surgeries), f"Solução inválida. {len(solution)=}, {len(self.surgeries)=}"
+        self.solution = [int(gene) for gene in solution]
+
+        arrays = DecoderArrays(self.cache, self.surgeries, self.zero_time, self.candidate_catalog)
+        trace = np.empty((len(self.solution) + 1, TRACE_COLUMNS), dtype=np.int64)
+        status, iterations, _ = _decode(np.array(self.solution, dtype=np.int64), *arrays.kernel_args(),
+                                        additional_tests, trace)
+        if status == QUIT:
+            _raise_for(status)
+        self._replay(arrays, trace[:iterations])
+        _raise_for(status)
+
+        room, free_at = self.vacancies.peek()
+        self.next_vacany_room, self.next_vacany = room, self.cache.to_datetime(free_at)
+        self.check_remaining_surgeries()
+        if self.fitness_only:
+            return None
+        return self.schedules_report()
+
+    def _replay(self, arrays: DecoderArrays, trace: np.ndarray):
+        """Registra no cache, na mesma ordem, os agendamentos produzidos pela decodificação compilada."""
+        for surgery, team, room, start, time, listed in trace.tolist():
+            self.next_vacany_room, self.next_vacany = arrays.rooms[room], self.cache.to_datetime(time)
+            if surgery >= 0:
+                self._register_surgery_and_update(arrays.surgeries[surgery], arrays.teams[team],
+                                                  self.next_vacany_room, self.cache.to_datetime(start))
+            if listed and not self.fitness_only:
+                self._timeline.append((self.next_vacany, len(self.cache.get_table(Schedule))))
@@ -0,0 +1,78 @@
+import heapq
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.models import Surgery, SurgeryPossibleRooms, SurgeryPossibleTeams
+from app.services.cache.core.cache_manager import CacheManager
+
+CandidateKey = Tuple[float, int, int]  # (duration / priority, posição em SurgeryPossibleTeams, surgery_id)
+
+
+class CandidateCatalog:
+    """
+    Parte estática do índice de candidatas: as possibilidades de cada equipe (e de cada equipe em cada sala) já
+    ordenadas por prioridade.
+
+    Depende apenas das tabelas estáticas do cache, então pode ser compartilhada por todas as decodificações de um
+    lote (ver `Algorithm.evaluate_population`).
+    """
+
+    def __init__(self, cache: CacheManager):
+        self.cache = cache
+        self._keys: Dict[Tuple[int, Optional[int]], List[CandidateKey]] = {}
+
+    def keys(self, team_id: int, room_id: Optional[int] = None) -> List[CandidateKey]:
+        """Chaves ordenadas das cirurgias que a equipe pode realizar (na sala, se informada)."""
+        if (team_id, room_id) not in self._keys:
+            if room_id is None:
+                keys = []
+                possibles = self.cache.get_by_attribute(SurgeryPossibleTeams, "team_id", team_id)
+                for position, possible in enumerate(possibles):
+                    if possible.team_id == team_id:
+                        surgery = self.cache.get_by_id(Surgery, possible.surgery_id)
+                        keys.append((surgery.duration / (surgery.priority or 1), position, surgery.id))
+                keys.sort()
+            else:
+                allowed = {p.surgery_id for p in self.cache.get_by_attribute(SurgeryPossibleRooms, "room_id", room_id)}
+                keys = [key for key in self.keys(team_id) if key[2] in allowed]
+            self._keys[(team_id, room_id)] = keys
+        return self._keys[(team_id, room_id)]
+
+
+class CandidateIndex:
+    """
+    Cirurgias ainda não agendadas que cada equipe pode realizar, ordenadas por `duration / priority`.
+
+    Há um heap por equipe (ou por equipe e sala, quando a sala também restringe as cirurgias). Cirurgias agendadas
+    saem apenas do conjunto `remaining`; as entradas correspondentes nos heaps são descartadas quando chegam ao topo.
+    Empates seguem a ordem das possibilidades no cache, como a ordenação estável usada antes.
+    """
+
+    def __init__(self, cache: CacheManager, surgeries: Iterable[Surgery], catalog: Optional[CandidateCatalog] = None):
+        self.catalog = catalog or CandidateCatalog(cache)
+        self.remaining: Set[int] = {surgery.id for surgery in surgeries}
+        self._heaps: Dict[Tuple[int, Optional[int]], List[CandidateKey]] = {}
+
+    def __copy__(self):
+        _new = CandidateIndex(self.catalog.cache, [], self.catalog)
+        _new.remaining = set(self.remaining)
+        _new._heaps = {key: list(heap) for key, heap in self._heaps.items()}
+        return _new
+
+    def has_possibilities(self, team_id: int) -> bool:
+        return bool(self.catalog.keys(team_id))
+
+    def discard(self, surgery_id: int):
+        """Remove uma cirurgia agendada dos candidatos."""
+        self.remaining.discard(surgery_id)
+
+    def peek(self, team_id: int, room_id: Optional[int] = None) -> Optional[int]:
+        """Retorna o id da cirurgia prioritária da equipe (restrita às cirurgias possíveis na sala, se informada)."""
+        heap = self._heaps.get((team_id, room_id))
+        if heap is None:
+            # uma lista ordenada já é um heap válido
+            heap = [key for key in self.catalog.keys(team_id, room_id) if key[2] in self.remaining]
+            self._heaps[(team_id, room_id)] = heap
+
+        while heap and heap[0][2] not in self.remaining:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
@@ -0,0 +1,72 @@
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+
+from app.models import Surgery, Schedule, Room, Team
+from app.models.empty_schedule import EmptySchedule
+from app.services.cache.core.cache_manager import CacheManager
+from app.services.cache.core.time_axis import TimeAxis
+from app.services.logic.schedule_builders.structures.candidate_index import CandidateCatalog
+
+
+class DecoderArrays:
+    """
+    Instância do problema em vetores NumPy planos, usada pela decodificação compilada (ver `NumbaAlgorithm`).
+
+    Equipes, salas e cirurgias móveis viram índices (na ordem das tabelas e da lista recebida) e os horários viram
+    ticks a partir de `zero_time`. A elegibilidade das equipes é guardada como a lista de candidatas de cada equipe já
+    ordenada por prioridade (linhas de `team_order`, completadas com -1), na mesma ordem do `CandidateCatalog`.
+    """
+
+    def __init__(self, cache: CacheManager, surgeries: List[Surgery], zero_time: datetime,
+                 catalog: Optional[CandidateCatalog] = None):
+        catalog = catalog or CandidateCatalog(cache)
+        self.surgeries = list(surgeries)
+        self.teams = cache.get_table(Team)
+        self.rooms = cache.get_table(Room)
+
+        surgery_index = {surgery.id: i for i, surgery in enumerate(self.surgeries)}
+        team_index = {team.id: i for i, team in enumerate(self.teams)}
+        room_index = {room.id: i for i, room in enumerate(self.rooms)}
+
+        self.durations = np.array([TimeAxis.minutes(surgery.duration) for surgery in self.surgeries], dtype=np.int64)
+
+        orders = [[surgery_index[key[2]] for key in catalog.keys(team.id) if key[2] in surgery_index]
+                  for team in self.teams]
+        self.team_order = np.full((len(orders), max(map(len, orders), default=0)), -1, dtype=np.int64)
+        for i, order in enumerate(orders):
+            self.team_order[i, :len(order)] = order
+        self.team_order_len = np.array([len(order) for order in orders], dtype=np.int64)
+
+        # agendamentos que já estão no cache (ex.: fixos carregados do banco)
+        schedules = cache.get_table(Schedule)
+        self.fixed_start = np.array([cache.to_ticks(sch.start_time) for sch in schedules], dtype=np.int64)
+        self.fixed_end = self.fixed_start + np.array(
+            [TimeAxis.minutes(cache.get_by_id(Surgery, sch.surgery_id).duration) for sch in schedules], dtype=np.int64)
+        self.fixed_team = np.array([team_index.get(sch.team_id, -1) for sch in schedules], dtype=np.int64)
+        self.fixed_room = np.array([room_index.get(sch.room_id, -1) for sch in schedules], dtype=np.int64)
+        # punição dos agendamentos já existentes (ver `CacheManager.calculate_punishment`)
+        waiting = self.fixed_start[(self.fixed_room >= 0) & (self.fixed_start > 0)]
+        self.fixed_punishment = int(TimeAxis.whole_minutes(waiting).sum())
+
+        empty_schedules = cache.get_table(EmptySchedule)
+        self.empty_end = np.array([cache.to_ticks(sch.start_time) + TimeAxis.minutes(sch.duration)
+                                   for sch in empty_schedules], dtype=np.int64)
+        self.empty_room = np.array([room_index.get(sch.room_id, -1) for sch in empty_schedules], dtype=np.int64)
+
+        available_rooms = cache.get_available_rooms(zero_time)
+        self.first_room = room_index[available_rooms[0].id] if available_rooms else -1
+
+        scheduled = {sch.surgery_id for sch in schedules}
+        # alguma cirurgia móvel já está agendada (o algoritmo se recusa a decodificar)
+        self.conflict = any(surgery.id in scheduled for surgery in self.surgeries)
+        # cirurgias da tabela que não estão agendadas nem serão decodificadas
+        self.unscheduled = [surgery for surgery in cache.get_table(Surgery)
+                            if surgery.id not in scheduled and surgery.id not in surgery_index]
+
+    def kernel_args(self) -> tuple:
+        """Argumentos estáticos da decodificação compilada, na ordem esperada por ela."""
+        return (self.durations, self.team_order, self.team_order_len, len(self.rooms), self.fixed_start,
+                self.fixed_end, self.fixed_team, self.fixed_room, self.empty_end, self.empty_room, self.first_room,
+                self.conflict)
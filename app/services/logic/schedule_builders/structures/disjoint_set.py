@@ -0,0 +1,49 @@
+from typing import Dict, Hashable, Iterable, List
+
+
+class DisjointSet:
+    """
+    Union-find com compressão de caminho e união por tamanho.
+
+    Os elementos são criados na primeira vez que aparecem; `groups` devolve os conjuntos na ordem em que o primeiro
+    elemento de cada um foi visto, então o resultado não depende da ordem das uniões.
+    """
+
+    def __init__(self, items: Iterable[Hashable] = ()):
+        self._parent: Dict[Hashable, Hashable] = {}
+        self._size: Dict[Hashable, int] = {}
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self._parent)
+
+    def add(self, item: Hashable):
+        if item not in self._parent:
+            self._parent[item] = item
+            self._size[item] = 1
+
+    def find(self, item: Hashable) -> Hashable:
+        self.add(item)
+        root = item
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[item] != root:
+            self._parent[item], item = root, self._parent[item]
+        return root
+
+    def union(self, a: Hashable, b: Hashable) -> Hashable:
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self._size[a] < self._size[b]:
+            a, b = b, a
+        self._parent[b] = a
+        self._size[a] += self._size[b]
+        return a
+
+    def groups(self) -> List[List[Hashable]]:
+        groups: Dict[Hashable, List[Hashable]] = {}
+        for item in self._parent:
+            groups.setdefault(self.find(item), []).append(item)
+        return list(groups.values())
@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+
+class _Node:
+    __slots__ = ("children", "value", "parent", "gene")
+
+    def __init__(self, parent: Optional["_Node"] = None, gene: Optional[int] = None):
+        self.children: Dict[int, _Node] = {}
+        self.value: Any = None
+        self.parent = parent
+        self.gene = gene
+
+
+class PrefixTrie:
+    """
+    Trie de prefixos de genomas, com um valor opcional (ex.: estado salvo da decodificação) em cada nó.
+
+    Guarda no máximo `capacity` valores; ao passar do limite, descarta o usado há mais tempo e remove os ramos que
+    ficaram vazios.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._root = _Node()
+        self._lru: "OrderedDict[_Node, None]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._lru)
+
+    def longest_prefix(self, genes: Sequence[int]) -> Tuple[int, Any]:
+        """Retorna (tamanho, valor) do maior prefixo de `genes` que possui valor, ou (0, None)."""
+        node, found = self._root, None
+        for depth, gene in enumerate(genes, start=1):
+            node = node.children.get(gene)
+            if node is None:
+                break
+            if node.value is not None:
+                found = depth, node
+        if found is None:
+            return 0, None
+
+        depth, node = found
+        self._lru.move_to_end(node)
+        return depth, node.value
+
+    def insert(self, genes: Sequence[int], value: Any):
+        node = self._root
+        for gene in genes:
+            child = node.children.get(gene)
+            if child is None:
+                child = node.children[gene] = _Node(node, gene)
+            node = child
+
+        node.value = value
+        self._lru[node] = None
+        self._lru.move_to_end(node)
+        while len(self._lru) > self.capacity:
+            evicted, _ = self._lru.popitem(last=False)
+            self._discard(evicted)
+
+    def _discard(self, node: _Node):
+        node.value = None
+        while node.parent is not None and node.value is None and not node.children:
+            del node.parent.children[node.gene]
+            node = node.parent
@@ -0,0 +1,23 @@
+from typing import Iterable
+
+
+class TrackedGenome(list):
+    """
+    Genoma que registra quantos genes (prefixo) a decodificação já leu.
+
+    O estado do algoritmo depende apenas dos genes lidos, então ele pode ser salvo e reaproveitado por qualquer genoma
+    com o mesmo prefixo (ver `Algorithm.execute`).
+    """
+
+    def __init__(self, genes: Iterable[int]):
+        super().__init__(genes)
+        self.read = 0
+
+    def __getitem__(self, index):
+        if isinstance(index, int) and index >= self.read:
+            self.read = index + 1
+        return super().__getitem__(index)
+
+    @property
+    def prefix(self) -> tuple:
+        return tuple(int(gene) for gene in list.__getitem__(self, slice(0, self.read)))
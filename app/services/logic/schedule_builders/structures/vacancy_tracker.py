@@ -0,0 +1,58 @@
+import heapq
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models import Room
+
+
+class VacancyTracker:
+    """
+    Fila de prioridade com o horário em que cada sala fica livre.
+
+    Cada sala guarda o maior fim entre os agendamentos que contam para ela; quando esse fim muda, uma nova entrada é
+    empilhada e a antiga fica obsoleta, sendo descartada apenas quando chega ao topo (remoção preguiçosa). Empates são
+    resolvidos pela ordem das salas na tabela, como na ordenação estável usada antes.
+    """
+
+    def __init__(self, rooms: List[Room], default: Any):
+        self.default = default
+        self._rooms: Dict[int, Room] = {room.id: room for room in rooms}
+        self._order: Dict[int, int] = {room.id: i for i, room in enumerate(rooms)}
+        self._free_at: Dict[int, Optional[Any]] = {room.id: None for room in rooms}
+        self._heap: List[Tuple[Any, int, int]] = []
+        for room in rooms:
+            self._push(room.id)
+
+    def __copy__(self):
+        _new = VacancyTracker([], self.default)
+        _new._rooms = self._rooms
+        _new._order = self._order
+        _new._free_at = dict(self._free_at)
+        _new._heap = list(self._heap)
+        return _new
+
+    def __len__(self):
+        return len(self._rooms)
+
+    def free_at(self, room_id: int) -> Any:
+        """Horário em que a sala fica livre; `default` se nenhum agendamento conta para ela."""
+        free_at = self._free_at[room_id]
+        return self.default if free_at is None else free_at
+
+    def extend(self, room_id: int, end: Any):
+        """Considera um novo agendamento na sala terminando em `end`."""
+        current = self._free_at[room_id]
+        if current is None or end > current:
+            self._free_at[room_id] = end
+            self._push(room_id)
+
+    def peek(self) -> Tuple[Room, Any]:
+        """Retorna a sala que fica livre mais cedo, sem removê-la."""
+        while self._heap:
+            free_at, _, room_id = self._heap[0]
+            if free_at == self.free_at(room_id):
+                return self._rooms[room_id], free_at
+            heapq.heappop(self._heap)
+        raise ValueError("No vacancies found.")
+
+    def _push(self, room_id: int):
+        heapq.heappush(self._heap, (self.free_at(room_id), self._order[room_id], room_id))
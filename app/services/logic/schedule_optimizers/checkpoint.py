@@ -0,0 +1,65 @@
+import os
+import pickle
+import random
+from pathlib import Path
+from typing import Any, List, Optional
+
+import numpy as np
+from loguru import logger
+
+
+class Checkpoint:
+    """
+    Estado do algoritmo genético ao fim de uma geração, para retomar uma execução interrompida (ver
+    `Optimizer.start_ga`): população e fitness (alinhadas, como no `on_generation` do pygad), gerações concluídas e
+    os estados dos geradores aleatórios do numpy e do `random`, que são os usados pelo pygad. Com eles a execução
+    retomada segue exatamente como a original teria seguido.
+
+    `instance` é o `instance_hash` do problema; um checkpoint só é carregado para a mesma instância.
+    """
+
+    def __init__(self, instance: str, generations: int, population: List[List[int]], fitness: List[float],
+                 numpy_state: Any, random_state: Any):
+        self.instance = instance
+        self.generations = generations
+        self.population = population
+        self.fitness = fitness
+        self.numpy_state = numpy_state
+        self.random_state = random_state
+
+    @classmethod
+    def capture(cls, instance: str, ga_instance) -> "Checkpoint":
+        return cls(instance, ga_instance.generations_completed, ga_instance.population.astype(int).tolist(),
+                   [float(fitness) for fitness in ga_instance.last_generation_fitness], np.random.get_state(),
+                   random.getstate())
+
+    def restore_random(self):
+        np.random.set_state(self.numpy_state)
+        random.setstate(self.random_state)
+
+    def save(self, path: str | Path):
+        """Grava num arquivo temporário e troca de nome, para um processo morto no meio não corromper o anterior."""
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as file:
+            pickle.dump(self, file)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str | Path, instance: str) -> Optional["Checkpoint"]:
+        """Checkpoint de `save` para `instance` (None se o arquivo faltar, for inválido ou de outra instância)."""
+        if not Path(path).exists():
+            return None
+        try:
+            with open(path, "rb") as file:
+                checkpoint = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            logger.warning(f"Could not load checkpoint from {path}: {e}")
+            return None
+        if not isinstance(checkpoint, cls) or checkpoint.instance != instance:
+            logger.warning(f"Checkpoint {path} belongs to another instance, ignoring it")
+            return None
+        return checkpoint
+
+    @staticmethod
+    def remove(path: str | Path):
+        Path(path).unlink(missing_ok=True)
@@ -0,0 +1,118 @@
+import math
+import random
+from typing import Dict, List, Optional, Tuple, Type
+
+from app.config import DefaultConfig
+from app.services.logic.schedule_optimizers.stop_criteria import StopCriteria
+
+
+class Engine:
+    """
+    Motor de busca local sobre o genoma do `Optimizer` (alternativa ao algoritmo genético do pygad, ou refinamento
+    da solução dele, ver `Optimizer.run`).
+
+    A vizinhança é a de um gene: um movimento troca o valor de um só gene por outro do `gene_space`, o que custa uma
+    decodificação (que reaproveita o prefixo já decodificado) em vez de uma geração inteira. `fitness_func` tem a
+    assinatura em lote do pygad (`Optimizer.batch_fitness_function`). A busca para depois de `evaluations`
+    avaliações ou quando `criteria` manda parar (as iterações fazem o papel das gerações).
+    """
+
+    name = ""
+
+    def __init__(self, fitness_func, gene_space: List[Dict[str, int]], criteria: StopCriteria, evaluations: int,
+                 seed: Optional[int] = None):
+        self.fitness_func = fitness_func
+        self.gene_space = gene_space
+        self.criteria = criteria
+        self.evaluations = evaluations
+        self.rng = random.Random(seed)
+        self.movable = [i for i, space in enumerate(gene_space) if space["high"] > space["low"]]
+        self.evaluated = 0
+        self.iterations = 0
+
+    def evaluate(self, genomes: List[List[int]]) -> List[float]:
+        self.evaluated += len(genomes)
+        return [float(fitness) for fitness in self.fitness_func(None, genomes, None)]
+
+    def move(self, genome: List[int]) -> Tuple[int, int]:
+        """Sorteia um movimento (gene, novo valor) diferente do valor atual do gene."""
+        i = self.rng.choice(self.movable)
+        space = self.gene_space[i]
+        value = self.rng.randrange(space["low"], space["high"])
+        if value >= genome[i]:
+            value += 1
+        return i, value
+
+    def exhausted(self, best: float) -> bool:
+        if not self.movable:
+            return True
+        if self.evaluated >= self.evaluations:
+            self.criteria.reason = "evaluations"
+            return True
+        return self.criteria.check(self.iterations, -best) == "stop"
+
+    def search(self, genome: List[int]) -> Tuple[List[int], float]:
+        """Busca a partir de `genome`; retorna o melhor genoma visto e a sua fitness (nunca pior que a de partida)."""
+        raise NotImplementedError
+
+
+class SimulatedAnnealing(Engine):
+    """
+    Recozimento simulado: cada iteração avalia um vizinho e aceita as pioras com probabilidade exp(Δ/T). A
+    temperatura inicial é `DefaultConfig.annealing_temperature` vezes a punição do genoma de partida e cai
+    pelo fator `DefaultConfig.annealing_cooling` a cada iteração.
+    """
+
+    name = "annealing"
+
+    def search(self, genome: List[int]) -> Tuple[List[int], float]:
+        current = best = self.evaluate([genome])[0]
+        best_genome = genome
+        temperature = DefaultConfig.annealing_temperature * max(1.0, abs(current))
+        while not self.exhausted(best):
+            self.iterations += 1
+            i, value = self.move(genome)
+            candidate = genome[:i] + [value] + genome[i + 1:]
+            fitness = self.evaluate([candidate])[0]
+            delta = fitness - current
+            if delta >= 0 or (temperature > 0 and self.rng.random() < math.exp(delta / temperature)):
+                genome, current = candidate, fitness
+                if current > best:
+                    best_genome, best = genome, current
+            temperature *= DefaultConfig.annealing_cooling
+        return best_genome, best
+
+
+class TabuSearch(Engine):
+    """
+    Busca tabu: cada iteração avalia em lote `DefaultConfig.tabu_neighbours` vizinhos e vai para o melhor deles,
+    mesmo que piore. Desfazer um movimento (voltar o gene ao valor anterior) fica proibido por
+    `DefaultConfig.tabu_tenure` iterações, a menos que leve a uma fitness melhor que a melhor já vista (aspiração).
+    """
+
+    name = "tabu"
+
+    def search(self, genome: List[int]) -> Tuple[List[int], float]:
+        best = self.evaluate([genome])[0]
+        best_genome = genome
+        # (gene, valor) -> última iteração em que voltar o gene a esse valor é proibido
+        tabu: Dict[Tuple[int, int], int] = {}
+        while not self.exhausted(best):
+            self.iterations += 1
+            moves = list(dict.fromkeys(self.move(genome) for _ in range(DefaultConfig.tabu_neighbours)))
+            candidates = [genome[:i] + [value] + genome[i + 1:] for i, value in moves]
+            scores = self.evaluate(candidates)
+            for k in sorted(range(len(moves)), key=lambda k: scores[k], reverse=True):
+                if tabu.get(moves[k], 0) < self.iterations or scores[k] > best:
+                    break
+            else:
+                continue
+            i, value = moves[k]
+            tabu[(i, genome[i])] = self.iterations + DefaultConfig.tabu_tenure
+            genome = candidates[k]
+            if scores[k] > best:
+                best_genome, best = genome, scores[k]
+        return best_genome, best
+
+
+ENGINES: Dict[str, Type[Engine]] = {engine.name: engine for engine in (SimulatedAnnealing, TabuSearch)}
@@ -0,0 +1,130 @@
+import hashlib
+import pickle
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Type
+
+from loguru import logger
+
+from app.models import Surgery, Schedule
+from app.models.empty_schedule import EmptySchedule
+from app.services.cache.cache_in_dict import CacheInDict
+from app.services.logic.schedule_builders.algorithm import Algorithm
+from moonlogger import MoonLogger
+
+FitnessKey = Tuple[str, Tuple[int, ...]]
+
+
+def instance_hash(cache: CacheInDict, surgeries: List[Surgery], algorithm_base: Type[Algorithm],
+                  zero_time: datetime) -> str:
+    """
+    Identifica a instância do problema: tabelas estáticas, agendamentos já existentes, cirurgias móveis e a classe do
+    algoritmo (com suas features).
+
+    Os horários dos agendamentos entram relativos ao `zero_time`, pois a punição só depende dessa diferença; assim,
+    execuções em horários diferentes sobre os mesmos dados reaproveitam as avaliações.
+    """
+    digest = hashlib.sha1()
+
+    def update(value):
+        digest.update(repr(value).encode())
+
+    for table in cache.get_table_classes():
+        update(table.__tablename__)
+        for row in cache.get_table(table):
+            values = row.model_dump()
+            if table in (Schedule, EmptySchedule):
+                values = {k: v - zero_time if isinstance(v, datetime) else v for k, v in values.items()}
+            update(sorted(values.items()))
+
+    update([surgery.id for surgery in surgeries])
+    update(getattr(algorithm_base, "__base_algorithm__", algorithm_base).__qualname__)
+    update([feature.__qualname__ for feature in getattr(algorithm_base, "__features__", ())])
+    return digest.hexdigest()
+
+
+class FitnessCache:
+    """
+    Cache LRU de fitness por genoma.
+
+    A chave é (hash da instância, genes), então o mesmo cache pode ser reaproveitado entre execuções do otimizador
+    sem misturar instâncias diferentes. Acertos e falhas são contados em `MoonLogger.counter_dict`.
+    """
+
+    _shared: Optional["FitnessCache"] = None
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[FitnessKey, float]" = OrderedDict()
+
+    @classmethod
+    def shared(cls, maxsize: int) -> "FitnessCache":
+        """Cache mantido entre execuções no mesmo processo (ex.: várias execuções pelo pywebio_app)."""
+        if cls._shared is None:
+            cls._shared = cls(maxsize)
+        cls._shared.maxsize = maxsize
+        return cls._shared
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: FitnessKey):
+        return key in self._data
+
+    def get(self, key: FitnessKey) -> Optional[float]:
+        if key not in self._data:
+            MoonLogger.count("FitnessCache.misses")
+            return None
+        MoonLogger.count("FitnessCache.hits")
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key: FitnessKey, fitness: float):
+        self._data[key] = fitness
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    @staticmethod
+    def key(instance: str, solution: Sequence[int]) -> FitnessKey:
+        return instance, tuple(int(gene) for gene in solution)
+
+    def evaluate(self, instance: str, solutions: Sequence[Sequence[int]],
+                 evaluate_batch: Callable[[List[Sequence[int]]], List[float]]) -> List[float]:
+        """Fitness de um lote, avaliando (uma única vez) apenas os genomas que ainda não estão no cache."""
+        results: Dict[Hashable, float] = {}
+        missing: Dict[Hashable, Sequence[int]] = {}
+        keys = [self.key(instance, solution) for solution in solutions]
+
+        for key, solution in zip(keys, solutions):
+            if key in results or key in missing:
+                MoonLogger.count("FitnessCache.hits")
+            elif (fitness := self.get(key)) is not None:
+                results[key] = fitness
+            else:
+                missing[key] = solution
+
+        if missing:
+            for key, fitness in zip(missing, evaluate_batch(list(missing.values()))):
+                results[key] = fitness
+                self.put(key, fitness)
+
+        return [results[key] for key in keys]
+
+    def save(self, path: str | Path):
+        with open(path, "wb") as file:
+            pickle.dump(list(self._data.items()), file)
+
+    def load(self, path: str | Path):
+        """Carrega avaliações salvas por `save`; um arquivo ausente ou inválido é ignorado."""
+        if not Path(path).exists():
+            return
+        try:
+            with open(path, "rb") as file:
+                items = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning(f"Could not load fitness cache from {path}: {e}")
+            return
+        for key, fitness in items:
+            self.put(key, fitness)
@@ -0,0 +1,106 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+
+from app.config import DefaultConfig
+from app.models import Surgery
+from app.services.cache.cache_in_dict import CacheInDict
+from app.services.logic.schedule_builders.algorithm import Algorithm
+from app.services.logic.schedule_builders.functions.apply_features import apply_features
+from app.services.logic.schedule_builders.structures.candidate_index import CandidateCatalog
+from app.services.logic.schedule_builders.structures.prefix_trie import PrefixTrie
+from moonlogger import MoonLogger
+
+
+def evaluate_solution(algorithm_base: Type[Algorithm], surgeries: List[Surgery], cache: CacheInDict,
+                      zero_time: datetime, solution: Sequence[int]) -> float:
+    """Executa o algoritmo para uma solução e retorna o fitness (punição negativa)."""
+    return evaluate_batch(algorithm_base, surgeries, cache, zero_time, [solution])[0]
+
+
+def evaluate_batch(algorithm_base: Type[Algorithm], surgeries: List[Surgery], cache: CacheInDict,
+                   zero_time: datetime, solutions: Sequence[Sequence[int]],
+                   catalog: Optional[CandidateCatalog] = None,
+                   checkpoints: Optional[PrefixTrie] = None) -> List[float]:
+    """Fitness (punição negativa) de um lote de soluções, na mesma ordem."""
+    punishments = algorithm_base.evaluate_population(solutions, surgeries, cache, zero_time, catalog, checkpoints)
+    return [-float(punishment) for punishment in punishments]
+
+
+def decoder_checkpoints() -> Optional[PrefixTrie]:
+    """Trie de estados da decodificação compartilhada entre as gerações (`DefaultConfig.decoder_checkpoints`)."""
+    if not DefaultConfig.decoder_checkpoints:
+        return None
+    return PrefixTrie(DefaultConfig.decoder_trie_size)
+
+
+def algorithm_spec(algorithm_base: Type[Algorithm]) -> Tuple[Type[Algorithm], tuple]:
+    """Separa uma classe criada por `apply_features` em (classe base, features), que podem ser serializadas."""
+    return getattr(algorithm_base, "__base_algorithm__", algorithm_base), getattr(algorithm_base, "__features__", ())
+
+
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(cache: CacheInDict, base: Type[Algorithm], features: tuple, surgeries: List[Surgery],
+                 zero_time: datetime):
+    # com fork o processo herda as medições do principal, que não devem voltar para ele em `drain`
+    MoonLogger.start_process()
+    # as tabelas estáticas chegam uma única vez por processo; cada avaliação faz só a cópia copy-on-write
+    _worker_state.update(
+        algorithm_base=apply_features(base, *features) if features else base,
+        surgeries=surgeries,
+        cache=cache,
+        zero_time=zero_time,
+        catalog=CandidateCatalog(cache),
+        checkpoints=decoder_checkpoints(),
+    )
+
+
+def _evaluate_in_worker(solutions: List[List[int]]) -> Tuple[List[float], dict]:
+    return evaluate_batch(solutions=solutions, **_worker_state), MoonLogger.drain()
+
+
+class FitnessPool:
+    """
+    Pool de processos para avaliar a população do algoritmo genético em paralelo.
+
+    O cache, as cirurgias móveis e a classe do algoritmo são enviados a cada processo apenas na inicialização do pool.
+    A ordem dos resultados segue a ordem das soluções, então o resultado é o mesmo da avaliação serial. As medições
+    do `MoonLogger` feitas nos processos voltam com cada lote e são somadas às do processo principal.
+    """
+
+    def __init__(self, workers: int, cache: CacheInDict, algorithm_base: Type[Algorithm], surgeries: List[Surgery],
+                 zero_time: datetime):
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(cache, *algorithm_spec(algorithm_base), surgeries, zero_time),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+    def evaluate(self, solutions: Sequence[Sequence[int]]) -> List[float]:
+        solutions = [[int(gene) for gene in solution] for solution in solutions]
+        size = max(1, len(solutions) // (self.workers * 4))
+        batches = [solutions[i:i + size] for i in range(0, len(solutions), size)]
+        fitness = []
+        for batch, measurements in self._executor.map(_evaluate_in_worker, batches):
+            fitness.extend(batch)
+            MoonLogger.merge(measurements)
+        return fitness
+
+    def fitness_function(self):
+        """Função de fitness em lote para o pygad (usar com `fitness_batch_size`)."""
+        def function(ga_instance, solutions, solutions_idx):
+            return self.evaluate(solutions)
+
+        return function
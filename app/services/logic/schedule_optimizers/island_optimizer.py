@@ -0,0 +1,132 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import numpy as np
+from loguru import logger
+
+from app.config import DefaultConfig
+from app.services.cache.cache_in_dict import CacheInDict
+from app.services.logic.schedule_builders.algorithm import Algorithm
+from app.services.logic.schedule_builders.functions.apply_features import apply_features
+from app.services.logic.schedule_optimizers.fitness_pool import algorithm_spec
+from app.services.logic.schedule_optimizers.optimizer import Optimizer
+from moonlogger import MoonLogger
+
+# operadores de cada ilha (parâmetros do pygad que substituem os do `DefaultConfig`), em rodízio
+ISLAND_SETTINGS: List[Dict[str, Any]] = [
+    {},
+    {"crossover_type": "two_points", "parent_selection_type": "tournament"},
+    {"crossover_type": "uniform", "parent_selection_type": "rank", "mutation_percent_genes": 20},
+    {"crossover_type": "scattered", "parent_selection_type": "rws", "mutation_percent_genes": 5},
+]
+
+_island_state: Dict[str, Any] = {}
+
+
+def _init_island(cache: CacheInDict, base: Type[Algorithm], features: tuple, zero_time: datetime,
+                 warm_start: Optional[List[int]]):
+    MoonLogger.start_process()
+    # cada ilha já ocupa um processo; a avaliação da população dela não abre outro pool
+    DefaultConfig.workers = 1
+    optimizer = Optimizer(cache=cache, algorithm_base=apply_features(base, *features) if features else base,
+                          zero_time=zero_time)
+    optimizer.warm_start = warm_start
+    _island_state.update(
+        optimizer=optimizer,
+        fitness_func=optimizer.memoized(optimizer.batch_fitness_function(), optimizer.fitness_cache()),
+    )
+
+
+def _evolve_island(island: int, population: Optional[List[List[int]]], generations: int,
+                   seed: Optional[int]) -> Tuple[List[List[int]], List[float], dict]:
+    """Roda `generations` gerações de uma ilha a partir da sua população (None: população inicial semeada)."""
+    optimizer: Optimizer = _island_state["optimizer"]
+    overrides = dict(ISLAND_SETTINGS[island % len(ISLAND_SETTINGS)], num_generations=generations, random_seed=seed)
+    if population is not None:
+        overrides["initial_population"] = population
+    ga_instance = optimizer.build_ga(_island_state["fitness_func"], fitness_batch_size=DefaultConfig.sol_per_pop,
+                                     **overrides)
+    ga_instance.run()
+    return (ga_instance.population.astype(int).tolist(), [float(f) for f in ga_instance.last_generation_fitness],
+            MoonLogger.drain())
+
+
+def migrate(populations: List[List[List[int]]], fitness: List[List[float]], migrants: int):
+    """
+    Migração em anel: os `migrants` melhores genomas de cada ilha substituem os piores da ilha seguinte (no lugar,
+    junto com as fitness). As ilhas enviam as populações de antes da migração.
+    """
+    outgoing = []
+    for population, scores in zip(populations, fitness):
+        best = np.argsort(scores)[::-1][:migrants]
+        outgoing.append([(list(population[i]), scores[i]) for i in best])
+    for island, population in enumerate(populations):
+        scores = fitness[island]
+        incoming = outgoing[island - 1]
+        worst = np.argsort(scores)[:len(incoming)]
+        for i, (genome, score) in zip(worst, incoming):
+            population[i], scores[i] = genome, score
+
+
+class IslandOptimizer(Optimizer):
+    """
+    Modelo de ilhas: `DefaultConfig.islands` populações evoluem em processos separados, cada uma com a sua semente e
+    os seus operadores (`ISLAND_SETTINGS`), e a cada `DefaultConfig.migration_interval` gerações (uma época) trocam
+    os `DefaultConfig.migrants` melhores genomas (`migrate`). Substitui `Optimizer.run_ga`; os critérios de parada são
+    verificados ao fim de cada época.
+    """
+
+    # entropia das sementes de uma execução sem `DefaultConfig.random_seed` (sorteada no início do `run_ga`)
+    entropy: Optional[int] = None
+
+    def islands(self) -> int:
+        return max(1, DefaultConfig.islands)
+
+    def island_seed(self, island: int, epoch: int) -> int:
+        """
+        Semente de uma ilha numa época. Sem `DefaultConfig.random_seed` ela sai de uma `SeedSequence` sorteada por
+        execução: os processos das ilhas herdam o mesmo estado aleatório do pai e, sem semente, evoluiriam iguais.
+        """
+        if DefaultConfig.random_seed is not None:
+            return DefaultConfig.random_seed + 1000 * epoch + island
+        if self.entropy is None:
+            self.entropy = np.random.SeedSequence().entropy
+        return int(np.random.SeedSequence(self.entropy, spawn_key=(epoch, island)).generate_state(1)[0])
+
+    def run_ga(self) -> List[int]:
+        islands = self.islands()
+        total = self.num_generations()
+        interval = max(1, DefaultConfig.migration_interval)
+        criteria = self.stop_criteria()
+        populations: List[Optional[List[List[int]]]] = [None] * islands
+        fitness: List[List[float]] = [[] for _ in range(islands)]
+        best: Tuple[float, Optional[List[int]]] = (-float("inf"), None)
+        generations, epoch = 0, 0
+        self.entropy = None
+
+        with ProcessPoolExecutor(max_workers=min(islands, os.cpu_count() or 1), initializer=_init_island,
+                                 initargs=(self.cache, *algorithm_spec(self.algorithm_base), self.zero_time,
+                                           self.warm_start)) as executor:
+            while generations < total:
+                step = min(interval, total - generations)
+                futures = [executor.submit(_evolve_island, island, populations[island], step,
+                                           self.island_seed(island, epoch)) for island in range(islands)]
+                for island, future in enumerate(futures):
+                    populations[island], fitness[island], measurements = future.result()
+                    MoonLogger.merge(measurements)
+                    i = int(np.argmax(fitness[island]))
+                    if fitness[island][i] > best[0]:
+                        best = fitness[island][i], populations[island][i]
+                generations, epoch = generations + step, epoch + 1
+
+                if criteria.check(generations, -best[0]) == "stop":
+                    break
+                if generations < total and islands > 1:
+                    migrate(populations, fitness, DefaultConfig.migrants)
+
+        self.stop_reason, self.generations_run = criteria.reason, generations
+        logger.info(f"Island optimizer ({islands} islands) stopped after {generations} generations "
+                    f"({self.stop_reason}) in {criteria.elapsed():.2f}s, best punishment {-best[0]}")
+        return best[1]
@@ -1,5 +1,6 @@
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Type
+from typing import Any, List, Dict, Type, Optional, Sequence, Tuple
 
 import pygad
 from loguru import logger
@@ -8,18 +9,45 @@ from app.config import LogConfig, DefaultConfig
 from app.models import Team, Room, Surgery
 from app.services.cache.cache_in_dict import CacheInDict
 from app.services.logic.schedule_builders.algorithm import Algorithm
+from app.services.logic.schedule_builders.features.room_limiter import RoomLimiter
+from app.services.logic.schedule_builders.functions.apply_features import apply_features
+from app.services.logic.schedule_builders.structures.candidate_index import CandidateCatalog
+from app.services.logic.schedule_optimizers.checkpoint import Checkpoint
+from app.services.logic.schedule_optimizers.engines import ENGINES
+from app.services.logic.schedule_optimizers.fitness_cache import FitnessCache, instance_hash
+from app.services.logic.schedule_optimizers.fitness_pool import FitnessPool, evaluate_batch, evaluate_solution, \
+    decoder_checkpoints, algorithm_spec
+from app.services.logic.schedule_optimizers.seeding import heuristic_genomes, encode_schedule
 from app.services.logic.schedule_optimizers.solver import Solver
+from app.services.logic.schedule_optimizers.stop_criteria import StopCriteria, punishment_lower_bound
 from moonlogger import MoonLogger
 
 
 class Optimizer:
-    def __init__(self, cache: CacheInDict = None, algorithm_base: Type[Algorithm] = Algorithm):
+    def __init__(self, cache: CacheInDict = None, algorithm_base: Type[Algorithm] = Algorithm,
+                 zero_time: Optional[datetime] = None):
         assert type(cache) == CacheInDict, f"Invalid cache type: {type(cache)}"
 
         self.cache = cache
-        self.zero_time = datetime.now()
+        self.zero_time = zero_time or datetime.now()
         self.solver = Solver(cache)
+        self.algorithm_base = algorithm_base
         self.algorithm = algorithm_base(self.solver.mobile_surgeries, cache, self.zero_time)
+        # preenchidos por `run`: por que a busca parou e quantas gerações foram concluídas
+        self.stop_reason: Optional[str] = None
+        self.generations_run = 0
+        # genoma do plano anterior e os agendamentos dele (ver `warm_start_from`)
+        self.warm_start: Optional[List[int]] = None
+        self.previous: Optional[List[Any]] = None
+
+    def warm_start_from(self, schedules: Sequence[Any]):
+        """
+        Parte de um plano já existente: o genoma que o reproduz entra primeiro na população inicial e `run` usa o
+        orçamento menor de `DefaultConfig.warm_start_generations` e `warm_start_time_budget`.
+        """
+        self.previous = list(schedules)
+        self.warm_start = encode_schedule(self.cache, self.solver.mobile_surgeries, self.zero_time,
+                                          self.solver.gene_space(), self.previous)
 
     @MoonLogger.log_func(enabled=LogConfig.optimizer_details)
     def gene_space(self) -> List[Dict[str, int]]:
@@ -37,7 +65,8 @@ class Optimizer:
     def function2(self, ga_instance, solution, solution_idx):
         if LogConfig.optimizer_details:
             logger.debug(f"Solution: {solution}, {solution_idx=}")
-        algorithm = Algorithm(self.solver.mobile_surgeries, self.cache, self.zero_time)
+        algorithm = self.algorithm_base(self.solver.mobile_surgeries, self.cache, self.zero_time)
+        algorithm.fitness_only = True
         try:
             algorithm.execute(solution)
         except Exception as e:
@@ -54,42 +83,312 @@ class Optimizer:
             def function2(self, ga_instance, solution, solution_idx):
                 if LogConfig.optimizer_details:
                     logger.debug(f"Solution: {solution}, {solution_idx=}")
-                algorithm = Algorithm(self.solver.mobile_surgeries, self.cache, self.zero_time)
-                try:
-                    algorithm.execute(solution)
-                except Exception as e:
-
-                    logger.error(f"Error in fitness function: {e}")
-                    return -float("inf")
-                punishment = algorithm.cache.calculate_punishment(self.zero_time)
-                if LogConfig.optimizer_details:
-                    logger.debug(f"Punishment: {punishment}")
-                return -punishment
+                return evaluate_solution(self.algorithm_base, self.solver.mobile_surgeries, self.cache,
+                                         self.zero_time, solution)
 
             return function2(self, ga_instance, solution, solution_idx)
 
         return function
 
-    @MoonLogger.log_func(enabled=LogConfig.optimizer_details)
-    def run(self) -> List[int]:
-        gene_space_array = self.solver.gene_space()
+    def batch_fitness_function(self):
+        """Função de fitness em lote para o pygad: as candidatas de cada equipe são preparadas uma vez só."""
+        catalog = CandidateCatalog(self.cache)
+        checkpoints = decoder_checkpoints()
+
+        def function(ga_instance, solutions, solutions_idx):
+            return evaluate_batch(self.algorithm_base, self.solver.mobile_surgeries, self.cache, self.zero_time,
+                                  solutions, catalog, checkpoints)
+
+        return function
+
+    def fitness_cache(self) -> Optional[FitnessCache]:
+        if not DefaultConfig.fitness_cache_size:
+            return None
+        if DefaultConfig.fitness_cache_persist:
+            fitness_cache = FitnessCache.shared(DefaultConfig.fitness_cache_size)
+        else:
+            fitness_cache = FitnessCache(DefaultConfig.fitness_cache_size)
+        if DefaultConfig.fitness_cache_path:
+            fitness_cache.load(DefaultConfig.fitness_cache_path)
+        return fitness_cache
+
+    def memoized(self, fitness_func, fitness_cache: Optional[FitnessCache]):
+        """Envolve uma função de fitness em lote para consultar o cache antes de decodificar cada genoma."""
+        if fitness_cache is None:
+            return fitness_func
+        instance = instance_hash(self.cache, self.solver.mobile_surgeries, self.algorithm_base, self.zero_time)
+
+        def function(ga_instance, solutions, solutions_idx):
+            return fitness_cache.evaluate(instance, solutions, lambda missing: fitness_func(ga_instance, missing, None))
+
+        return function
+
+    @staticmethod
+    def traced(fitness_func):
+        """Agrupa em um span por geração as avaliações pedidas pelo pygad (só com `MoonLogger.tracing`)."""
+        if not MoonLogger.tracing:
+            return fitness_func
 
-        ga_instance = pygad.GA(
-            num_generations=DefaultConfig.num_generations,
+        def function(ga_instance, solutions, solutions_idx):
+            generation = ga_instance.generations_completed if ga_instance is not None else 0
+            with MoonLogger.span(f"generation {generation}"):
+                return fitness_func(ga_instance, solutions, solutions_idx)
+
+        return function
+
+    def fitness_pool(self) -> FitnessPool:
+        """Pool de processos com o cache já carregado em cada processo (ver `DefaultConfig.workers`)."""
+        return FitnessPool(DefaultConfig.workers, self.cache, self.algorithm_base, self.solver.mobile_surgeries,
+                           self.zero_time)
+
+    def stop_criteria(self) -> StopCriteria:
+        """Critérios de parada de `run` (ver `DefaultConfig.time_budget`, `stall_generations` e `stop_at_lower_bound`)."""
+        lower_bound = None
+        if DefaultConfig.stop_at_lower_bound:
+            lower_bound = punishment_lower_bound(self.cache, self.solver.mobile_surgeries)
+        time_budget = DefaultConfig.time_budget
+        if self.warm_start is not None:
+            time_budget = DefaultConfig.warm_start_time_budget
+        return StopCriteria(time_budget, DefaultConfig.stall_generations, lower_bound)
+
+    def seed_population(self, ga_instance: pygad.GA):
+        """
+        Troca o início da população inicial aleatória pelo genoma do warm start e por genomas heurísticos
+        (`DefaultConfig.seed_ratio`).
+        """
+        count = round(DefaultConfig.seed_ratio * len(ga_instance.population))
+        seeds = []
+        if count:
+            seeds = heuristic_genomes(self.cache, self.solver.mobile_surgeries, self.zero_time,
+                                      self.solver.gene_space())
+        if self.warm_start is not None:
+            seeds = [self.warm_start] + [genome for genome in seeds if genome != self.warm_start]
+            count += 1
+        if not seeds:
+            return
+        for i, genome in enumerate(seeds[:count]):
+            ga_instance.population[i] = genome
+        ga_instance.initial_population = ga_instance.population.copy()
+
+    def num_generations(self) -> int:
+        return DefaultConfig.warm_start_generations if self.warm_start is not None else DefaultConfig.num_generations
+
+    def build_ga(self, fitness_func, fitness_batch_size=None, on_generation=None, **overrides) -> pygad.GA:
+        """
+        Algoritmo genético com os parâmetros do `DefaultConfig`; `overrides` troca parâmetros do pygad (ex.: operadores
+        e semente de uma ilha, ver `IslandOptimizer`). Com `initial_population` a população dada é usada como está.
+        """
+        parameters = dict(
+            num_generations=self.num_generations(),
             num_parents_mating=DefaultConfig.num_parents_mating,
             sol_per_pop=DefaultConfig.sol_per_pop,
             num_genes=len(self.solver.mobile_surgeries),
-            gene_space=gene_space_array,
-            fitness_func=self.fitness_function(),
+            gene_space=self.solver.gene_space(),
+            fitness_func=fitness_func,
+            fitness_batch_size=fitness_batch_size,
+            on_generation=on_generation,
             random_mutation_min_val=-3,
             random_mutation_max_val=3,
             mutation_type=DefaultConfig.mutation_type,
             gene_type=int,
             parent_selection_type=DefaultConfig.parent_selection_type,
             keep_parents=DefaultConfig.keep_parents,
-            crossover_type=DefaultConfig.crossover_type
+            crossover_type=DefaultConfig.crossover_type,
+            random_seed=DefaultConfig.random_seed
         )
+        parameters.update(overrides)
+        ga_instance = pygad.GA(**parameters)
+        if "initial_population" not in overrides:
+            self.seed_population(ga_instance)
+        return ga_instance
 
-        ga_instance.run()
-        solution, punishment, solution_idx = ga_instance.best_solution()
+    @MoonLogger.log_func(enabled=LogConfig.optimizer_details)
+    def run(self) -> List[int]:
+        """
+        Busca o melhor genoma com o motor de `DefaultConfig.engine`: o algoritmo genético (`run_ga`) ou uma busca
+        local de `engines.ENGINES` partindo de `start_genome`. Com `DefaultConfig.polish_engine`, a solução ainda
+        é refinada por esse motor.
+        """
+        if DefaultConfig.engine == "ga":
+            solution = self.run_ga()
+        else:
+            solution = self.run_engine(DefaultConfig.engine, self.start_genome())
+        if DefaultConfig.polish_engine:
+            solution = self.run_engine(DefaultConfig.polish_engine, solution)
         return solution
+
+    def start_genome(self) -> List[int]:
+        """Ponto de partida de uma busca local: o genoma do warm start ou o melhor dos genomas heurísticos."""
+        if self.warm_start is not None:
+            return list(self.warm_start)
+        genomes = heuristic_genomes(self.cache, self.solver.mobile_surgeries, self.zero_time, self.solver.gene_space())
+        if len(genomes) <= 1:
+            return genomes[0] if genomes else [0] * len(self.solver.mobile_surgeries)
+        fitness = self.batch_fitness_function()(None, genomes, None)
+        return genomes[max(range(len(genomes)), key=lambda i: fitness[i])]
+
+    def run_engine(self, name: str, genome: Sequence[int]) -> List[int]:
+        """
+        Busca local de `engines.ENGINES[name]` a partir de `genome`, com os critérios de `stop_criteria` (sem a
+        estagnação, que contaria iterações em vez de gerações) e no máximo `DefaultConfig.engine_evaluations`
+        avaliações.
+        """
+        criteria = self.stop_criteria()
+        criteria.stall_generations = None
+        fitness_cache = self.fitness_cache()
+        engine = ENGINES[name](self.memoized(self.batch_fitness_function(), fitness_cache), self.solver.gene_space(),
+                               criteria, DefaultConfig.engine_evaluations, DefaultConfig.random_seed)
+        solution, fitness = engine.search([int(gene) for gene in genome])
+
+        self.stop_reason, self.generations_run = criteria.reason, engine.iterations
+        logger.info(f"Engine {name} stopped after {engine.iterations} iterations and {engine.evaluated} evaluations "
+                    f"({self.stop_reason}) in {criteria.elapsed():.2f}s, best punishment {-fitness}")
+
+        if fitness_cache is not None and DefaultConfig.fitness_cache_path:
+            fitness_cache.save(DefaultConfig.fitness_cache_path)
+        return solution
+
+    def start_ga(self, fitness_func, criteria: StopCriteria, fitness_cache: Optional[FitnessCache]) -> pygad.GA:
+        """
+        Algoritmo genético de `run_ga`. Com `DefaultConfig.checkpoint_path`, grava um `Checkpoint` a cada
+        `DefaultConfig.checkpoint_interval` gerações e, se já houver um da mesma instância (execução interrompida),
+        continua dele: população, fitness (no cache de fitness, sem reavaliar), geradores aleatórios e gerações.
+        """
+        batch_size = DefaultConfig.fitness_batch_size or DefaultConfig.sol_per_pop
+        path = DefaultConfig.checkpoint_path
+        if not path:
+            return self.build_ga(fitness_func, fitness_batch_size=batch_size, on_generation=criteria.on_generation)
+
+        instance = instance_hash(self.cache, self.solver.mobile_surgeries, self.algorithm_base, self.zero_time)
+        interval = max(1, DefaultConfig.checkpoint_interval)
+
+        def on_generation(ga_instance):
+            if ga_instance.generations_completed % interval == 0:
+                Checkpoint.capture(instance, ga_instance).save(path)
+            return criteria.on_generation(ga_instance)
+
+        checkpoint = Checkpoint.load(path, instance)
+        if checkpoint is None or checkpoint.generations >= self.num_generations():
+            return self.build_ga(fitness_func, fitness_batch_size=batch_size, on_generation=on_generation)
+
+        ga_instance = self.build_ga(fitness_func, fitness_batch_size=batch_size, on_generation=on_generation,
+                                    initial_population=checkpoint.population,
+                                    num_generations=self.num_generations() - checkpoint.generations)
+        ga_instance.generations_completed = criteria.generations = checkpoint.generations
+        checkpoint.restore_random()
+        if fitness_cache is not None:
+            for genome, fitness in zip(checkpoint.population, checkpoint.fitness):
+                fitness_cache.put(FitnessCache.key(instance, genome), fitness)
+        logger.info(f"Resuming optimizer from checkpoint {path} after {checkpoint.generations} generations")
+        return ga_instance
+
+    def run_ga(self) -> List[int]:
+        criteria = self.stop_criteria()
+        fitness_cache = self.fitness_cache()
+        if DefaultConfig.workers > 1:
+            with self.fitness_pool() as pool:
+                ga_instance = self.start_ga(self.traced(self.memoized(pool.fitness_function(), fitness_cache)),
+                                            criteria, fitness_cache)
+                ga_instance.run()
+                # best_solution() reavalia a população, então precisa do pool aberto
+                solution, punishment, solution_idx = ga_instance.best_solution()
+        else:
+            ga_instance = self.start_ga(self.traced(self.memoized(self.batch_fitness_function(), fitness_cache)),
+                                        criteria, fitness_cache)
+            ga_instance.run()
+            solution, punishment, solution_idx = ga_instance.best_solution()
+
+        self.stop_reason, self.generations_run = criteria.reason, ga_instance.generations_completed
+        logger.info(f"Optimizer stopped after {self.generations_run} generations ({self.stop_reason}) "
+                    f"in {criteria.elapsed():.2f}s, best punishment {-punishment}")
+
+        if DefaultConfig.checkpoint_path:
+            # a execução terminou; o checkpoint só serve para retomar uma interrompida
+            Checkpoint.remove(DefaultConfig.checkpoint_path)
+        if fitness_cache is not None and DefaultConfig.fitness_cache_path:
+            fitness_cache.save(DefaultConfig.fitness_cache_path)
+        if LogConfig.optimizer_details:
+            logger.debug(f"Fitness cache: {MoonLogger.counter_dict}")
+        return solution
+
+    def components(self) -> List[CacheInDict]:
+        """
+        Caches dos componentes independentes da instância (`Solver.components`; as salas só separam componentes quando
+        o algoritmo tem `RoomLimiter`). Lista vazia se `DefaultConfig.decompose` estiver desligado, se a instância não
+        se separar ou se algum componente ficar sem equipes ou salas.
+        """
+        if not DefaultConfig.decompose:
+            return []
+        parts = self.solver.components(rooms_restricted=RoomLimiter in algorithm_spec(self.algorithm_base)[1])
+        mobile = {surgery.id for surgery in self.solver.mobile_surgeries}
+        covered = sum(len(mobile.intersection(surgery.id for surgery in part.get_table(Surgery))) for part in parts)
+        if len(parts) <= 1 or covered != len(mobile):
+            return []
+        return parts
+
+    def solve(self) -> Algorithm:
+        """
+        Otimiza e decodifica a melhor solução.
+
+        Se a instância se separa em componentes (`components`), cada um vira um problema próprio, com um genoma bem
+        menor, otimizado (pela mesma classe de otimizador) em paralelo quando `DefaultConfig.workers` > 1; as
+        decodificações são juntadas por `Algorithm.merge`.
+        """
+        parts = self.components()
+        if not parts:
+            algorithm = self.algorithm_base(self.solver.mobile_surgeries, self.cache, self.zero_time)
+            algorithm.execute(self.run())
+            return algorithm
+
+        previous = [self.previous_for(part) for part in parts]
+        if DefaultConfig.workers > 1:
+            with ProcessPoolExecutor(max_workers=min(DefaultConfig.workers, len(parts))) as executor:
+                futures = [executor.submit(_optimize_in_worker, type(self), part, *algorithm_spec(self.algorithm_base),
+                                           self.zero_time, schedules) for part, schedules in zip(parts, previous)]
+                solutions = []
+                for future in futures:
+                    solution, measurements = future.result()
+                    MoonLogger.merge(measurements)
+                    solutions.append(solution)
+        else:
+            solutions = [optimize_component(part, self.algorithm_base, self.zero_time, schedules, type(self))
+                         for part, schedules in zip(parts, previous)]
+
+        decoded = []
+        for part, solution in zip(parts, solutions):
+            algorithm = self.algorithm_base(Solver(part).mobile_surgeries, part, self.zero_time)
+            algorithm.execute(solution)
+            decoded.append(algorithm)
+        logger.info(f"Optimized {len(parts)} independent components "
+                    f"({', '.join(str(len(solution)) for solution in solutions)} genes)")
+        return self.algorithm_base.merge(decoded, self.cache, self.zero_time)
+
+    def previous_for(self, part: CacheInDict) -> Optional[List[Any]]:
+        """Agendamentos do plano anterior (warm start) das cirurgias de um componente."""
+        if self.previous is None:
+            return None
+        surgery_ids = {surgery.id for surgery in part.get_table(Surgery)}
+        return [schedule for schedule in self.previous if schedule.surgery_id in surgery_ids]
+
+
+def optimize_component(cache: CacheInDict, algorithm_base: Type[Algorithm], zero_time: datetime,
+                       previous: Optional[Sequence[Any]] = None,
+                       optimizer_class: Type[Optimizer] = Optimizer) -> List[int]:
+    """
+    Otimiza um componente da instância (ver `Optimizer.solve`) com `optimizer_class`, partindo do plano anterior se
+    houver.
+    """
+    optimizer = optimizer_class(cache=cache, algorithm_base=algorithm_base, zero_time=zero_time)
+    if previous:
+        optimizer.warm_start_from(previous)
+    return [int(gene) for gene in optimizer.run()]
+
+
+def _optimize_in_worker(optimizer_class: Type[Optimizer], cache: CacheInDict, base: Type[Algorithm], features: tuple,
+                        zero_time: datetime, previous: Optional[List[Any]]) -> Tuple[List[int], dict]:
+    MoonLogger.start_process()
+    # o componente já ocupa um processo inteiro; o algoritmo genético dele não abre outro pool
+    DefaultConfig.workers = 1
+    algorithm_base = apply_features(base, *features) if features else base
+    return optimize_component(cache, algorithm_base, zero_time, previous, optimizer_class), MoonLogger.drain()
+
@@ -0,0 +1,306 @@
+import itertools
+import math
+import time
+from collections import defaultdict
+from copy import copy
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Type
+
+from loguru import logger
+
+from app.config import DefaultConfig
+from app.models import Room, Schedule, Surgery, SurgeryPossibleRooms, SurgeryPossibleTeams
+from app.services.cache.cache_in_dict import CacheInDict
+from app.services.cache.core.records import ScheduleRecord
+from app.services.logic.schedule_builders.algorithm import Algorithm
+from app.services.logic.schedule_builders.features.fixed_schedules import FixedSchedules
+from app.services.logic.schedule_builders.functions.apply_features import apply_features
+from app.services.logic.schedule_optimizers.fitness_pool import algorithm_spec
+from app.services.logic.schedule_optimizers.optimizer import Optimizer
+
+
+def _placement(row: Any) -> Tuple[datetime, int, int]:
+    return row.start_time, row.room_id, row.team_id
+
+
+class ScheduleDiff:
+    """
+    Diferença entre o plano atual e o reagendado, por cirurgia: agendamentos novos (`added`), retirados
+    (`removed`) e os que mudaram de horário, sala ou equipe (`moved`, pares antes/depois). `plan` é o plano completo
+    resultante.
+    """
+
+    def __init__(self, before: Sequence[Any], after: Sequence[Any]):
+        old = {row.surgery_id: row for row in before}
+        new = {row.surgery_id: row for row in after}
+        self.plan = list(after)
+        self.added = [row for surgery_id, row in new.items() if surgery_id not in old]
+        self.removed = [row for surgery_id, row in old.items() if surgery_id not in new]
+        self.moved = [(old[surgery_id], row) for surgery_id, row in new.items()
+                      if surgery_id in old and _placement(old[surgery_id]) != _placement(row)]
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.moved)
+
+    def __repr__(self):
+        return f"ScheduleDiff(added={len(self.added)}, removed={len(self.removed)}, moved={len(self.moved)})"
+
+
+def _possible_teams(cache: CacheInDict, surgery_ids: Iterable[int]) -> set:
+    return {p.team_id for surgery_id in surgery_ids
+            for p in cache.get_by_attribute(SurgeryPossibleTeams, "surgery_id", surgery_id)}
+
+
+def _end(cache: CacheInDict, row: Any) -> datetime:
+    return row.start_time + timedelta(minutes=cache.get_by_id(Surgery, row.surgery_id).duration)
+
+
+def horizon(cache: CacheInDict, plan: Sequence[Any], added: Iterable[int], cancelled: Iterable[int],
+            zero_time: datetime) -> Optional[datetime]:
+    """
+    Fim da janela do reagendamento: `DefaultConfig.reschedule_window` minutos depois do trecho atingido (o fim do
+    último agendamento cancelado, mais a duração das cirurgias adicionadas). None quando a janela está desligada.
+    """
+    if DefaultConfig.reschedule_window is None:
+        return None
+    cancelled = set(cancelled)
+    start = max([zero_time] + [_end(cache, row) for row in plan if row.surgery_id in cancelled])
+    minutes = sum(cache.get_by_id(Surgery, surgery_id).duration for surgery_id in added)
+    return start + timedelta(minutes=minutes + DefaultConfig.reschedule_window)
+
+
+def affected(cache: CacheInDict, plan: Sequence[Any], added: Iterable[int], cancelled: Iterable[int],
+             zero_time: datetime, until: Optional[datetime] = None) -> Tuple[set, set]:
+    """
+    Salas e equipes atingidas: as dos agendamentos cancelados e, para cada cirurgia nova, as equipes que podem
+    realizá-la (e as salas permitidas, quando ela tiver restrição de salas).
+
+    As equipes são fechadas sobre a elegibilidade: toda equipe que pode realizar uma cirurgia que volta a ser móvel
+    também é atingida, porque `FixedSchedules` protege as salas dos agendamentos fixos futuros, mas não as equipes.
+    Com `until` (ver `horizon`) só os agendamentos que começam antes dele entram no fecho; sem isso ele alcança
+    quase todas as equipes de um plano grande.
+    """
+    added, cancelled = list(added), set(cancelled)
+    rooms = {row.room_id for row in plan if row.surgery_id in cancelled}
+    teams = {row.team_id for row in plan if row.surgery_id in cancelled} | _possible_teams(cache, added)
+    for surgery_id in added:
+        rooms.update(p.room_id for p in cache.get_by_attribute(SurgeryPossibleRooms, "surgery_id", surgery_id))
+
+    future = [row for row in plan if row.surgery_id not in cancelled and not row.fixed and row.start_time >= zero_time
+              and (until is None or row.start_time < until)]
+    while True:
+        mobile = [row.surgery_id for row in future if row.room_id in rooms or row.team_id in teams]
+        closure = teams | _possible_teams(cache, mobile)
+        if closure == teams:
+            return rooms, teams
+        teams = closure
+
+
+def first_vacancy(cache: CacheInDict, zero_time: datetime, schedules: Sequence[Any]) -> datetime:
+    """
+    Primeiro instante a partir de `zero_time` com alguma sala e alguma equipe livres entre os `schedules` do cache: a
+    decodificação começa por uma sala vaga, o que não acontece no `zero_time` se todas estiverem em cirurgia.
+    """
+    cache.set_time_origin(zero_time)
+    ends = sorted(row.start_time + timedelta(minutes=cache.get_by_id(Surgery, row.surgery_id).duration)
+                  for row in schedules)
+    for moment in [zero_time] + [end for end in ends if end > zero_time]:
+        if cache.get_available_rooms(moment) and cache.get_available_teams(check_time=moment):
+            return moment
+    return zero_time
+
+
+def hill_climb(fitness_func, genome: List[int], gene_space: List[Dict[str, int]], deadline: float) -> List[int]:
+    """
+    Busca local de primeira melhora: troca um gene por vez (do último para o primeiro, que compartilham o prefixo
+    já decodificado) e fica com a troca sempre que a fitness melhora, até não haver melhora ou passar do `deadline`
+    (`time.perf_counter`). O resultado nunca é pior que o genoma de partida.
+    """
+    best = fitness_func(None, [genome], None)[0]
+    improved = True
+    while improved:
+        improved = False
+        for i in reversed(range(len(genome))):
+            for value in range(gene_space[i]["low"], gene_space[i]["high"] + 1):
+                if value == genome[i]:
+                    continue
+                if time.perf_counter() >= deadline:
+                    return genome
+                candidate = genome[:i] + [value] + genome[i + 1:]
+                fitness = fitness_func(None, [candidate], None)[0]
+                if fitness > best:
+                    genome, best, improved = candidate, fitness, True
+    return genome
+
+
+def exhaustive(fitness_func, gene_space: List[Dict[str, int]], deadline: float,
+               start: Optional[List[int]] = None) -> List[int]:
+    """
+    Avalia todos os genomas do `gene_space` e retorna o melhor; passando do `deadline` (`time.perf_counter`), o
+    melhor visto até ali. `start` (o genoma do plano atual) é avaliado primeiro, para nunca sair pior que ele.
+    """
+    genomes = itertools.product(*(range(space["low"], space["high"] + 1) for space in gene_space))
+    if start is not None:
+        genomes = itertools.chain([tuple(start)], genomes)
+    best, best_fitness = None, -math.inf
+    for genome in genomes:
+        fitness = fitness_func(None, [list(genome)], None)[0]
+        if fitness > best_fitness:
+            best, best_fitness = list(genome), fitness
+        if time.perf_counter() >= deadline:
+            break
+    return best
+
+
+def _busy(cache: CacheInDict, rows: Sequence[Any]) -> Dict[tuple, List[Tuple[datetime, datetime]]]:
+    busy = defaultdict(list)
+    for row in rows:
+        busy["room", row.room_id].append((row.start_time, _end(cache, row)))
+        busy["team", row.team_id].append((row.start_time, _end(cache, row)))
+    return busy
+
+
+def _conflicts(busy: Dict[tuple, List[Tuple[datetime, datetime]]], row: Any, start: datetime,
+               duration: timedelta) -> List[datetime]:
+    """Términos dos intervalos de `busy` que se sobrepõem a `row` começando em `start`, na sala ou na equipe."""
+    return [end for resource in (("room", row.room_id), ("team", row.team_id)) for other, end in busy[resource]
+            if other < start + duration and start < end]
+
+
+def _placed(busy: Dict[tuple, List[Tuple[datetime, datetime]]], row: Any, start: datetime,
+            duration: timedelta) -> Any:
+    busy["room", row.room_id].append((start, start + duration))
+    busy["team", row.team_id].append((start, start + duration))
+    if start == row.start_time:
+        return row
+    return ScheduleRecord(start, row.surgery_id, row.room_id, row.team_id)
+
+
+def left_shift(cache: CacheInDict, rows: Sequence[Any], placed: Sequence[Any], zero_time: datetime) -> List[Any]:
+    """
+    Adianta `rows`, em ordem de início, para o primeiro horário a partir de `zero_time` em que a sala e a equipe estão
+    livres entre `placed` e os já adiantados. Como os anteriores só andam para trás, o horário original continua
+    livre: nenhum agendamento é atrasado e nenhuma sobreposição é criada. Os adiantados viram registros novos.
+    """
+    busy = _busy(cache, placed)
+    shifted = []
+    for row in sorted(rows, key=lambda row: (row.start_time, row.room_id)):
+        duration = _end(cache, row) - row.start_time
+        ends = {end for resource in (("room", row.room_id), ("team", row.team_id)) for _, end in busy[resource]}
+        candidates = sorted(moment for moment in ends | {zero_time} if zero_time <= moment < row.start_time)
+        start = next((moment for moment in candidates if not _conflicts(busy, row, moment, duration)),
+                     row.start_time)
+        shifted.append(_placed(busy, row, start, duration))
+    return shifted
+
+
+def insert(cache: CacheInDict, surgery_ids: Iterable[int], placed: Sequence[Any], zero_time: datetime) -> List[Any]:
+    """
+    Cada cirurgia nova no primeiro horário, a partir do `zero_time`, em que uma equipe que pode realizá-la e uma sala
+    permitida (todas, sem restrição de salas) ficam livres pela duração dela, sem mexer em `placed`.
+    """
+    busy = _busy(cache, placed)
+    inserted = []
+    for surgery_id in surgery_ids:
+        duration = timedelta(minutes=cache.get_by_id(Surgery, surgery_id).duration)
+        pairs = [ScheduleRecord(zero_time, surgery_id, room_id, team_id)
+                 for room_id in ([p.room_id for p in cache.get_by_attribute(SurgeryPossibleRooms, "surgery_id",
+                                                                            surgery_id)]
+                                 or [room.id for room in cache.get_table(Room)])
+                 for team_id in _possible_teams(cache, [surgery_id])]
+        moments = sorted({zero_time} | {end for intervals in busy.values() for _, end in intervals if end > zero_time})
+        start, row = next((moment, row) for moment in moments for row in pairs
+                          if not _conflicts(busy, row, moment, duration))
+        inserted.append(_placed(busy, row, start, duration))
+    return inserted
+
+
+def right_shift(cache: CacheInDict, rows: Sequence[Any], placed: Sequence[Any]) -> List[Any]:
+    """
+    Encaixa `rows`, em ordem de início, em volta de `placed`: cada agendamento fica no horário original ou é adiado
+    até não se sobrepor, na sala nem na equipe, a nenhum já encaixado. Os adiados viram registros novos.
+    """
+    busy = _busy(cache, placed)
+    shifted = []
+    for row in sorted(rows, key=lambda row: (row.start_time, row.room_id)):
+        start, duration = row.start_time, _end(cache, row) - row.start_time
+        while conflicts := _conflicts(busy, row, start, duration):
+            start = max(conflicts)
+        shifted.append(_placed(busy, row, start, duration))
+    return shifted
+
+
+def _waiting(rows: Iterable[Any], zero_time: datetime) -> float:
+    """Minutos de espera desde o `zero_time`, a punição do `CacheManager`."""
+    return sum(max(0.0, (row.start_time - zero_time).total_seconds() // 60) for row in rows)
+
+
+def reschedule(cache: CacheInDict, plan: Optional[Sequence[Any]] = None, added: Iterable[int] = (),
+               cancelled: Iterable[int] = (), zero_time: Optional[datetime] = None,
+               algorithm_base: Type[Algorithm] = Algorithm) -> ScheduleDiff:
+    """
+    Reagenda só o necessário depois de adicionar ou cancelar cirurgias (ids; as adicionadas já devem estar no cache).
+
+    Os agendamentos de `plan` (por padrão os do cache) que ainda não começaram, começam antes do `horizon` e usam uma
+    sala ou equipe atingida (ver `affected`) voltam a ser móveis, junto com as cirurgias adicionadas. O subproblema é
+    decodificado com `algorithm_base` mais `FixedSchedules`, que encaixa as móveis em volta dos outros agendamentos
+    da janela, partindo do plano atual (`Optimizer.warm_start_from`). Quando o espaço de genes é pequeno
+    (`DefaultConfig.reschedule_exhaustive_limit`) todos os genomas são avaliados (`exhaustive`); senão o genoma do
+    plano atual é melhorado por `hill_climb`. As duas buscas param no prazo de `DefaultConfig.reschedule_time_budget`
+    segundos, contados do início da chamada. Os agendamentos depois do
+    `horizon` ficam fora do subproblema e só são adiados (`right_shift`) se o reagendamento passar por cima deles.
+    """
+    deadline = time.perf_counter() + DefaultConfig.reschedule_time_budget
+    plan = list(cache.get_table(Schedule) if plan is None else plan)
+    zero_time = zero_time or datetime.now()
+    added, cancelled = list(added), set(cancelled)
+    until = horizon(cache, plan, added, cancelled, zero_time)
+    rooms, teams = affected(cache, plan, added, cancelled, zero_time, until)
+
+    kept = [row for row in plan if row.surgery_id not in cancelled]
+    released = [row for row in kept if not row.fixed and row.start_time >= zero_time]
+    later = [row for row in released if until is not None and row.start_time >= until]
+    mobile = [row for row in released if (until is None or row.start_time < until)
+              and (row.room_id in rooms or row.team_id in teams)]
+    outside = {row.surgery_id for row in mobile + later}
+    frozen = [row for row in kept if row.surgery_id not in outside]
+    if not mobile and not added:
+        return ScheduleDiff(plan, kept)
+    # adiantar as móveis nos buracos deixados e encaixar as novas onde couberem já é um plano válido, e mexe no mínimo
+    compacted = frozen + left_shift(cache, mobile, frozen, zero_time) + later
+    compacted += insert(cache, added, compacted, zero_time)
+
+    surgeries = [cache.get_by_id(Surgery, row.surgery_id) for row in frozen + mobile]
+    surgeries += [cache.get_by_id(Surgery, surgery_id) for surgery_id in added]
+    subproblem = cache.with_plan(surgeries, [ScheduleRecord(row.start_time, row.surgery_id, row.room_id,
+                                                            row.team_id, fixed=True) for row in frozen])
+
+    origin = first_vacancy(subproblem, zero_time, frozen)
+    base, features = algorithm_spec(algorithm_base)
+    if FixedSchedules not in features:
+        features += (FixedSchedules,)
+    optimizer = Optimizer(cache=subproblem, algorithm_base=apply_features(base, *features), zero_time=origin)
+    gene_space = optimizer.solver.gene_space()
+    optimizer.warm_start_from(mobile)
+    sizes = [space["high"] - space["low"] + 1 for space in gene_space]
+    if math.prod(sizes) <= DefaultConfig.reschedule_exhaustive_limit:
+        solution = exhaustive(optimizer.batch_fitness_function(), gene_space, deadline, optimizer.warm_start)
+    else:
+        solution = hill_climb(optimizer.batch_fitness_function(),
+                              optimizer.warm_start or [space["low"] for space in gene_space], gene_space, deadline)
+
+    algorithm = optimizer.algorithm_base(optimizer.solver.mobile_surgeries, copy(subproblem), origin)
+    # só os agendamentos do cache interessam, não o relatório
+    algorithm.fitness_only = True
+    algorithm.execute(solution)
+    # os fixos voltam como estavam no plano; os reagendados são registros novos
+    frozen_ids = {row.surgery_id for row in frozen}
+    rescheduled = [row for row in algorithm.cache.get_table(Schedule) if row.surgery_id not in frozen_ids]
+    # os de depois da janela (e os reagendados que o `FixedSchedules` deixou sobrepostos por equipe) são adiados
+    after = frozen + right_shift(cache, rescheduled + later, frozen)
+    if _waiting(compacted, zero_time) <= _waiting(after, zero_time):
+        after = compacted
+    diff = ScheduleDiff(plan, after)
+    logger.info(f"Rescheduled {len(optimizer.solver.mobile_surgeries)} surgeries "
+                f"({len(rooms)} rooms, {len(teams)} teams affected): {diff}")
+    return diff
@@ -0,0 +1,99 @@
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app.models import Surgery, Team
+from app.services.cache.core.cache_manager import CacheManager
+from app.services.logic.schedule_builders.numba_algorithm import DecoderState
+from app.services.logic.schedule_builders.structures.candidate_index import CandidateCatalog
+from app.services.logic.schedule_builders.structures.decoder_arrays import DecoderArrays
+
+# regras gulosas: a cada passo, entre as equipes livres, a que agenda a cirurgia de menor chave
+HEURISTICS: Dict[str, Optional[Callable[[Surgery, Team], tuple]]] = {
+    "first_team": None,  # sempre a primeira equipe livre (gene 0)
+    "shortest_first": lambda surgery, team: (surgery.duration,),
+    "priority_first": lambda surgery, team: (-(surgery.priority or 1), surgery.duration),
+}
+
+
+def greedy_genome(arrays: DecoderArrays, key: Callable[[Surgery, Team], tuple], highs: List[int]) -> List[int]:
+    """
+    Monta o genoma gene a gene: cada gene escolhe uma equipe livre e a equipe escolhe a cirurgia (ver `Algorithm`),
+    então o passo `k` testa cada valor permitido a partir do estado da decodificação do prefixo já escolhido e fica
+    com o que agenda a cirurgia de menor `key(cirurgia, equipe)` (empates pelo menor gene).
+
+    A decodificação avança uma vez por gene (`DecoderState`), em vez de ser refeita desde o início a cada teste.
+    """
+    state = DecoderState(arrays)
+    genome = []
+    for high in highs:
+        best = None
+        for gene in range(min(high, len(arrays.teams) - 1) + 1):
+            scheduled = state.copy().advance(gene)
+            if scheduled is None:
+                continue
+            surgery, team = scheduled
+            value = key(arrays.surgeries[surgery], arrays.teams[team])
+            if best is None or value < best[0]:
+                best = value, gene
+        genome.append(best[1] if best is not None else 0)
+        state.advance(genome[-1])
+    return genome
+
+
+def _decoder_arrays(cache: CacheManager, surgeries: List[Surgery], zero_time: datetime,
+                    catalog: Optional[CandidateCatalog] = None) -> Optional[DecoderArrays]:
+    """Vetores da decodificação compilada, ou None quando ela não agendaria nada."""
+    if not surgeries or not cache.get_table(Team):
+        return None
+    cache.set_time_origin(zero_time)
+    arrays = DecoderArrays(cache, surgeries, zero_time, catalog)
+    if arrays.first_room < 0 or arrays.conflict:
+        return None
+    return arrays
+
+
+def heuristic_genomes(cache: CacheManager, surgeries: List[Surgery], zero_time: datetime,
+                      gene_space: List[Dict[str, int]], catalog: Optional[CandidateCatalog] = None) -> List[List[int]]:
+    """
+    Genomas determinísticos das `HEURISTICS`, sem repetições, para semear a população inicial do algoritmo genético.
+
+    São calculados com a decodificação sem features; com features continuam sendo genomas válidos, só não seguem a
+    regra à risca.
+    """
+    arrays = _decoder_arrays(cache, surgeries, zero_time, catalog)
+    if arrays is None:
+        return []
+
+    highs = [space["high"] for space in gene_space]
+    genomes = []
+    for key in HEURISTICS.values():
+        genome = [0] * len(highs) if key is None else greedy_genome(arrays, key, highs)
+        if genome not in genomes:
+            genomes.append(genome)
+    return genomes
+
+
+def encode_schedule(cache: CacheManager, surgeries: List[Surgery], zero_time: datetime,
+                    gene_space: List[Dict[str, int]], schedules: Sequence[Any],
+                    catalog: Optional[CandidateCatalog] = None) -> Optional[List[int]]:
+    """
+    Inversa aproximada de `Algorithm.execute`: genoma cuja decodificação agenda as cirurgias na mesma ordem de
+    `schedules` (agendamentos de um plano anterior, ordenados por início e sala).
+
+    É o `greedy_genome` (uma passada pela decodificação) com a chave do plano: a cada passo fica a equipe livre cuja
+    próxima cirurgia vem mais cedo no plano anterior (de preferência com a mesma equipe); cirurgias novas vão para o
+    fim, as mais curtas primeiro. Como cada equipe escolhe a própria cirurgia, planos editados à mão podem não ser
+    reproduzidos exatamente, mas o genoma continua sendo o ponto de partida mais próximo.
+    """
+    arrays = _decoder_arrays(cache, surgeries, zero_time, catalog)
+    if arrays is None:
+        return None
+
+    ordered = sorted(schedules, key=lambda schedule: (schedule.start_time, schedule.room_id))
+    position = {schedule.surgery_id: i for i, schedule in enumerate(ordered)}
+    team_of = {schedule.surgery_id: schedule.team_id for schedule in ordered}
+
+    def key(surgery: Surgery, team: Team) -> tuple:
+        return position.get(surgery.id, len(position)), team_of.get(surgery.id) != team.id, surgery.duration
+
+    return greedy_genome(arrays, key, [space["high"] for space in gene_space])
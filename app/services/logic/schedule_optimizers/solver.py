@@ -4,8 +4,9 @@ from typing import List
 from loguru import logger
 
 from app.config import LogConfig
-from app.models import Team, Room, Surgery, Schedule
+from app.models import Team, Room, Surgery, Schedule, SurgeryPossibleTeams, SurgeryPossibleRooms
 from app.services.cache.cache_in_dict import CacheInDict
+from app.services.logic.schedule_builders.structures.disjoint_set import DisjointSet
 from moonlogger import MoonLogger
 
 
@@ -39,6 +40,39 @@ class Solver:
 
         return mobile_surgeries
 
+    @MoonLogger.log_func(enabled=LogConfig.optimizer_details)
+    def components(self, rooms_restricted: bool = False) -> List[CacheInDict]:
+        """
+        Separa a instância nos componentes conexos do grafo cirurgia-equipe-sala: cada cirurgia se liga às equipes que
+        podem realizá-la e às salas em que pode ocorrer (todas, a menos que `rooms_restricted`, como com
+        `RoomLimiter`), e cada agendamento já existente liga a sua sala à sua equipe. Componentes não compartilham
+        equipes nem salas, então podem ser otimizados separadamente; devolve um cache (`CacheInDict.subset`) por
+        componente com cirurgias móveis.
+        """
+        rooms = [("room", room.id) for room in self.cache.get_table(Room)]
+        components = DisjointSet(("surgery", surgery.id) for surgery in self.cache.get_table(Surgery))
+        for possible in self.cache.get_table(SurgeryPossibleTeams):
+            components.union(("surgery", possible.surgery_id), ("team", possible.team_id))
+        if rooms_restricted:
+            for possible in self.cache.get_table(SurgeryPossibleRooms):
+                components.union(("surgery", possible.surgery_id), ("room", possible.room_id))
+        else:
+            for surgery in self.mobile_surgeries:
+                for room in rooms:
+                    components.union(("surgery", surgery.id), room)
+        for schedule in self.cache.get_table(Schedule):
+            components.union(("surgery", schedule.surgery_id), ("room", schedule.room_id))
+            components.union(("surgery", schedule.surgery_id), ("team", schedule.team_id))
+
+        mobile = {surgery.id for surgery in self.mobile_surgeries}
+        caches = []
+        for group in components.groups():
+            ids = {kind: {node_id for node_kind, node_id in group if node_kind == kind}
+                   for kind in ("surgery", "team", "room")}
+            if ids["surgery"] & mobile and ids["team"] and ids["room"]:
+                caches.append(self.cache.subset(ids["surgery"], ids["team"], ids["room"]))
+        return caches
+
     def set_solution(self, solution: List[int]):
         if len(solution) != len(self.mobile_surgeries):
             logger.error(f"Invalid solution. {len(solution)=}, {len(self.mobile_surgeries)=}")
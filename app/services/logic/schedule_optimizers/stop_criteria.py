@@ -0,0 +1,78 @@
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from app.models import Room, Surgery
+from app.services.cache.core.cache_manager import CacheManager
+
+
+def punishment_lower_bound(cache: CacheManager, surgeries: List[Surgery]) -> int:
+    """
+    Limite inferior da punição (soma dos minutos de espera) das cirurgias móveis.
+
+    Sem equipes, elegibilidade nem agendamentos existentes, as cirurgias ocupariam as salas a partir do `zero_time`;
+    a menor soma dos inícios em salas paralelas é a da ordem SPT (menores durações primeiro, alternando as salas): a
+    k-ésima cirurgia mais longa espera por todas as que vêm antes dela na mesma sala. As restrições reais só atrasam
+    os inícios, então nenhuma decodificação fica abaixo desse valor.
+    """
+    rooms = len(cache.get_table(Room))
+    if not rooms:
+        return 0
+    durations = sorted((surgery.duration for surgery in surgeries), reverse=True)
+    return sum(duration * (i // rooms) for i, duration in enumerate(durations))
+
+
+class StopCriteria:
+    """
+    Critérios de parada do algoritmo genético, verificados ao fim de cada geração (callback `on_generation` do pygad):
+
+    - `time_budget`: segundos de relógio desde a criação (a geração em andamento sempre termina);
+    - `stall_generations`: gerações seguidas sem melhorar a melhor punição;
+    - `lower_bound`: a melhor punição chegou ao limite inferior da instância, então não há o que melhorar.
+
+    `reason` guarda o motivo da parada ("num_generations" se o pygad rodou todas as gerações) e `generations` o
+    número de gerações concluídas.
+    """
+
+    def __init__(self, time_budget: Optional[float] = None, stall_generations: Optional[int] = None,
+                 lower_bound: Optional[float] = None):
+        self.time_budget = time_budget
+        self.stall_generations = stall_generations
+        self.lower_bound = lower_bound
+        self.started = time.perf_counter()
+        self.reason = "num_generations"
+        self.generations = 0
+        self.best_punishment: Optional[float] = None
+        self.stalled = 0
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def on_generation(self, ga_instance) -> Optional[str]:
+        if self.best_punishment is None:
+            # melhor indivíduo da população inicial, avaliada antes da primeira geração
+            self.best_punishment = -float(np.max(ga_instance.previous_generation_fitness))
+        return self.check(ga_instance.generations_completed, -float(np.max(ga_instance.last_generation_fitness)))
+
+    def check(self, generations: int, punishment: float) -> Optional[str]:
+        """
+        Registra a melhor punição depois de `generations` gerações concluídas e retorna "stop" se algum critério foi
+        atingido. Em saltos de várias gerações (épocas do `IslandOptimizer`) a estagnação conta todas elas.
+        """
+        elapsed_generations, self.generations = generations - self.generations, generations
+        if self.best_punishment is None or punishment < self.best_punishment:
+            self.best_punishment = punishment
+            self.stalled = 0
+        else:
+            self.stalled += elapsed_generations
+
+        if self.lower_bound is not None and self.best_punishment <= self.lower_bound:
+            self.reason = "lower_bound"
+        elif self.stall_generations and self.stalled >= self.stall_generations:
+            self.reason = "stall"
+        elif self.time_budget is not None and self.elapsed() >= self.time_budget:
+            self.reason = "time_budget"
+        else:
+            return None
+        return "stop"
@@ -0,0 +1,60 @@
+import random
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlmodel import SQLModel, Session, create_engine
+
+from app.models import Room, Surgery, Team, SurgeryPossibleTeams, SurgeryPossibleRooms, Schedule
+from app.services.cache.cache_in_dict import CacheInDict
+
+
+def generate_instance(session: Session, surgeries: int, teams: int, rooms: int, eligibility: float = 0.2,
+                      fixed_ratio: float = 0.0, room_restriction_ratio: float = 0.0,
+                      zero_time: Optional[datetime] = None, seed: int = 0):
+    """
+    Gera uma instância sintética na sessão (sem commit).
+
+    - `eligibility`: probabilidade de cada equipe, além da principal, poder fazer cada cirurgia. Toda cirurgia tem
+      pelo menos uma equipe e toda equipe pelo menos uma cirurgia, como o algoritmo exige;
+    - `fixed_ratio`: fração das cirurgias com agendamento fixo depois do `zero_time`, em sequência (sem sobreposição
+      de salas nem de equipes) e alternando as salas;
+    - `room_restriction_ratio`: fração das cirurgias restritas a parte das salas; as outras podem usar todas (o
+      `RoomLimiter` precisa de uma linha de `SurgeryPossibleRooms` por sala permitida).
+
+    A mesma `seed` gera sempre a mesma instância.
+    """
+    rng = random.Random(seed)
+    zero_time = zero_time or datetime.now()
+
+    session.add_all([Team(id=i, name=f"Equipe {i}") for i in range(1, teams + 1)])
+    session.add_all([Room(id=i, name=f"Sala {i}") for i in range(1, rooms + 1)])
+    rows = [Surgery(id=i, name=f"Cirurgia {i}", duration=rng.randrange(30, 241, 15), priority=rng.randint(1, 5))
+            for i in range(1, surgeries + 1)]
+    session.add_all(rows)
+
+    for surgery in rows:
+        main_team = (surgery.id - 1) % teams + 1
+        session.add_all([SurgeryPossibleTeams(surgery_id=surgery.id, team_id=team_id)
+                         for team_id in range(1, teams + 1) if team_id == main_team or rng.random() < eligibility])
+
+        allowed = range(1, rooms + 1)
+        if rng.random() < room_restriction_ratio:
+            main_room = (surgery.id - 1) % rooms + 1
+            allowed = [room_id for room_id in allowed if room_id == main_room or rng.random() < 0.5]
+        session.add_all([SurgeryPossibleRooms(surgery_id=surgery.id, room_id=room_id) for room_id in allowed])
+
+    start = zero_time + timedelta(hours=1)
+    for k, surgery in enumerate(rng.sample(rows, round(fixed_ratio * surgeries))):
+        session.add(Schedule(surgery_id=surgery.id, room_id=k % rooms + 1, team_id=(surgery.id - 1) % teams + 1,
+                             start_time=start, fixed=True))
+        start += timedelta(minutes=surgery.duration + 30)
+
+
+def instance_cache(surgeries: int, teams: int, rooms: int, **parameters) -> CacheInDict:
+    """Cache de uma instância de `generate_instance`, montada num banco sqlite em memória."""
+    engine = create_engine("sqlite:///:memory:")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        generate_instance(session, surgeries, teams, rooms, **parameters)
+        session.commit()
+        return CacheInDict(session=session)
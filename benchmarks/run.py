@@ -0,0 +1,262 @@
+"""
+Benchmarks do decodificador e do otimizador sobre instâncias sintéticas (`benchmarks.instances`).
+
+    python -m benchmarks.run --sizes 20 100 500 2000 --output benchmark.json
+
+Para cada tamanho (número de cirurgias) e cada combinação de features de `apply_features` mede:
+
+- `decode`: `Algorithm.execute` de genomas aleatórios, cada um numa cópia nova do cache (decodificações/s);
+- `fitness`: a função de fitness em lote do `Optimizer` (avaliações/s), com o cache de fitness desligado;
+- `optimizer`: um `Optimizer.run` curto (`--generations`), até `--optimizer-max-size` cirurgias.
+
+Cada medição repete a operação até passar de `--budget` segundos (pelo menos uma vez). O pico de memória
+(`tracemalloc`) é medido numa execução separada, para não pesar no tempo. O relatório JSON traz as medições, as
+curvas de escala (segundos por operação em função do tamanho, com o expoente do ajuste log-log) e o que influencia
+os números (commit, configuração), para comparar versões.
+"""
+import argparse
+import itertools
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from copy import copy
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Type
+
+import numpy as np
+from loguru import logger
+
+from app import config
+from app.config import DefaultConfig, configured
+from app.models import Room, Schedule, Surgery, Team
+from app.services.cache.cache_in_dict import CacheInDict
+from app.services.logic.schedule_builders.algorithm import Algorithm
+from app.services.logic.schedule_builders.features.fixed_schedules import FixedSchedules
+from app.services.logic.schedule_builders.features.room_limiter import RoomLimiter
+from app.services.logic.schedule_builders.functions.apply_features import apply_features
+from app.services.logic.schedule_optimizers.optimizer import Optimizer
+from benchmarks.instances import instance_cache
+
+FEATURES = (FixedSchedules, RoomLimiter)
+
+
+def feature_sets() -> List[Tuple[Type, ...]]:
+    return [combination for size in range(len(FEATURES) + 1) for combination in itertools.combinations(FEATURES, size)]
+
+
+def algorithm_for(features: Tuple[Type, ...]) -> Type[Algorithm]:
+    return apply_features(Algorithm, *features) if features else Algorithm
+
+
+def measure(function: Callable[[], Any], budget: float) -> Tuple[int, float]:
+    """
+    Chama `function` até passar de `budget` segundos (pelo menos uma vez); retorna as chamadas e o tempo total. Uma
+    chamada antes, fora da medição, tira do tempo os custos de primeira execução (índices, catálogos...).
+    """
+    function()
+    runs, started = 0, time.perf_counter()
+    while runs == 0 or time.perf_counter() - started < budget:
+        function()
+        runs += 1
+    return runs, time.perf_counter() - started
+
+
+def peak_memory(function: Callable[[], Any]) -> float:
+    """Pico de memória alocada por uma chamada de `function`, em MB."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+class CountingOptimizer(Optimizer):
+    """`Optimizer` que conta os genomas avaliados pela função de fitness em lote."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.evaluations = 0
+        self.solution: Optional[List[int]] = None
+
+    def batch_fitness_function(self):
+        fitness_func = super().batch_fitness_function()
+
+        def function(ga_instance, solutions, solutions_idx):
+            self.evaluations += len(solutions)
+            return fitness_func(ga_instance, solutions, solutions_idx)
+
+        return function
+
+
+class Benchmark:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.zero_time = datetime.now()
+        self.runs: List[Dict[str, Any]] = []
+
+    def instance(self, surgeries: int, fixed: bool) -> CacheInDict:
+        return instance_cache(surgeries, max(2, round(surgeries * self.args.teams_ratio)),
+                              max(2, round(surgeries * self.args.rooms_ratio)), eligibility=self.args.eligibility,
+                              fixed_ratio=self.args.fixed_ratio if fixed else 0.0,
+                              room_restriction_ratio=self.args.room_restriction_ratio, zero_time=self.zero_time,
+                              seed=self.args.seed)
+
+    def record(self, benchmark: str, features: Tuple[Type, ...], cache: CacheInDict, **values):
+        run = dict(benchmark=benchmark, features=[feature.__name__ for feature in features],
+                   surgeries=len(cache.get_table(Surgery)), teams=len(cache.get_table(Team)),
+                   rooms=len(cache.get_table(Room)), fixed=len(cache.get_by_attribute(Schedule, "fixed", True)),
+                   **values)
+        self.runs.append(run)
+        logger.info(f"{benchmark} {run['features']} with {run['surgeries']} surgeries: "
+                     + ", ".join(f"{key}={value:.4g}" for key, value in values.items() if isinstance(value, float)))
+
+    def run(self) -> Dict[str, Any]:
+        for size in self.args.sizes:
+            instances = {fixed: self.instance(size, fixed) for fixed in {False, self.args.fixed_ratio > 0}}
+            for features in feature_sets():
+                # agendamentos fixos só fazem sentido com a feature que os respeita
+                cache = instances[FixedSchedules in features and self.args.fixed_ratio > 0]
+                self.decode(features, cache)
+                self.fitness(features, cache)
+                if size <= self.args.optimizer_max_size:
+                    self.optimizer(features, cache)
+        return self.report()
+
+    def genomes(self, optimizer: Optimizer) -> Iterator[List[int]]:
+        """Genomas aleatórios sem fim: repetir os mesmos deixaria a retomada por prefixos acertar sempre."""
+        rng = random.Random(self.args.seed)
+        gene_space = optimizer.solver.gene_space()
+        while True:
+            yield [rng.randint(space["low"], space["high"]) for space in gene_space]
+
+    def decode(self, features: Tuple[Type, ...], cache: CacheInDict):
+        optimizer = Optimizer(cache=cache, algorithm_base=algorithm_for(features), zero_time=self.zero_time)
+        genomes = self.genomes(optimizer)
+
+        def execute():
+            algorithm = optimizer.algorithm_base(optimizer.solver.mobile_surgeries, copy(cache), self.zero_time)
+            algorithm.execute(next(genomes))
+
+        runs, seconds = measure(execute, self.args.budget)
+        memory = peak_memory(execute) if self.args.memory else None
+        self.record("decode", features, cache, decodes=runs, seconds=seconds, decodes_per_second=runs / seconds,
+                    seconds_per_decode=seconds / runs, peak_memory_mb=memory)
+
+    def fitness(self, features: Tuple[Type, ...], cache: CacheInDict):
+        optimizer = Optimizer(cache=cache, algorithm_base=algorithm_for(features), zero_time=self.zero_time)
+        fitness_func = optimizer.batch_fitness_function()
+        genomes = self.genomes(optimizer)
+
+        def evaluate():
+            fitness_func(None, [next(genomes) for _ in range(DefaultConfig.sol_per_pop)], None)
+
+        runs, seconds = measure(evaluate, self.args.budget)
+        evaluations = runs * DefaultConfig.sol_per_pop
+        memory = peak_memory(evaluate) if self.args.memory else None
+        self.record("fitness", features, cache, evaluations=evaluations, seconds=seconds,
+                    evaluations_per_second=evaluations / seconds, seconds_per_evaluation=seconds / evaluations,
+                    peak_memory_mb=memory)
+
+    def optimizer(self, features: Tuple[Type, ...], cache: CacheInDict):
+        def run() -> CountingOptimizer:
+            optimizer = CountingOptimizer(cache=cache, algorithm_base=algorithm_for(features),
+                                          zero_time=self.zero_time)
+            optimizer.solution = optimizer.run()
+            return optimizer
+
+        # gerações fixas, um processo só e sem cache de fitness, para contar todas as avaliações
+        with configured(num_generations=self.args.generations, random_seed=self.args.seed, workers=1,
+                        fitness_cache_size=0, time_budget=None, stall_generations=None, stop_at_lower_bound=False,
+                        checkpoint_path=None):
+            started = time.perf_counter()
+            optimizer = run()
+            seconds = time.perf_counter() - started
+            evaluations = optimizer.evaluations
+            punishment = -optimizer.batch_fitness_function()(None, [optimizer.solution], None)[0]
+            memory = peak_memory(run) if self.args.memory else None
+        self.record("optimizer", features, cache, generations=optimizer.generations_run, evaluations=evaluations,
+                    seconds=seconds, evaluations_per_second=evaluations / seconds, best_punishment=float(punishment),
+                    peak_memory_mb=memory)
+
+    def scaling(self) -> Dict[str, Dict[str, Any]]:
+        """Segundos por operação de cada benchmark e combinação de features em função do tamanho."""
+        metrics = {"decode": "seconds_per_decode", "fitness": "seconds_per_evaluation", "optimizer": "seconds"}
+        curves: Dict[str, Dict[str, Any]] = {}
+        for run in self.runs:
+            name = "/".join([run["benchmark"]] + run["features"])
+            curve = curves.setdefault(name, {"metric": metrics[run["benchmark"]], "surgeries": [], "values": []})
+            curve["surgeries"].append(run["surgeries"])
+            curve["values"].append(run[curve["metric"]])
+        for curve in curves.values():
+            curve["exponent"] = None
+            if len(set(curve["surgeries"])) > 1:
+                # inclinação do ajuste log-log: 1 é linear, 2 quadrático...
+                curve["exponent"] = float(np.polyfit(np.log(curve["surgeries"]), np.log(curve["values"]), 1)[0])
+        return curves
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "meta": {
+                "date": datetime.now().isoformat(timespec="seconds"),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "parameters": {key: value for key, value in vars(self.args).items() if key != "output"},
+                "config": {
+                    "sol_per_pop": DefaultConfig.sol_per_pop,
+                    "engine": DefaultConfig.engine,
+                    "polish_engine": DefaultConfig.polish_engine,
+                    "decoder_checkpoints": DefaultConfig.decoder_checkpoints,
+                    "incremental_punishment": DefaultConfig.incremental_punishment,
+                    "additional_tests": config.additional_tests,
+                },
+            },
+            "runs": self.runs,
+            "scaling": self.scaling(),
+        }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmarks do decodificador e do otimizador")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 500], help="números de cirurgias")
+    parser.add_argument("--teams-ratio", type=float, default=0.25, help="equipes por cirurgia")
+    parser.add_argument("--rooms-ratio", type=float, default=0.125, help="salas por cirurgia")
+    parser.add_argument("--eligibility", type=float, default=0.2, help="densidade de equipes elegíveis")
+    parser.add_argument("--fixed-ratio", type=float, default=0.1, help="fração de agendamentos fixos")
+    parser.add_argument("--room-restriction-ratio", type=float, default=0.3,
+                        help="fração de cirurgias com salas restritas")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--budget", type=float, default=2.0, help="segundos mínimos por medição")
+    parser.add_argument("--generations", type=int, default=3, help="gerações do benchmark do otimizador")
+    parser.add_argument("--optimizer-max-size", type=int, default=100, help="maior instância do otimizador")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="não mede o pico de memória")
+    parser.add_argument("--output", default="benchmark.json", help="arquivo do relatório JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    # os logs do algoritmo (inclusive o app.log) pesariam nos tempos; só o progresso do benchmark aparece
+    logger.remove()
+    logger.add(sys.stderr, level="INFO", filter=__name__)
+    report = Benchmark(args).run()
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    logger.info(f"Benchmark report written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
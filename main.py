@@ -1,12 +1,17 @@
 import os
+from typing import Optional
 
 import pygad  # type: ignore
 from loguru import logger
 from sqlmodel import SQLModel
 
+from app.config import DefaultConfig, LogConfig
 from app.models.schedule import Schedule
+from app.services.cache.core.records import ScheduleRecord, to_model
 from app.services.cache.cache_in_dict import CacheInDict
 from app.services.logic.schedule_builders.algorithm import Algorithm
+from app.services.logic.schedule_builders.functions.algorithm_class import algorithm_class
+from app.services.logic.schedule_optimizers.island_optimizer import IslandOptimizer
 from app.services.logic.schedule_optimizers.optimizer import Optimizer
 from moonlogger import MoonLogger
 from dotenv import load_dotenv
@@ -35,14 +40,19 @@ def get_engine():
     return engine
 
 
-def main() -> Algorithm:
+def main(warm_start: Optional[bool] = None) -> Algorithm:
+    """Otimiza e salva os agendamentos; com `warm_start` (padrão `DefaultConfig.warm_start`) parte do plano salvo."""
+    if warm_start is None:
+        warm_start = DefaultConfig.warm_start
     engine = get_engine()
     SQLModel.metadata.create_all(engine)
 
     with Session(engine) as session:
         try:
             logger.info("Limpando a tabela de agendamentos...")
+            previous = []
             for row in session.exec(select(Schedule)).all():
+                previous.append(ScheduleRecord(row.start_time, row.surgery_id, row.room_id, row.team_id, row.fixed))
                 session.delete(row)
             session.commit()
 
@@ -50,23 +60,30 @@ def main() -> Algorithm:
             cache = CacheInDict(session=session)
 
             logger.info("Executando o algoritmo...")
-            optimizer = Optimizer(cache=cache)
-            solution = optimizer.run()
+            optimizer_class = IslandOptimizer if DefaultConfig.islands > 1 else Optimizer
+            optimizer = optimizer_class(cache=cache, algorithm_base=algorithm_class())
+            if warm_start and previous:
+                logger.info(f"Partindo do plano anterior ({len(previous)} agendamentos)...")
+                optimizer.warm_start_from(previous)
+            algorithm = optimizer.solve()
 
             logger.info("Processando a solução...")
-            algorithm = Algorithm(optimizer.solver.mobile_surgeries, cache, datetime.now())
-            algorithm.execute(solution)
             algorithm.print_table()
 
             logger.info("Salvando os resultados no banco de dados...")
 
-            session.add_all(algorithm.cache.get_table(Schedule))
+            session.add_all([to_model(row) for row in algorithm.cache.get_table(Schedule)])
             session.commit()
         except Exception as e:
             logger.error(f"Erro ao executar.")
             raise e
         else:
             logger.success(f"Análise de Desempenho. Tempo gasto: {MoonLogger.time_dict}")
+            logger.success(f"Contadores: {MoonLogger.counter_dict}")
+            logger.success(f"Latências por função: {MoonLogger.stats_json(LogConfig.stats_json_path)}")
+            MoonLogger.stats_prometheus(LogConfig.stats_prometheus_path)
+            if MoonLogger.tracing:
+                MoonLogger.dump_trace(f"{LogConfig.trace_prefix}_{datetime.now():%Y-%m-%d_%H-%M-%S}")
             return algorithm
 
 
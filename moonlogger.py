@@ -1,13 +1,329 @@
 import inspect
+import json
+import os
+import threading
 import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
 from loguru import logger
 
 
+class LatencyStats:
+    """
+    Contagem, total, mínimo, máximo e histograma das durações das chamadas de uma função.
+
+    O histograma segue a ideia do HDR Histogram: as durações (em nanossegundos) caem em baldes logarítmicos com
+    `SUB_BUCKETS` subdivisões por potência de 2, então os percentis têm erro relativo de no máximo 1/`SUB_BUCKETS`
+    com memória limitada, qualquer que seja o número de chamadas. Estatísticas de processos diferentes são somadas
+    com `merge`.
+    """
+    __slots__ = ("count", "total", "min", "max", "buckets")
+    SUB_BUCKETS = 16
+    _SUB_BITS = SUB_BUCKETS.bit_length() - 1
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets: Dict[int, int] = {}
+
+    @classmethod
+    def bucket_of(cls, nanoseconds: int) -> int:
+        if nanoseconds < cls.SUB_BUCKETS:
+            return max(0, nanoseconds)
+        shift = nanoseconds.bit_length() - 1 - cls._SUB_BITS
+        return (shift + 1) * cls.SUB_BUCKETS + (nanoseconds >> shift) - cls.SUB_BUCKETS
+
+    @classmethod
+    def bucket_value(cls, bucket: int) -> float:
+        """Ponto médio do balde, em segundos."""
+        if bucket < cls.SUB_BUCKETS:
+            return bucket / 1e9
+        shift, sub = divmod(bucket, cls.SUB_BUCKETS)
+        shift -= 1
+        low = (cls.SUB_BUCKETS + sub) << shift
+        return (low + ((1 << shift) - 1) / 2) / 1e9
+
+    def record(self, seconds: float, weight: int = 1):
+        """Registra `weight` chamadas de `seconds` cada (no modo amostrado uma medição vale por várias chamadas)."""
+        self.count += weight
+        self.total += seconds * weight
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+        bucket = self.bucket_of(int(seconds * 1e9))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + weight
+
+    def merge(self, other: "LatencyStats"):
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for bucket, amount in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + amount
+
+    def percentile(self, q: float) -> float:
+        """Duração (em segundos) abaixo da qual estão `q`% das chamadas, limitada pelo mínimo e máximo medidos."""
+        if not self.count:
+            return 0.0
+        rank = max(1, -(-self.count * q // 100))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(max(self.bucket_value(bucket), self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class Span:
+    """Span aberto por `MoonLogger.open_span`, com o caminho desde a raiz (ex.: "Optimizer.run;Algorithm.execute")."""
+    __slots__ = ("name", "path", "start", "children", "token")
+
+    def __init__(self, name: str, parent: Optional["Span"]):
+        self.name = name
+        self.path = f"{parent.path};{name}" if parent is not None else name
+        self.start = 0.0
+        self.children = 0.0  # tempo gasto nos spans filhos, descontado do tempo próprio
+        self.token = None
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("moonlogger_span", default=None)
+
+
 class MoonLogger:
+    """
+    Instrumentação das funções decoradas com `log_func`, configurada uma única vez na importação pelas variáveis de
+    ambiente `MOONLOGGER_MODE` e `MOONLOGGER_SAMPLE_RATE`:
+
+    - "full" (padrão): mede todas as chamadas e registra argumentos e resultados quando `enabled`;
+    - "sampled": mede uma chamada a cada `MOONLOGGER_SAMPLE_RATE` e extrapola o total em `time_dict` (com `enabled`
+      as chamadas continuam sendo todas registradas);
+    - "off": nada é medido nem registrado; o decorador retorna a própria função, sem o `logger.catch` dos outros
+      modos (quem depende da captura de erros, como `Algorithm.execute`, trata as exceções por conta própria).
+
+    Além do tempo total (`time_dict`), cada função medida tem suas `LatencyStats` em `stats_dict`. As atualizações e
+    leituras passam por `lock`; processos auxiliares enviam o que mediram com `drain` e o processo principal soma com
+    `merge`. `stats_json` e `stats_prometheus` exportam tudo ao final da execução.
+
+    Com `MOONLOGGER_TRACE=1` cada chamada medida também abre um span aninhado no span atual (um `ContextVar`, então
+    threads e tarefas têm pilhas próprias). Os spans viram eventos no formato do Chrome (`chrome_trace`, até
+    `MOONLOGGER_TRACE_LIMIT` eventos) e tempo próprio por pilha no formato "collapsed" dos flamegraphs
+    (`collapsed_stacks`).
+    """
+    modes = ("full", "sampled", "off")
+    mode = os.getenv("MOONLOGGER_MODE", "full").lower()
+    sample_rate = max(1, int(os.getenv("MOONLOGGER_SAMPLE_RATE", "100")))
+
     time_dict = dict[str, float]()  # Dicionário estático para armazenar o tempo total por função
+    counter_dict = dict[str, int]()  # Contadores de eventos (ex.: acertos e falhas de cache)
+    stats_dict = dict[str, LatencyStats]()  # Contagem, extremos e histograma das durações por função
+    lock = threading.Lock()
+
+    tracing = os.getenv("MOONLOGGER_TRACE", "0").lower() in ("1", "true", "yes")
+    trace_limit = int(os.getenv("MOONLOGGER_TRACE_LIMIT", "1000000"))
+    trace_events = list[tuple]()  # (nome, início, duração, pid, thread) de cada span fechado
+    stacks_dict = dict[str, float]()  # Tempo próprio (sem os filhos) por pilha de spans
+
+    @staticmethod
+    def count(name: str, amount: int = 1):
+        with MoonLogger.lock:
+            MoonLogger.counter_dict[name] = MoonLogger.counter_dict.get(name, 0) + amount
+
+    @staticmethod
+    def record(name: str, duration: float, weight: int = 1):
+        """Registra a duração de `weight` chamadas da função `name`."""
+        with MoonLogger.lock:
+            MoonLogger.time_dict[name] = MoonLogger.time_dict.get(name, 0) + duration * weight
+            stats = MoonLogger.stats_dict.get(name)
+            if stats is None:
+                stats = MoonLogger.stats_dict[name] = LatencyStats()
+            stats.record(duration, weight)
+
+    @staticmethod
+    def reset():
+        with MoonLogger.lock:
+            MoonLogger.time_dict.clear()
+            MoonLogger.counter_dict.clear()
+            MoonLogger.stats_dict.clear()
+            MoonLogger.trace_events.clear()
+            MoonLogger.stacks_dict.clear()
+
+    @staticmethod
+    def start_process():
+        """Em um processo criado com fork, descarta as medições e a pilha de spans herdadas do processo pai."""
+        _current_span.set(None)
+        MoonLogger.reset()
+
+    @staticmethod
+    def drain() -> dict:
+        """Retorna (para enviar a outro processo) e zera tudo o que foi medido até aqui."""
+        with MoonLogger.lock:
+            payload = {"time": dict(MoonLogger.time_dict), "counters": dict(MoonLogger.counter_dict),
+                       "stats": dict(MoonLogger.stats_dict), "events": list(MoonLogger.trace_events),
+                       "stacks": dict(MoonLogger.stacks_dict)}
+        MoonLogger.reset()
+        return payload
+
+    @staticmethod
+    def merge(payload: dict):
+        """Soma as medições de outro processo (ver `drain`); as pilhas dele ficam sob o span atual."""
+        current = _current_span.get()
+        with MoonLogger.lock:
+            for name, duration in payload["time"].items():
+                MoonLogger.time_dict[name] = MoonLogger.time_dict.get(name, 0) + duration
+            for name, amount in payload["counters"].items():
+                MoonLogger.counter_dict[name] = MoonLogger.counter_dict.get(name, 0) + amount
+            for name, other in payload["stats"].items():
+                stats = MoonLogger.stats_dict.get(name)
+                if stats is None:
+                    stats = MoonLogger.stats_dict[name] = LatencyStats()
+                stats.merge(other)
+            room = max(0, MoonLogger.trace_limit - len(MoonLogger.trace_events))
+            MoonLogger.trace_events.extend(payload["events"][:room])
+            for path, self_time in payload["stacks"].items():
+                if current is not None:
+                    path = f"{current.path};{path}"
+                MoonLogger.stacks_dict[path] = MoonLogger.stacks_dict.get(path, 0) + self_time
+
+    @staticmethod
+    def snapshot() -> dict:
+        """Estatísticas de cada função e contadores, em tipos simples."""
+        with MoonLogger.lock:
+            return {
+                "functions": {name: stats.to_dict() for name, stats in sorted(MoonLogger.stats_dict.items())},
+                "counters": dict(sorted(MoonLogger.counter_dict.items())),
+            }
+
+    @staticmethod
+    def stats_json(path: Optional[str] = None) -> str:
+        text = json.dumps(MoonLogger.snapshot(), indent=2)
+        if path:
+            with open(path, "w") as file:
+                file.write(text)
+        return text
+
+    @staticmethod
+    def stats_prometheus(path: Optional[str] = None) -> str:
+        """Estatísticas no formato de texto do Prometheus (durações como `summary`, contadores como `counter`)."""
+        snapshot = MoonLogger.snapshot()
+
+        def label(value: str) -> str:
+            return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        lines = ["# HELP moonlogger_function_seconds Duration of the calls of each instrumented function.",
+                 "# TYPE moonlogger_function_seconds summary"]
+        for name, stats in snapshot["functions"].items():
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+                lines.append(f'moonlogger_function_seconds{{function="{label(name)}",quantile="{quantile}"}} '
+                             f'{stats[key]!r}')
+            lines.append(f'moonlogger_function_seconds_sum{{function="{label(name)}"}} {stats["total"]!r}')
+            lines.append(f'moonlogger_function_seconds_count{{function="{label(name)}"}} {stats["count"]}')
+        for metric, key in (("min", "min"), ("max", "max")):
+            lines += [f"# HELP moonlogger_function_{metric}_seconds {key.capitalize()} duration of a single call.",
+                      f"# TYPE moonlogger_function_{metric}_seconds gauge"]
+            lines += [f'moonlogger_function_{metric}_seconds{{function="{label(name)}"}} {stats[key]!r}'
+                      for name, stats in snapshot["functions"].items()]
+        lines += ["# HELP moonlogger_events_total Event counters (MoonLogger.count).",
+                  "# TYPE moonlogger_events_total counter"]
+        lines += [f'moonlogger_events_total{{name="{label(name)}"}} {amount}'
+                  for name, amount in snapshot["counters"].items()]
+        text = "\n".join(lines) + "\n"
+        if path:
+            with open(path, "w") as file:
+                file.write(text)
+        return text
+
+    @staticmethod
+    def open_span(name: str) -> Span:
+        span = Span(name, _current_span.get())
+        span.token = _current_span.set(span)
+        span.start = time.perf_counter()
+        return span
+
+    @staticmethod
+    def close_span(span: Span):
+        duration = time.perf_counter() - span.start
+        _current_span.reset(span.token)
+        parent = _current_span.get()
+        if parent is not None:
+            parent.children += duration
+        with MoonLogger.lock:
+            MoonLogger.stacks_dict[span.path] = MoonLogger.stacks_dict.get(span.path, 0) + duration - span.children
+            if len(MoonLogger.trace_events) < MoonLogger.trace_limit:
+                MoonLogger.trace_events.append((span.name, span.start, duration, os.getpid(), threading.get_ident()))
+
+    @staticmethod
+    @contextmanager
+    def span(name: str):
+        """Span manual (ex.: uma geração do otimizador); não faz nada sem `tracing`."""
+        if not MoonLogger.tracing:
+            yield None
+            return
+        span = MoonLogger.open_span(name)
+        try:
+            yield span
+        finally:
+            MoonLogger.close_span(span)
+
+    @staticmethod
+    def chrome_trace(path: Optional[str] = None) -> dict:
+        """Spans como eventos completos ("X") do formato de trace do Chrome (chrome://tracing, Perfetto)."""
+        with MoonLogger.lock:
+            events = list(MoonLogger.trace_events)
+        origin = min((start for _, start, _, _, _ in events), default=0.0)
+        trace = {
+            "traceEvents": [{"name": name, "cat": "moonlogger", "ph": "X", "ts": (start - origin) * 1e6,
+                             "dur": duration * 1e6, "pid": pid, "tid": tid}
+                            for name, start, duration, pid, tid in events],
+            "displayTimeUnit": "ms",
+        }
+        if path:
+            with open(path, "w") as file:
+                json.dump(trace, file)
+        return trace
+
+    @staticmethod
+    def collapsed_stacks(path: Optional[str] = None) -> str:
+        """Tempo próprio de cada pilha em microssegundos, uma linha "a;b;c valor" por pilha (flamegraph.pl)."""
+        with MoonLogger.lock:
+            stacks = sorted(MoonLogger.stacks_dict.items())
+        text = "".join(f"{stack} {max(0, round(self_time * 1e6))}\n" for stack, self_time in stacks)
+        if path:
+            with open(path, "w") as file:
+                file.write(text)
+        return text
+
+    @staticmethod
+    def dump_trace(prefix: str):
+        """Grava `<prefix>.json` (Chrome) e `<prefix>.folded` (collapsed) e descarta os spans já gravados."""
+        MoonLogger.chrome_trace(f"{prefix}.json")
+        MoonLogger.collapsed_stacks(f"{prefix}.folded")
+        with MoonLogger.lock:
+            MoonLogger.trace_events.clear()
+            MoonLogger.stacks_dict.clear()
 
     @staticmethod
     def log_func(enabled: bool = True):
+        if MoonLogger.mode == "off":
+            return lambda func: func
+        if MoonLogger.mode == "sampled" and not enabled:
+            return MoonLogger._sampled
+
         def decorator(func):
             @logger.catch
             def wrapper(*args, **kwargs):
@@ -24,19 +340,20 @@ class MoonLogger:
                     func_args_str = ", ".join(map("{0[0]} = {0[1]!r}".format, func_args.items()))
                     logger.opt(depth=2).debug(f"{func.__qualname__}({func_args_str})".replace('{', '[').replace('}', ']'))
 
-                # Execução da função
-                result = func(*args, **kwargs)
+                # Execução da função (dentro de um span, quando o rastreamento está ligado)
+                span = MoonLogger.open_span(func.__qualname__) if MoonLogger.tracing else None
+                try:
+                    result = func(*args, **kwargs)
+                finally:
+                    if span is not None:
+                        MoonLogger.close_span(span)
 
                 # Medição do tempo de término e cálculo da duração
                 end_time = time.perf_counter()
                 duration = end_time - start_time
 
-                # Atualização do tempo total no dicionário
-                func_name = func.__qualname__
-                if func_name in MoonLogger.time_dict:
-                    MoonLogger.time_dict[func_name] += duration
-                else:
-                    MoonLogger.time_dict[func_name] = duration
+                # Atualização do tempo total e das estatísticas da função
+                MoonLogger.record(func.__qualname__, duration)
 
                 if enabled:
                     # Log do resultado da função e do tempo gasto
@@ -46,4 +363,39 @@ class MoonLogger:
 
             return wrapper
 
-        return decorator
\ No newline at end of file
+        return decorator
+
+    @staticmethod
+    def _sampled(func):
+        rate = MoonLogger.sample_rate
+        func_name = func.__qualname__
+        calls = 0
+
+        def wrapper(*args, **kwargs):
+            nonlocal calls
+            calls += 1
+            # com o rastreamento ligado todas as chamadas viram spans, não só as medidas
+            span = MoonLogger.open_span(func_name) if MoonLogger.tracing else None
+            try:
+                if calls % rate:
+                    return func(*args, **kwargs)
+
+                start_time = time.perf_counter()
+                result = func(*args, **kwargs)
+                # a chamada medida representa as `rate` chamadas desde a última medição
+                MoonLogger.record(func_name, time.perf_counter() - start_time, rate)
+                return result
+            except Exception:
+                # mesmo comportamento do `logger.catch` usado no modo completo
+                logger.opt(exception=True).error(f"An error has been caught in function '{func_name}'")
+                return None
+            finally:
+                if span is not None:
+                    MoonLogger.close_span(span)
+
+        return wrapper
+
+
+if MoonLogger.mode not in MoonLogger.modes:
+    logger.warning(f"Unknown MOONLOGGER_MODE {MoonLogger.mode!r}; using 'full'. Options: {MoonLogger.modes}")
+    MoonLogger.mode = "full"
@@ -13,15 +13,17 @@ import pandas as pd
 from loguru import logger
 from sqlalchemy import text, inspect
 from sqlmodel import SQLModel
+from app.config import LogConfig, DefaultConfig
 from app.models import Surgery, Patient, Team, Room, Schedule
 from app.services.cache.cache_in_dict import CacheInDict
-from app.services.logic.schedule_builders.algorithm import Algorithm
 from app.services.logic.schedule_builders.features.fixed_schedules import FixedSchedules
 from app.services.logic.schedule_builders.features.room_limiter import RoomLimiter
-from app.services.logic.schedule_builders.functions.apply_features import apply_features
+from app.services.logic.schedule_builders.functions.algorithm_class import algorithm_class
+from app.services.logic.schedule_optimizers.engines import ENGINES, SimulatedAnnealing, TabuSearch
 from app.services.logic.schedule_optimizers.optimizer import Optimizer
 from app.services.logic.schedule_optimizers.solver import Solver
 from main import main, get_engine
+from moonlogger import MoonLogger
 from pywebio_app import *
 from pywebio.output import *
 from pywebio.input import *
@@ -109,6 +111,17 @@ class FeaturesAlg:
         "Pré-agendamentos": FixedSchedules
     }
 
+    engines = {
+        "Algoritmo genético": "ga",
+        "Recozimento simulado": SimulatedAnnealing.name,
+        "Busca tabu": TabuSearch.name,
+    }
+
+    decoders = {
+        "Python": "python",
+        "Compilada (numba)": "numba",
+    }
+
     fake_data = {
         "Teste Minimo": add_minimal_test,
         #"Teste com salas limitadas": add_limiteroom_test,
@@ -123,6 +136,18 @@ class FeaturesAlg:
     def get_features() -> list:
         return [FeaturesAlg.feature[key] for key in FeaturesAlg.selecteds]
 
+    @staticmethod
+    def get_engine_options(polish: bool = False) -> list[dict]:
+        if polish:
+            return [{"label": "Nenhum", "value": ""}] + [
+                {"label": key, "value": value} for key, value in FeaturesAlg.engines.items() if value in ENGINES
+            ]
+        return [{"label": key, "value": value} for key, value in FeaturesAlg.engines.items()]
+
+    @staticmethod
+    def get_decoder_options() -> list[dict]:
+        return [{"label": key, "value": value} for key, value in FeaturesAlg.decoders.items()]
+
     @staticmethod
     def get_fake_data_options() -> list[dict]:
         return [{"label": key, "value": key} for key in FeaturesAlg.fake_data.keys()]
@@ -384,18 +409,17 @@ def index():
             cache = CacheInDict(session=session)
             cache.load_all_data(session)
 
-        algorithm_base = apply_features(Algorithm, *FeaturesAlg.get_features())
+        algorithm_base = algorithm_class(*FeaturesAlg.get_features())
         optimizer = Optimizer(cache=cache, algorithm_base=algorithm_base)
-        solution = optimizer.run()
-
-        algorithm = Algorithm(optimizer.solver.mobile_surgeries, cache, datetime.now())
-        algorithm.execute(solution)
+        algorithm = optimizer.solve()
+        if MoonLogger.tracing:
+            MoonLogger.dump_trace(f"{LogConfig.trace_prefix}_{datetime.now():%Y-%m-%d_%H-%M-%S}")
 
         with use_scope("teste", clear=True):
             put_success("Concluído!")
             put_text("Resultado:")
             df = pd.DataFrame(algorithm.rooms_according_to_time)
-            put_datatable(df.applymap(str).to_dict(orient='records'))
+            put_datatable(df.astype(str).to_dict(orient='records'))
 
     def view_select_features():
         print(FeaturesAlg.selecteds)
@@ -403,14 +427,36 @@ def index():
                            value=FeaturesAlg.selecteds, multiple=True)
         FeaturesAlg.selecteds = selecteds
 
+    def view_select_engine():
+        DefaultConfig.engine = select('Motor de otimização', options=FeaturesAlg.get_engine_options(),
+                                      value=DefaultConfig.engine)
+        polish = select('Refinar a solução final com', options=FeaturesAlg.get_engine_options(polish=True),
+                        value=DefaultConfig.polish_engine or "")
+        DefaultConfig.polish_engine = polish or None
+        DefaultConfig.decoder = select('Decodificação (a compilada não cobre as features)',
+                                       options=FeaturesAlg.get_decoder_options(), value=DefaultConfig.decoder)
+
     def select_fake_data():
         select('Testes', options=FeaturesAlg.get_fake_data_options(), onchange=FeaturesAlg.apply_fake_data)
 
+    def view_performance():
+        with use_scope("teste", clear=True):
+            functions = MoonLogger.snapshot()["functions"]
+            if not functions:
+                put_text("Nenhuma medição ainda.")
+                return
+            df = pd.DataFrame.from_dict(functions, orient="index").sort_values("total", ascending=False)
+            put_datatable(df.reset_index(names="function").astype(str).to_dict(orient='records'))
+            put_collapse("Prometheus", put_code(MoonLogger.stats_prometheus()))
+            put_collapse("JSON", put_code(MoonLogger.stats_json(), language="json"))
+
     put_grid([
         [
             put_button('Selecionar features', onclick=view_select_features),
+            put_button('Selecionar motor', onclick=view_select_engine),
             put_button('Utilizar Dados Falsos', onclick=select_fake_data),
             put_button('Executar algoritmo de agendamento', onclick=execute_algorithm),
+            put_button('Desempenho', onclick=view_performance),
         ]
     ])
 
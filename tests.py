@@ -1,28 +1,56 @@
+import contextlib
+import json
 import os
+import pickle
 import random
+import subprocess
+import sys
+import tempfile
 import unittest
 from collections import defaultdict
-from copy import deepcopy
+from copy import copy, deepcopy
 from datetime import datetime, timedelta
-from unittest.mock import MagicMock
+from typing import List
+from unittest.mock import MagicMock, patch
 
+import numpy as np
 from loguru import logger
 from sqlalchemy import create_engine
 from sqlmodel import SQLModel, Session
 from tabulate import tabulate
 
+from app.config import DefaultConfig, configured
 from app.models import SurgeryPossibleRooms
 from app.models import Room, Surgery, Patient, SurgeryPossibleTeams, Schedule
 from app.services.logic.schedule_builders.functions.apply_features import apply_features
 from app.services.logic.schedule_optimizers.optimizer import Optimizer
+from app.services.logic.schedule_optimizers.fitness_cache import FitnessCache, instance_hash
+from app.services.logic.schedule_optimizers.fitness_pool import FitnessPool
+from app.services.logic.schedule_optimizers.stop_criteria import StopCriteria, punishment_lower_bound
+from app.services.logic.schedule_optimizers.island_optimizer import IslandOptimizer, migrate
+from app.services.logic.schedule_optimizers.engines import ENGINES, Engine
+from app.services.logic.schedule_optimizers.checkpoint import Checkpoint
+from benchmarks.instances import generate_instance, instance_cache
+from benchmarks.run import Benchmark, feature_sets, parse_args
+from app.services.logic.schedule_optimizers.rescheduler import affected, exhaustive, hill_climb, reschedule
+from app.services.logic.schedule_optimizers.seeding import HEURISTICS, greedy_genome, heuristic_genomes, \
+    encode_schedule
 from app.services.logic.schedule_builders.features.room_limiter import RoomLimiter
 from app.services.logic.schedule_builders.features.fixed_schedules import FixedSchedules
 from app.services.logic.schedule_builders.algorithm import Algorithm
+from app.services.logic.schedule_builders.numba_algorithm import DecoderState, NumbaAlgorithm
+from app.services.logic.schedule_builders.functions.algorithm_class import algorithm_class
 from app.services.logic.schedule_optimizers.solver import Solver
 from app.services.cache.cache_in_dict import CacheInDict
+from app.services.cache.core.records import ScheduleRecord, to_model
+from app.services.logic.schedule_builders.structures.candidate_index import CandidateIndex
+from app.services.logic.schedule_builders.structures.disjoint_set import DisjointSet
+from app.services.logic.schedule_builders.structures.decoder_arrays import DecoderArrays
+from app.services.logic.schedule_builders.structures.prefix_trie import PrefixTrie
+from app.services.logic.schedule_builders.structures.vacancy_tracker import VacancyTracker
 from app.models.professional import Professional
 from app.models.team import Team
-from moonlogger import MoonLogger
+from moonlogger import MoonLogger, LatencyStats
 
 
 def setup_test_session():
@@ -31,6 +59,33 @@ def setup_test_session():
     return Session(engine)
 
 
+class ConfiguredTestCase(unittest.TestCase):
+    def configure(self, **values):
+        """`configured` até o fim do teste."""
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(configured(**values))
+            self.addCleanup(stack.pop_all().close)
+
+
+class SmallInstanceTestCase(ConfiguredTestCase):
+    """
+    Instância pequena usada pelos testes do otimizador: 3 equipes, 2 salas e 8 cirurgias, cada uma com duas equipes
+    possíveis.
+    """
+
+    def setUp(self):
+        self.session = setup_test_session()
+        self.session.add_all([Team(id=i, name=f"Equipe {i}") for i in range(1, 4)])
+        self.session.add_all([Room(id=i, name=f"Sala {i}") for i in range(1, 3)])
+        self.session.add_all([Surgery(id=i, name=f"Cirurgia {i}", duration=15 * (i % 4 + 1), priority=i % 3 + 1)
+                              for i in range(1, 9)])
+        self.session.add_all([SurgeryPossibleTeams(surgery_id=i, team_id=team_id)
+                              for i in range(1, 9) for team_id in (i % 3 + 1, (i + 1) % 3 + 1)])
+        self.session.commit()
+        self.addCleanup(self.session.close)
+        self.cache = CacheInDict(session=self.session)
+
+
 class TestGeneSpace(unittest.TestCase):
     def setUp(self):
         # Mock do cache para simular os métodos
@@ -574,6 +629,25 @@ class TestAlgorithmExecuteWithMoreData(unittest.TestCase):
         scheduled_teams_ids = {schedule.team_id for schedule in schedules}
         self.assertEqual(len(scheduled_teams_ids), 10)  # Todas as 10 equipes devem estar agendadas
 
+    def test_fitness_only_skips_reports(self):
+        """No modo só-fitness o cache (e a punição) é o mesmo, mas nenhum relatório é montado."""
+        solution = [i % 10 for i in range(len(self.surgeries))]
+        zero_time = self.algorithm.zero_time
+        report = Algorithm(self.cache.get_table(Surgery), self.cache, zero_time)
+        self.assertIsNotNone(report.execute(solution))
+        fitness = Algorithm(self.cache.get_table(Surgery), self.cache, zero_time)
+        fitness.fitness_only = True
+        self.assertIsNone(fitness.execute(solution))
+
+        self.assertEqual(fitness.cache.calculate_punishment(zero_time), report.cache.calculate_punishment(zero_time))
+        self.assertEqual(fitness.rooms_according_to_time, [])
+        # a linha do tempo mostra cada passo como estava naquele momento: as salas são ocupadas uma a uma
+        timeline = report.rooms_according_to_time
+        self.assertEqual(len(timeline), 20)
+        self.assertEqual([row["Tempo"] for row in timeline[:5]], [zero_time] * 5)
+        self.assertEqual([sum(row[f"Sala {i}"] != "None" for i in range(1, 6)) for row in timeline[:5]],
+                         [1, 2, 3, 4, 5])
+
 
 class TestFixedSchedulesExecute(unittest.TestCase):
     @staticmethod
@@ -1002,6 +1076,27 @@ class TestInMemoryCacheCalculatePunishment(unittest.TestCase):
         expected_punishment = 10 + 20 + 30
         self.assertEqual(punishment, expected_punishment)
 
+    def test_punishment_by_room(self):
+        """A punição de cada sala deve compor a punição total."""
+        self.assertEqual(self.cache.calculate_punishment_by_room(self.now), {1: 10 + 20, 2: 30})
+        self.assertEqual(self.cache.calculate_punishment_by_room(self.now + timedelta(minutes=15)), {1: 5, 2: 15})
+
+    def test_incremental_punishment_matches_recalculation(self):
+        """A punição acumulada em register_surgery deve ser igual à recalculada a partir das colunas."""
+        self.session.add(Surgery(id=4, name="Surgery 4", duration=15, priority=1))
+        self.session.commit()
+        self.cache.load_all_data(self.session)
+        self.cache.set_time_origin(self.now)
+        cache = copy(self.cache)
+        cache.register_surgery(cache.get_by_id(Surgery, 4), Team(id=1, name="Team 1"), self.room2, self.now + timedelta(minutes=75))
+        self.assertEqual(cache.calculate_punishment_by_room(self.now), {1: 30, 2: 30 + 75})
+        # o cache original não vê o agendamento da cópia
+        self.assertEqual(self.cache.calculate_punishment(self.now), 60)
+
+        with configured(incremental_punishment=False):
+            cache.columns = None
+            self.assertEqual(cache.calculate_punishment_by_room(self.now), {1: 30, 2: 30 + 75})
+
 
 class TestOptimizer(unittest.TestCase):
     def setUp(self):
@@ -1047,3 +1142,1178 @@ class TestOptimizer(unittest.TestCase):
             cache = CacheInDict(session=session)
             optimizer = Optimizer(cache=cache)
             logger.success(optimizer.gene_space())
+
+
+class TestCacheCopyOnWrite(unittest.TestCase):
+    def setUp(self):
+        self.session = setup_test_session()
+        self.session.add_all([Team(id=1, name="Equipe A"), Team(id=2, name="Equipe B")])
+        self.session.add_all([Room(id=1, name="Sala 1")])
+        self.session.add_all([
+            Surgery(id=1, name="Cirurgia 1", duration=60, priority=1),
+            Surgery(id=2, name="Cirurgia 2", duration=30, priority=1),
+        ])
+        self.session.add_all([
+            SurgeryPossibleTeams(surgery_id=1, team_id=1),
+            SurgeryPossibleTeams(surgery_id=2, team_id=2),
+        ])
+        self.session.commit()
+
+        self.cache = CacheInDict(session=self.session)
+        self.now = datetime(2024, 11, 20, 8, 0)
+
+    def test_static_tables_are_shared(self):
+        """As tabelas estáticas não devem ser copiadas, apenas o overlay de agendamentos."""
+        _copy = copy(self.cache)
+
+        self.assertIs(_copy.get_table(Surgery), self.cache.get_table(Surgery))
+        self.assertIs(_copy.get_table(Team), self.cache.get_table(Team))
+        self.assertIsNot(_copy.get_table(Schedule), self.cache.get_table(Schedule))
+
+    def test_register_surgery_does_not_leak_to_original(self):
+        """Agendamentos registrados numa cópia não aparecem no cache original nem em outras cópias."""
+        first, second = copy(self.cache), copy(self.cache)
+        surgery = first.get_by_id(Surgery, 1)
+
+        first.register_surgery(surgery, first.get_by_id(Team, 1), first.get_by_id(Room, 1), self.now)
+
+        self.assertEqual(len(first.get_table(Schedule)), 1)
+        self.assertEqual(first.get_by_attribute(Schedule, "team_id", 1)[0].surgery_id, 1)
+        self.assertEqual(self.cache.get_table(Schedule), [])
+        self.assertEqual(second.get_by_attribute(Schedule, "team_id", 1), [])
+
+    def test_algorithm_does_not_consume_shared_surgeries(self):
+        """O algoritmo não pode remover cirurgias da tabela compartilhada ao agendá-las."""
+        algorithm = Algorithm(self.cache.get_table(Surgery), self.cache, self.now)
+        algorithm.surgeries = self.cache.get_table(Surgery)
+        algorithm.execute([0, 0])
+
+        self.assertEqual(len(self.cache.get_table(Surgery)), 2)
+        self.assertEqual(len(algorithm.cache.get_table(Schedule)), 2)
+
+
+class TestCacheIntervalIndex(unittest.TestCase):
+    def setUp(self):
+        self.session = setup_test_session()
+        self.now = datetime(2024, 11, 20, 8, 0)
+        self.session.add_all([Team(id=1, name="Equipe A"), Team(id=2, name="Equipe B")])
+        self.session.add_all([Room(id=1, name="Sala 1"), Room(id=2, name="Sala 2")])
+        self.session.add_all([
+            Surgery(id=1, name="Cirurgia 1", duration=60, priority=1),
+            Surgery(id=2, name="Cirurgia 2", duration=30, priority=1),
+            Surgery(id=3, name="Cirurgia 3", duration=45, priority=1),
+        ])
+        self.session.add_all([
+            Schedule(surgery_id=1, start_time=self.now, room_id=1, team_id=1, fixed=True),
+            Schedule(surgery_id=2, start_time=self.now + timedelta(hours=2), room_id=1, team_id=2, fixed=True),
+        ])
+        self.session.commit()
+        self.cache = CacheInDict(session=self.session)
+
+    def test_busy_checks(self):
+        """Ocupação de equipes e salas deve respeitar o intervalo [início, fim)."""
+        self.assertTrue(self.cache.is_team_busy(1, self.now + timedelta(minutes=59)))
+        self.assertFalse(self.cache.is_team_busy(1, self.now + timedelta(minutes=60)))
+        self.assertFalse(self.cache.is_room_busy(1, self.now + timedelta(minutes=90)))
+        self.assertTrue(self.cache.is_room_busy(1, self.now + timedelta(hours=2)))
+        self.assertFalse(self.cache.is_room_busy(2, self.now))
+
+    def test_index_follows_register_surgery(self):
+        """Agendamentos registrados depois da construção do índice também devem ser considerados."""
+        self.assertFalse(self.cache.is_team_busy(2, self.now + timedelta(minutes=70)))
+
+        self.cache.register_surgery(self.cache.get_by_id(Surgery, 3), self.cache.get_by_id(Team, 2),
+                                    self.cache.get_by_id(Room, 1), self.now + timedelta(minutes=60))
+
+        self.assertTrue(self.cache.is_team_busy(2, self.now + timedelta(minutes=70)))
+        surgery, schedule = self.cache.get_surgery_by_time_and_room(self.now + timedelta(minutes=70),
+                                                                    self.cache.get_by_id(Room, 1))
+        self.assertEqual(surgery.id, 3)
+        self.assertEqual(self.cache.get_next_schedule_in_room(1, self.now + timedelta(minutes=61)).surgery_id, 2)
+
+    def test_ticks_with_unaligned_origin(self):
+        """Origens fora de minutos inteiros (ex.: datetime.now()) não podem alterar a punição nem a ocupação."""
+        origin = self.now - timedelta(seconds=30, microseconds=7)
+        self.cache.set_time_origin(origin)
+
+        self.assertTrue(self.cache.is_room_busy(1, self.now + timedelta(minutes=59, seconds=59)))
+        self.assertFalse(self.cache.is_room_busy(1, self.now + timedelta(minutes=60)))
+        # 0min + 120min, contando apenas minutos inteiros a partir da origem
+        self.assertEqual(self.cache.calculate_punishment(self.now - timedelta(seconds=30)), 120)
+
+
+class TestVacancyTracker(unittest.TestCase):
+    def test_peek_returns_earliest_room_with_stable_ties(self):
+        """A sala livre mais cedo vem primeiro; empates seguem a ordem das salas."""
+        rooms = [Room(id=1, name="Sala 1"), Room(id=2, name="Sala 2"), Room(id=3, name="Sala 3")]
+        tracker = VacancyTracker(rooms, default=0)
+        self.assertEqual(tracker.peek()[0].id, 1)
+
+        tracker.extend(1, 30)
+        self.assertEqual(tracker.peek()[0].id, 2)
+
+        tracker.extend(2, 30)
+        tracker.extend(3, 10)
+        self.assertEqual(tracker.peek(), (rooms[2], 10))
+
+        tracker.extend(3, 5)  # fim menor que o atual não muda a vaga
+        tracker.extend(3, 40)
+        self.assertEqual(tracker.peek(), (rooms[0], 30))
+
+    def test_algorithm_matches_full_scan(self):
+        """A vaga mantida incrementalmente deve coincidir com a recalculada por get_next_vacancies."""
+        session = setup_test_session()
+        now = datetime(2024, 11, 20, 8, 0)
+        session.add_all([Team(id=1, name="Equipe A"), Team(id=2, name="Equipe B")])
+        session.add_all([Room(id=1, name="Sala 1"), Room(id=2, name="Sala 2")])
+        surgeries = [Surgery(id=i, name=f"Cirurgia {i}", duration=20 + 5 * i, priority=1) for i in range(1, 7)]
+        session.add_all(surgeries)
+        session.add_all([SurgeryPossibleTeams(surgery_id=i, team_id=1 + i % 2) for i in range(1, 7)])
+        session.add(Schedule(surgery_id=6, start_time=now, room_id=1, team_id=1, fixed=True))
+        session.commit()
+        cache = CacheInDict(session=session)
+
+        algorithm = Algorithm(surgeries[:5], cache, now)
+        algorithm.solution = [0] * 5
+        while algorithm.surgeries:
+            algorithm.available_teams = algorithm.cache.get_available_teams(check_time=algorithm.next_vacany)
+            if algorithm.available_teams:
+                algorithm.process_room(algorithm.solution, algorithm.available_teams)
+            expected = min(algorithm.get_next_vacancies(now, algorithm.fixed_schedules_considered,
+                                                        algorithm.empty_schedules_considered), key=lambda x: x[1])
+            algorithm.next_vacany_room, algorithm.next_vacany = algorithm.get_next_vacany()
+            self.assertEqual((algorithm.next_vacany_room.id, algorithm.next_vacany), (expected[0].id, expected[1]))
+
+
+class TestCandidateIndex(unittest.TestCase):
+    def setUp(self):
+        self.session = setup_test_session()
+        self.session.add_all([Team(id=1, name="Equipe A"), Team(id=2, name="Equipe B")])
+        self.session.add_all([Room(id=1, name="Sala 1"), Room(id=2, name="Sala 2")])
+        self.surgeries = [
+            Surgery(id=1, name="Cirurgia 1", duration=60, priority=1),
+            Surgery(id=2, name="Cirurgia 2", duration=60, priority=3),
+            Surgery(id=3, name="Cirurgia 3", duration=20, priority=1),
+            Surgery(id=4, name="Cirurgia 4", duration=20, priority=1),
+        ]
+        self.session.add_all(self.surgeries)
+        self.session.add_all([SurgeryPossibleTeams(surgery_id=i, team_id=1) for i in (1, 2, 4, 3)])
+        self.session.add_all([SurgeryPossibleRooms(surgery_id=i, room_id=2) for i in (1, 2)])
+        self.session.commit()
+        self.cache = CacheInDict(session=self.session)
+
+    def test_priority_order_and_discard(self):
+        """Menor duration / priority primeiro; empates pela ordem das possibilidades."""
+        index = CandidateIndex(self.cache, self.surgeries)
+        self.assertEqual(index.peek(1), 2)  # 60 / 3 == 20, empatada com 3 e 4, mas aparece antes
+        index.discard(2)
+        self.assertEqual(index.peek(1), 4)
+        index.discard(4)
+        self.assertEqual(index.peek(1), 3)
+        self.assertEqual(index.peek(1, room_id=2), 1)
+        self.assertIsNone(index.peek(2))
+        self.assertFalse(index.has_possibilities(2))
+
+    def test_algorithm_uses_remaining_surgeries(self):
+        """Cirurgias registradas deixam de ser candidatas para a equipe."""
+        algorithm = Algorithm(self.surgeries, self.cache, datetime(2024, 11, 20, 8, 0))
+        team = self.cache.get_by_id(Team, 1)
+        room = self.cache.get_by_id(Room, 1)
+
+        surgery = algorithm.get_next_surgery(algorithm.surgeries, team)
+        self.assertEqual(surgery.id, 2)
+        algorithm._register_surgery_and_update(surgery, team, room, algorithm.zero_time)
+        self.assertEqual(algorithm.get_next_surgery(algorithm.surgeries, team).id, 4)
+        self.assertEqual(algorithm.get_next_surgery([self.surgeries[0]], team).id, 1)
+
+
+class TestFitnessPool(SmallInstanceTestCase):
+    def test_pool_matches_serial_evaluation(self):
+        """O pool deve devolver os mesmos valores, na mesma ordem, que a avaliação serial."""
+        optimizer = Optimizer(cache=self.cache)
+        rng = random.Random(7)
+        solutions = [[rng.randint(0, 2) for _ in optimizer.solver.mobile_surgeries] for _ in range(6)]
+        serial = [optimizer.fitness_function()(None, solution, i) for i, solution in enumerate(solutions)]
+
+        with FitnessPool(2, self.cache, Algorithm, optimizer.solver.mobile_surgeries, optimizer.zero_time) as pool:
+            self.assertEqual(pool.evaluate(solutions), serial)
+
+    def test_pool_returns_worker_measurements(self):
+        """As chamadas medidas nos processos são somadas às do processo principal, sem contar as herdadas."""
+        optimizer = Optimizer(cache=self.cache)
+        solutions = [[i % 3 for i in range(len(optimizer.solver.mobile_surgeries))] for _ in range(4)]
+        MoonLogger.reset()
+        MoonLogger.record("Algorithm.execute", 1.0)
+
+        with FitnessPool(2, self.cache, Algorithm, optimizer.solver.mobile_surgeries, optimizer.zero_time) as pool:
+            pool.evaluate(solutions)
+        self.assertEqual(MoonLogger.stats_dict["Algorithm.execute"].count, 1 + len(solutions))
+        self.assertEqual(MoonLogger.stats_dict["CacheManager.calculate_punishment"].count, len(solutions))
+
+    def test_run_is_deterministic_with_seed(self):
+        """Com a mesma semente, o pool encontra a mesma solução que a execução serial."""
+        self.configure(random_seed=3, num_generations=2, workers=1)
+        serial = list(Optimizer(cache=self.cache).run())
+        self.configure(workers=2)
+        parallel = list(Optimizer(cache=self.cache).run())
+        self.assertEqual(serial, parallel)
+
+    def test_evaluate_population_matches_single_evaluations(self):
+        """O lote deve reproduzir a punição de cada indivíduo decodificado isoladamente."""
+        optimizer = Optimizer(cache=self.cache)
+        rng = random.Random(11)
+        population = np.array([[rng.randint(0, 2) for _ in optimizer.solver.mobile_surgeries] for _ in range(5)])
+
+        punishments = Algorithm.evaluate_population(population, optimizer.solver.mobile_surgeries, self.cache,
+                                                    optimizer.zero_time)
+        self.assertEqual(punishments.shape, (5,))
+        for solution, punishment in zip(population, punishments):
+            algorithm = Algorithm(optimizer.solver.mobile_surgeries, self.cache, optimizer.zero_time)
+            algorithm.execute(solution)
+            self.assertEqual(punishment, algorithm.cache.calculate_punishment(optimizer.zero_time))
+
+
+class TestFitnessCache(unittest.TestCase):
+    def test_repeated_genomes_are_evaluated_once(self):
+        """Genomas repetidos (no lote ou em lotes anteriores) não devem ser decodificados de novo."""
+        evaluated = []
+
+        def evaluate(solutions):
+            evaluated.extend(tuple(solution) for solution in solutions)
+            return [-float(sum(solution)) for solution in solutions]
+
+        fitness_cache = FitnessCache(maxsize=2)
+        hits = MoonLogger.counter_dict.get("FitnessCache.hits", 0)
+        self.assertEqual(fitness_cache.evaluate("a", [[1, 2], [1, 2], [3, 0]], evaluate), [-3.0, -3.0, -3.0])
+        self.assertEqual(fitness_cache.evaluate("a", [np.array([1, 2]), [0, 0]], evaluate), [-3.0, 0.0])
+        self.assertEqual(evaluated, [(1, 2), (3, 0), (0, 0)])
+        self.assertEqual(MoonLogger.counter_dict["FitnessCache.hits"] - hits, 2)
+
+        # LRU: (3, 0) foi o menos usado e saiu do cache
+        self.assertNotIn(FitnessCache.key("a", [3, 0]), fitness_cache)
+        self.assertIn(FitnessCache.key("a", [1, 2]), fitness_cache)
+        self.assertNotIn(FitnessCache.key("b", [1, 2]), fitness_cache)
+
+    def test_instance_hash_uses_relative_times(self):
+        """O hash depende dos dados e dos horários relativos ao zero_time, não do momento da execução."""
+        now = datetime(2024, 11, 20, 8, 0)
+
+        def build_cache(start_time):
+            session = setup_test_session()
+            session.add_all([Team(id=1, name="Equipe A"), Room(id=1, name="Sala 1")])
+            session.add_all([Surgery(id=1, name="Cirurgia 1", duration=60, priority=1),
+                             Surgery(id=2, name="Cirurgia 2", duration=30, priority=1)])
+            session.add(Schedule(surgery_id=1, start_time=start_time, room_id=1, team_id=1, fixed=True))
+            session.commit()
+            return CacheInDict(session=session)
+
+        cache, shifted_cache = build_cache(now), build_cache(now + timedelta(days=1))
+        surgeries = [cache.get_by_id(Surgery, 2)]
+
+        original = instance_hash(cache, surgeries, Algorithm, now)
+        self.assertEqual(original, instance_hash(shifted_cache, surgeries, Algorithm, now + timedelta(days=1)))
+        self.assertNotEqual(original, instance_hash(cache, surgeries, Algorithm, now + timedelta(minutes=5)))
+        self.assertNotEqual(original, instance_hash(cache, [], Algorithm, now))
+        self.assertNotEqual(original, instance_hash(cache, surgeries, apply_features(Algorithm, FixedSchedules), now))
+
+
+class TestPrefixCheckpoints(unittest.TestCase):
+    def test_prefix_trie_longest_prefix_and_eviction(self):
+        """Retorna o maior prefixo salvo e descarta o menos usado ao passar da capacidade."""
+        trie = PrefixTrie(capacity=2)
+        trie.insert((1, 2), "a")
+        trie.insert((1, 2, 3, 4), "b")
+        self.assertEqual(trie.longest_prefix([1, 2, 3, 4, 5]), (4, "b"))
+        self.assertEqual(trie.longest_prefix([1, 2, 9]), (2, "a"))
+        self.assertEqual(trie.longest_prefix([2]), (0, None))
+
+        trie.insert((7,), "c")  # (1, 2, 3, 4) foi o menos usado
+        self.assertEqual(len(trie), 2)
+        self.assertEqual(trie.longest_prefix([1, 2, 3, 4]), (2, "a"))
+
+    def test_resumed_decodes_match_full_decodes(self):
+        """Genomas que compartilham prefixos devem gerar os mesmos agendamentos retomando de um estado salvo."""
+        session = setup_test_session()
+        now = datetime(2024, 11, 20, 8, 0)
+        rng = random.Random(3)
+        session.add_all([Team(id=i, name=f"Equipe {i}") for i in range(1, 5)])
+        session.add_all([Room(id=i, name=f"Sala {i}") for i in range(1, 3)])
+        session.add_all([Surgery(id=i, name=f"Cirurgia {i}", duration=rng.choice([30, 60, 90]), priority=i % 3 + 1)
+                         for i in range(1, 17)])
+        session.add_all([SurgeryPossibleTeams(surgery_id=i, team_id=team_id)
+                         for i in range(1, 17) for team_id in rng.sample(range(1, 5), 2)])
+        session.commit()
+        cache = CacheInDict(session=session)
+        surgeries = cache.get_table(Surgery)
+
+        parent = [rng.randint(0, 3) for _ in surgeries]
+        genomes = [parent] + [parent[:cut] + [rng.randint(0, 3) for _ in parent[cut:]] for cut in (12, 8, 14, 4)]
+        trie = PrefixTrie(capacity=100)
+
+        def schedules(genome, checkpoints):
+            algorithm = Algorithm(surgeries, cache, now)
+            algorithm.execute(genome, checkpoints)
+            return sorted((s.surgery_id, s.room_id, s.team_id, s.start_time) for s in algorithm.cache.get_table(Schedule))
+
+        # os checkpoints são opcionais (desligados por padrão); aqui a trie é passada direto
+        with configured(decoder_checkpoints=8):
+            for genome in genomes:
+                self.assertEqual(schedules(genome, trie), schedules(genome, None))
+        self.assertGreater(len(trie), 0)
+
+
+class TestScheduleRecords(unittest.TestCase):
+    def test_registered_schedules_are_records_until_persisted(self):
+        """O algoritmo trabalha com registros leves, convertidos em Schedule apenas para salvar no banco."""
+        session = setup_test_session()
+        now = datetime(2024, 11, 20, 8, 0)
+        session.add_all([Team(id=1, name="Equipe A"), Room(id=1, name="Sala 1")])
+        session.add_all([Surgery(id=1, name="Cirurgia 1", duration=60, priority=1)])
+        session.commit()
+        cache = CacheInDict(session=session)
+
+        cache.register_surgery(cache.get_by_id(Surgery, 1), cache.get_by_id(Team, 1), cache.get_by_id(Room, 1), now)
+        record = cache.get_table(Schedule)[0]
+        self.assertIsInstance(record, ScheduleRecord)
+        self.assertFalse(hasattr(record, "__dict__"))
+        self.assertEqual(record, ScheduleRecord(start_time=now, surgery_id=1, room_id=1, team_id=1))
+
+        session.add_all([to_model(row) for row in cache.get_table(Schedule)])
+        session.commit()
+        saved = session.get(Schedule, 1)
+        self.assertEqual((saved.start_time, saved.room_id, saved.team_id, saved.fixed), (now, 1, 1, False))
+        self.assertEqual(cache.get_dict_surgeries_by_time(now), {"Sala 1": "Equipe A - Cirurgia 1 - 60min"})
+
+
+class TestNumbaAlgorithm(unittest.TestCase):
+    def setUp(self):
+        self.session = setup_test_session()
+        teams, patients, surgeries, surgery_possible_teams, rooms = [], [], [], [], []
+        TestAlgorithmExecuteWithMoreData.setting_up(teams, patients, surgeries, surgery_possible_teams, rooms)
+        self.session.add_all([*teams, *patients, *surgeries, *surgery_possible_teams, *rooms])
+        self.zero_time = datetime(2024, 11, 20, 7, 0)
+        # agendamentos fixos (fora de minutos inteiros) que ocupam salas e equipes durante a decodificação
+        self.session.add_all([
+            Schedule(start_time=self.zero_time + timedelta(minutes=90, seconds=17), surgery_id=3, room_id=2,
+                     team_id=4, fixed=True),
+            Schedule(start_time=self.zero_time + timedelta(minutes=400), surgery_id=8, room_id=5, team_id=9,
+                     fixed=True),
+        ])
+        self.session.commit()
+        self.cache = CacheInDict(session=self.session)
+        self.mobile_surgeries = Solver(self.cache).mobile_surgeries
+        rng = random.Random(5)
+        self.population = [[rng.randint(-2, 11) for _ in self.mobile_surgeries] for _ in range(25)]
+
+    def decode(self, algorithm_base, solution):
+        algorithm = algorithm_base(self.mobile_surgeries, self.cache, self.zero_time)
+        algorithm.execute(solution)
+        schedules = sorted((sch.surgery_id, sch.room_id, sch.team_id, sch.start_time)
+                           for sch in algorithm.cache.get_table(Schedule))
+        return schedules, algorithm.cache.calculate_punishment(self.zero_time), algorithm.rooms_according_to_time
+
+    def test_execute_reproduces_algorithm(self):
+        """A decodificação compilada deve gerar os mesmos agendamentos (e a mesma punição) do Algorithm."""
+        for solution in self.population:
+            self.assertEqual(self.decode(NumbaAlgorithm, solution), self.decode(Algorithm, solution))
+
+    def test_evaluate_population_reproduces_algorithm(self):
+        punishments = Algorithm.evaluate_population(self.population, self.mobile_surgeries, self.cache,
+                                                    self.zero_time)
+        self.assertEqual(NumbaAlgorithm.evaluate_population(self.population, self.mobile_surgeries, self.cache,
+                                                            self.zero_time).tolist(), punishments.tolist())
+
+    def test_optimizer_uses_algorithm_base(self):
+        """O fitness do otimizador deve usar a classe de algoritmo recebida."""
+        optimizer = Optimizer(cache=self.cache, algorithm_base=NumbaAlgorithm)
+        reference = Optimizer(cache=self.cache)
+        reference.zero_time = optimizer.zero_time
+        solutions = [[gene % 10 for gene in solution] for solution in self.population[:4]]
+
+        fitness = optimizer.batch_fitness_function()(None, solutions, None)
+        self.assertEqual(fitness, [optimizer.fitness_function()(None, solution, i)
+                                   for i, solution in enumerate(solutions)])
+        self.assertEqual(fitness, reference.batch_fitness_function()(None, solutions, None))
+
+    def test_algorithm_class_follows_config(self):
+        """`DefaultConfig.decoder` escolhe a decodificação; com features a base compilada recai no Python."""
+        with configured(decoder="numba"):
+            self.assertIs(algorithm_class(), NumbaAlgorithm)
+            combined = algorithm_class(FixedSchedules)
+            self.assertIs(combined.__base_algorithm__, NumbaAlgorithm)
+            self.assertEqual(combined.__features__, (FixedSchedules,))
+        with configured(decoder="python"):
+            self.assertIs(algorithm_class(), Algorithm)
+
+
+class TestMoonLoggerModes(unittest.TestCase):
+    def setUp(self):
+        self.saved = MoonLogger.mode, MoonLogger.sample_rate
+
+    def tearDown(self):
+        MoonLogger.mode, MoonLogger.sample_rate = self.saved
+
+    def test_off_returns_original_function(self):
+        """Sem medir nem capturar nada: o decorador retorna a própria função."""
+        MoonLogger.mode = "off"
+
+        def failing():
+            raise ValueError("boom")
+
+        def func(x):
+            return x * 2
+
+        MoonLogger.time_dict.pop(func.__qualname__, None)
+        self.assertIs(MoonLogger.log_func(enabled=False)(func), func)
+        self.assertIs(MoonLogger.log_func()(failing), failing)
+        with self.assertRaises(ValueError):
+            MoonLogger.log_func(enabled=False)(failing)()
+        self.assertEqual(MoonLogger.log_func(enabled=False)(func)(3), 6)
+        self.assertNotIn(func.__qualname__, MoonLogger.time_dict)
+
+    def test_punishments_do_not_depend_on_mode(self):
+        """O modo é lido na importação, então cada um roda num processo; um registro que falha não vira punição
+        infinita em nenhum deles."""
+        script = (
+            "from datetime import datetime\n"
+            "from unittest.mock import patch\n"
+            "from benchmarks.instances import instance_cache\n"
+            "from app.models import Surgery\n"
+            "from app.services.cache.cache_in_dict import CacheInDict\n"
+            "from app.services.logic.schedule_builders.algorithm import Algorithm\n"
+            "zero_time = datetime(2024, 1, 1)\n"
+            "cache = instance_cache(12, 3, 2, zero_time=zero_time, seed=3)\n"
+            "register = CacheInDict.register_surgery\n"
+            "def flaky(self, surgery, *args):\n"
+            "    if surgery.id == 5:\n"
+            "        raise RuntimeError('registro falhou')\n"
+            "    return register(self, surgery, *args)\n"
+            "population = [[k % 3] * 12 for k in range(4)]\n"
+            "with patch.object(CacheInDict, 'register_surgery', flaky):\n"
+            "    print(list(Algorithm.evaluate_population(population, cache.get_table(Surgery), cache, zero_time)))\n"
+        )
+        outputs = {}
+        for mode in MoonLogger.modes:
+            result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=300,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                                    env={**os.environ, "MOONLOGGER_MODE": mode, "MOONLOGGER_TRACE": "0"})
+            self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+            self.assertIn("registro falhou", result.stderr)
+            outputs[mode] = result.stdout.strip().splitlines()[-1]
+        self.assertNotIn("inf", outputs["full"])
+        self.assertEqual(outputs["sampled"], outputs["full"])
+        self.assertEqual(outputs["off"], outputs["full"])
+
+    def test_sampled_extrapolates_measured_calls(self):
+        """Só 1 a cada N chamadas é medida, e o tempo dela conta por N."""
+        MoonLogger.mode, MoonLogger.sample_rate = "sampled", 4
+        durations = iter([0.0, 0.5, 1.0, 1.25])
+
+        def slow(x):
+            return x + 1
+
+        wrapped = MoonLogger.log_func(enabled=False)(slow)
+        name = slow.__qualname__
+        MoonLogger.time_dict.pop(name, None)
+        with patch("moonlogger.time.perf_counter", side_effect=lambda: next(durations)):
+            self.assertEqual([wrapped(i) for i in range(8)], list(range(1, 9)))
+        self.assertEqual(MoonLogger.time_dict[name], 0.5 * 4 + 0.25 * 4)
+
+    def test_sampled_keeps_catching_errors(self):
+        """Como no modo completo, erros são registrados e a chamada retorna None."""
+        MoonLogger.mode = "sampled"
+
+        def failing():
+            raise ValueError("boom")
+
+        self.assertIsNone(MoonLogger.log_func(enabled=False)(failing)())
+
+
+class TestMoonLoggerStats(unittest.TestCase):
+    def setUp(self):
+        MoonLogger.reset()
+
+    def test_percentiles_within_bucket_error(self):
+        """Os percentis do histograma ficam a no máximo 1/SUB_BUCKETS do valor exato."""
+        stats = LatencyStats()
+        durations = [i / 10_000 for i in range(1, 1001)]
+        for duration in durations:
+            stats.record(duration)
+        for q, exact in ((50, durations[499]), (95, durations[949]), (99, durations[989])):
+            self.assertAlmostEqual(stats.percentile(q), exact, delta=exact / LatencyStats.SUB_BUCKETS)
+        self.assertEqual((stats.count, stats.min, stats.max), (1000, durations[0], durations[-1]))
+
+    def test_drain_and_merge(self):
+        """O que um processo drena e outro soma mantém contagens, totais e extremos."""
+        MoonLogger.record("f", 0.001)
+        MoonLogger.record("f", 0.004, weight=3)
+        MoonLogger.count("hits", 2)
+        payload = pickle.loads(pickle.dumps(MoonLogger.drain()))
+        self.assertEqual(MoonLogger.snapshot(), {"functions": {}, "counters": {}})
+
+        MoonLogger.record("f", 0.002)
+        MoonLogger.merge(payload)
+        stats = MoonLogger.snapshot()["functions"]["f"]
+        self.assertEqual((stats["count"], stats["min"], stats["max"]), (5, 0.001, 0.004))
+        self.assertAlmostEqual(MoonLogger.time_dict["f"], 0.015)
+        self.assertEqual(MoonLogger.counter_dict, {"hits": 2})
+
+    def test_exports(self):
+        MoonLogger.record('A.<locals>."f"', 0.5)
+        self.assertEqual(json.loads(MoonLogger.stats_json())["functions"]['A.<locals>."f"']["count"], 1)
+        text = MoonLogger.stats_prometheus()
+        self.assertIn('moonlogger_function_seconds_count{function="A.<locals>.\\"f\\""} 1', text)
+        self.assertIn('moonlogger_function_max_seconds{function="A.<locals>.\\"f\\""} 0.5', text)
+
+
+class TestMoonLoggerTrace(unittest.TestCase):
+    def setUp(self):
+        MoonLogger.reset()
+        self.saved = MoonLogger.tracing
+        MoonLogger.tracing = True
+
+    def tearDown(self):
+        MoonLogger.tracing = self.saved
+        MoonLogger.reset()
+
+    def test_nested_spans(self):
+        """Cada chamada fica sob a que a chamou, e o tempo dos filhos sai do tempo próprio do pai."""
+        @MoonLogger.log_func(enabled=False)
+        def inner():
+            return 1
+
+        @MoonLogger.log_func(enabled=False)
+        def outer():
+            return inner() + inner()
+
+        with MoonLogger.span("run"):
+            self.assertEqual(outer(), 2)
+
+        outer_name = "TestMoonLoggerTrace.test_nested_spans.<locals>.outer"
+        inner_name = "TestMoonLoggerTrace.test_nested_spans.<locals>.inner"
+        stacks = dict(line.rsplit(" ", 1) for line in MoonLogger.collapsed_stacks().splitlines())
+        self.assertEqual(set(stacks), {"run", f"run;{outer_name}", f"run;{outer_name};{inner_name}"})
+        events = MoonLogger.chrome_trace()["traceEvents"]
+        self.assertEqual([event["name"] for event in events].count(inner_name), 2)
+        run = next(event for event in events if event["name"] == "run")
+        for event in events:
+            self.assertEqual(event["ph"], "X")
+            self.assertGreaterEqual(event["ts"], run["ts"])
+            self.assertLessEqual(event["ts"] + event["dur"], run["ts"] + run["dur"] + 1e-3)
+
+    def test_merged_stacks_nest_under_current_span(self):
+        """As pilhas vindas de outro processo ficam sob o span que recebeu o lote."""
+        with MoonLogger.span("worker"):
+            pass
+        payload = MoonLogger.drain()
+        with MoonLogger.span("generation 0"):
+            MoonLogger.merge(payload)
+        self.assertIn("generation 0;worker", MoonLogger.stacks_dict)
+
+    def small_cache(self) -> CacheInDict:
+        session = setup_test_session()
+        session.add_all([Team(id=i, name=f"Equipe {i}") for i in range(1, 3)])
+        session.add_all([Room(id=1, name="Sala 1")])
+        session.add_all([Surgery(id=i, name=f"Cirurgia {i}", duration=30, priority=1) for i in range(1, 5)])
+        session.add_all([SurgeryPossibleTeams(surgery_id=i, team_id=i % 2 + 1) for i in range(1, 5)])
+        session.commit()
+        return CacheInDict(session=session)
+
+    def test_optimizer_generations(self):
+        """As avaliações de cada geração ficam sob o span dela."""
+        cache = self.small_cache()
+        with configured(num_generations=2, workers=1):
+            Optimizer(cache=cache).run()
+
+        self.assertIn("Optimizer.run;generation 0;Algorithm.execute;", MoonLogger.collapsed_stacks())
+
+    def test_pool_spans_are_not_inherited(self):
+        """Os processos do pool não herdam a pilha do span aberto quando foram criados."""
+        optimizer = Optimizer(cache=self.small_cache())
+        solutions = [[0] * len(optimizer.solver.mobile_surgeries)] * 2
+        with FitnessPool(2, optimizer.cache, Algorithm, optimizer.solver.mobile_surgeries, optimizer.zero_time) as pool:
+            with MoonLogger.span("generation 0"):
+                pool.evaluate(solutions)
+
+        stacks = MoonLogger.collapsed_stacks()
+        self.assertIn("generation 0;Algorithm.execute", stacks)
+        self.assertNotIn("generation 0;generation 0", stacks)
+
+
+
+class TestStopCriteria(SmallInstanceTestCase):
+    @staticmethod
+    def generation(completed, previous, last):
+        return MagicMock(generations_completed=completed, previous_generation_fitness=np.array(previous),
+                         last_generation_fitness=np.array(last))
+
+    def test_lower_bound_is_spt(self):
+        """As cirurgias mais longas ficam por último em cada sala; nenhuma decodificação fica abaixo do limite."""
+        surgeries = [Surgery(id=i, name="", duration=duration) for i, duration in enumerate([30, 120, 60, 90])]
+        self.assertEqual(punishment_lower_bound(self.cache, surgeries), 60 + 30)
+
+        optimizer = Optimizer(cache=self.cache)
+        bound = punishment_lower_bound(self.cache, optimizer.solver.mobile_surgeries)
+        rng = random.Random(3)
+        for _ in range(10):
+            solution = [rng.randint(0, 2) for _ in optimizer.solver.mobile_surgeries]
+            self.assertGreaterEqual(-optimizer.fitness_function()(None, solution, 0), bound)
+
+    def test_stall_and_budget(self):
+        criteria = StopCriteria(stall_generations=2)
+        self.assertIsNone(criteria.on_generation(self.generation(1, [-50, -60], [-40, -70])))
+        self.assertIsNone(criteria.on_generation(self.generation(2, [-40, -70], [-45, -41])))
+        self.assertEqual(criteria.on_generation(self.generation(3, [-45, -41], [-40, -42])), "stop")
+        self.assertEqual((criteria.reason, criteria.generations, criteria.best_punishment), ("stall", 3, 40))
+
+        criteria = StopCriteria(time_budget=0)
+        self.assertEqual(criteria.on_generation(self.generation(1, [-1], [-1])), "stop")
+        self.assertEqual(criteria.reason, "time_budget")
+
+    def test_run_reports_stop(self):
+        self.configure(num_generations=50, random_seed=5, stop_at_lower_bound=False, stall_generations=3)
+        optimizer = Optimizer(cache=self.cache)
+        optimizer.run()
+        self.assertEqual(optimizer.stop_reason, "stall")
+        self.assertLess(optimizer.generations_run, 50)
+
+        # com uma única sala e sem esperas por equipe, a ordem SPT é alcançável
+        session = setup_test_session()
+        session.add_all([Team(id=1, name="Equipe 1"), Room(id=1, name="Sala 1")])
+        session.add_all([Surgery(id=i, name=f"Cirurgia {i}", duration=30, priority=1) for i in range(1, 5)])
+        session.add_all([SurgeryPossibleTeams(surgery_id=i, team_id=1) for i in range(1, 5)])
+        session.commit()
+        self.configure(stop_at_lower_bound=True, stall_generations=None)
+        optimizer = Optimizer(cache=CacheInDict(session=session))
+        optimizer.run()
+        self.assertEqual((optimizer.stop_reason, optimizer.generations_run), ("lower_bound", 1))
+
+
+class TestSeeding(SmallInstanceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.optimizer = Optimizer(cache=self.cache)
+
+    def test_heuristic_genomes(self):
+        """Genomas distintos, dentro do espaço de genes, e a regra SPT começa pela menor cirurgia possível."""
+        surgeries, gene_space = self.optimizer.solver.mobile_surgeries, self.optimizer.solver.gene_space()
+        genomes = heuristic_genomes(self.cache, surgeries, self.optimizer.zero_time, gene_space)
+        self.assertEqual(genomes[0], [0] * len(surgeries))
+        self.assertEqual(len(genomes), len({tuple(genome) for genome in genomes}))
+        for genome in genomes:
+            self.assertTrue(all(0 <= gene <= space["high"] for gene, space in zip(genome, gene_space)))
+
+        arrays = DecoderArrays(self.cache, surgeries, self.optimizer.zero_time)
+        shortest = greedy_genome(arrays, HEURISTICS["shortest_first"], [space["high"] for space in gene_space])
+        first = arrays.surgeries[DecoderState(arrays).advance(shortest[0])[0]]
+        for gene in range(len(arrays.teams)):
+            other = arrays.surgeries[DecoderState(arrays).advance(gene)[0]]
+            self.assertLessEqual(first.duration, other.duration)
+
+    def test_decoder_state_follows_decode(self):
+        """Avançar um gene de cada vez agenda os mesmos pares, na mesma ordem, que a decodificação do genoma inteiro."""
+        surgeries, gene_space = self.optimizer.solver.mobile_surgeries, self.optimizer.solver.gene_space()
+        zero_time = self.optimizer.zero_time
+        arrays = DecoderArrays(self.cache, surgeries, zero_time)
+        rng = random.Random(5)
+        for _ in range(10):
+            genome = [rng.randint(0, space["high"]) for space in gene_space]
+            state = DecoderState(arrays)
+            pairs = [state.advance(gene) for gene in genome]
+            algorithm = NumbaAlgorithm(surgeries, copy(self.cache), zero_time)
+            algorithm.execute(genome)
+            self.assertEqual([(arrays.surgeries[surgery].id, arrays.teams[team].id) for surgery, team in pairs],
+                             [(row.surgery_id, row.team_id) for row in algorithm.cache.get_table(Schedule)])
+
+    def test_greedy_genome_size(self):
+        """A decodificação avança uma vez por gene, então 400 cirurgias levam bem menos que os minutos de antes."""
+        zero_time = datetime(2024, 1, 1, 8)
+        cache = instance_cache(400, 20, 10, zero_time=zero_time, seed=1)
+        optimizer = Optimizer(cache=cache, zero_time=zero_time)
+        started = datetime.now()
+        genomes = heuristic_genomes(cache, optimizer.solver.mobile_surgeries, zero_time, optimizer.solver.gene_space())
+        self.assertLess(datetime.now() - started, timedelta(seconds=10))
+        self.assertEqual(len(genomes), len(HEURISTICS))
+
+    def test_seeded_population(self):
+        """Os genomas heurísticos ocupam o início da população; o resto é a população aleatória de sempre."""
+        self.configure(random_seed=3, seed_ratio=0)
+        base = self.optimizer.build_ga(self.optimizer.batch_fitness_function()).population.tolist()
+        self.configure(seed_ratio=0.2)
+        ga_instance = self.optimizer.build_ga(self.optimizer.batch_fitness_function())
+        seeds = heuristic_genomes(self.cache, self.optimizer.solver.mobile_surgeries, self.optimizer.zero_time,
+                                  self.optimizer.solver.gene_space())
+        self.assertEqual(ga_instance.population.tolist(), seeds + base[len(seeds):])
+        self.assertEqual(ga_instance.initial_population.tolist(), ga_instance.population.tolist())
+
+
+class TestWarmStart(SmallInstanceTestCase):
+    @staticmethod
+    def plan(optimizer: Optimizer, genome: List[int]):
+        algorithm = Algorithm(optimizer.solver.mobile_surgeries, copy(optimizer.cache), optimizer.zero_time)
+        algorithm.execute(genome)
+        return algorithm.cache.get_table(Schedule), algorithm.cache.calculate_punishment(optimizer.zero_time)
+
+    def test_encode_reproduces_plan(self):
+        """Decodificar o genoma codificado a partir de um plano devolve o mesmo plano."""
+        optimizer = Optimizer(cache=self.cache)
+        gene_space = optimizer.solver.gene_space()
+        rng = random.Random(11)
+
+        def rows(table):
+            return sorted((s.surgery_id, s.team_id, s.room_id, s.start_time) for s in table)
+
+        for _ in range(10):
+            schedules, _ = self.plan(optimizer, [rng.randint(0, space["high"]) for space in gene_space])
+            genome = encode_schedule(self.cache, optimizer.solver.mobile_surgeries, optimizer.zero_time, gene_space,
+                                     schedules)
+            self.assertEqual(rows(self.plan(optimizer, genome)[0]), rows(schedules))
+
+    def test_encode_large_plan(self):
+        """A codificação passa uma vez pela decodificação: um plano de 300 cirurgias volta em poucos segundos."""
+        zero_time = datetime(2024, 1, 1, 8)
+        cache = instance_cache(300, 15, 8, zero_time=zero_time, seed=2)
+        optimizer = Optimizer(cache=cache, zero_time=zero_time)
+        gene_space = optimizer.solver.gene_space()
+        schedules, punishment = self.plan(optimizer, [gene % 3 for gene in range(len(gene_space))])
+
+        started = datetime.now()
+        genome = encode_schedule(cache, optimizer.solver.mobile_surgeries, zero_time, gene_space, schedules)
+        self.assertLess(datetime.now() - started, timedelta(seconds=10))
+        self.assertEqual(self.plan(optimizer, genome)[1], punishment)
+
+    def test_warm_start_run(self):
+        """O plano anterior (mais uma cirurgia nova) entra na população e a reotimização curta não fica pior."""
+        optimizer = Optimizer(cache=self.cache)
+        previous, _ = self.plan(optimizer, [1] * len(optimizer.solver.mobile_surgeries))
+
+        self.session.add(Surgery(id=9, name="Cirurgia 9", duration=30, priority=2))
+        self.session.add(SurgeryPossibleTeams(surgery_id=9, team_id=1))
+        self.session.commit()
+        self.configure(random_seed=2, warm_start_generations=3)
+        optimizer = Optimizer(cache=CacheInDict(session=self.session))
+        optimizer.warm_start_from(previous)
+        self.assertEqual(len(optimizer.warm_start), 9)
+        ga_instance = optimizer.build_ga(optimizer.batch_fitness_function())
+        self.assertEqual(ga_instance.population[0].tolist(), optimizer.warm_start)
+        self.assertEqual(ga_instance.num_generations, 3)
+
+        solution = optimizer.run()
+        self.assertLessEqual(self.plan(optimizer, list(solution))[1], self.plan(optimizer, optimizer.warm_start)[1])
+        self.assertLessEqual(optimizer.generations_run, 3)
+
+
+class TestReschedule(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(1)
+        self.session = setup_test_session()
+        self.session.add_all([Team(id=i, name=f"Equipe {i}") for i in range(1, 7)])
+        self.session.add_all([Room(id=i, name=f"Sala {i}") for i in range(1, 4)])
+        self.session.add_all([Surgery(id=i, name=f"Cirurgia {i}", duration=rng.choice([15, 30, 45, 60, 90, 120]),
+                                      priority=rng.randint(1, 3)) for i in range(1, 31)])
+        self.session.add_all([SurgeryPossibleTeams(surgery_id=i, team_id=team_id)
+                              for i in range(1, 31) for team_id in rng.sample(range(1, 7), 2)])
+        self.session.commit()
+        self.cache = CacheInDict(session=self.session)
+        optimizer = Optimizer(cache=self.cache)
+        self.zero_time = optimizer.zero_time
+        algorithm = Algorithm(optimizer.solver.mobile_surgeries, copy(self.cache), self.zero_time)
+        algorithm.execute([rng.randint(0, space["high"]) for space in optimizer.solver.gene_space()])
+        self.plan = algorithm.cache.get_table(Schedule)
+
+    def tearDown(self):
+        self.session.close()
+
+    def assertNoOverlaps(self, plan):
+        for attribute in ("room_id", "team_id"):
+            intervals = defaultdict(list)
+            for row in plan:
+                end = row.start_time + timedelta(minutes=self.cache.get_by_id(Surgery, row.surgery_id).duration)
+                intervals[getattr(row, attribute)].append((row.start_time, end))
+            for rows in intervals.values():
+                rows.sort()
+                for (_, end), (start, _) in zip(rows, rows[1:]):
+                    self.assertLessEqual(end, start)
+
+    def test_cancel_keeps_unaffected_rows(self):
+        """Cancelar uma cirurgia só mexe nas que ainda não começaram, em salas e equipes atingidas."""
+        now = self.zero_time + timedelta(hours=2)
+        cancelled = min((row for row in self.plan if row.start_time >= now), key=lambda row: row.start_time)
+        rooms, teams = affected(self.cache, self.plan, [], [cancelled.surgery_id], now)
+        self.assertIn(cancelled.room_id, rooms)
+        self.assertIn(cancelled.team_id, teams)
+
+        diff = reschedule(self.cache, self.plan, cancelled=[cancelled.surgery_id], zero_time=now)
+        self.assertEqual([row.surgery_id for row in diff.removed], [cancelled.surgery_id])
+        self.assertEqual(diff.added, [])
+        self.assertEqual(len(diff.plan), len(self.plan) - 1)
+        self.assertTrue(diff.moved)
+        for before, after in diff.moved:
+            self.assertGreaterEqual(before.start_time, now)
+            self.assertGreaterEqual(after.start_time, now)
+            self.assertTrue(before.room_id in rooms or before.team_id in teams)
+        self.assertNoOverlaps(diff.plan)
+
+    def test_add_surgery(self):
+        """Uma cirurgia nova entra no plano em menos de um segundo, sem sobreposições."""
+        self.session.add(Surgery(id=31, name="Cirurgia 31", duration=60, priority=1))
+        self.session.add_all([SurgeryPossibleTeams(surgery_id=31, team_id=team_id) for team_id in (2, 5)])
+        self.session.commit()
+        self.cache.load_all_data(self.session)
+
+        started = datetime.now()
+        diff = reschedule(self.cache, self.plan, added=[31], zero_time=self.zero_time)
+        self.assertLess(datetime.now() - started, timedelta(seconds=1))
+
+        self.assertEqual([row.surgery_id for row in diff.added], [31])
+        self.assertIn(diff.added[0].team_id, (2, 5))
+        self.assertEqual(diff.removed, [])
+        self.assertEqual(sorted(row.surgery_id for row in diff.plan), list(range(1, 32)))
+        self.assertNoOverlaps(diff.plan)
+
+    def test_large_plan(self):
+        """Num plano de 300 cirurgias, um cancelamento só mexe na janela em volta dele, e rápido."""
+        cache = instance_cache(300, 15, 8, zero_time=self.zero_time, seed=4)
+        optimizer = Optimizer(cache=cache, zero_time=self.zero_time)
+        algorithm = Algorithm(optimizer.solver.mobile_surgeries, copy(cache), self.zero_time)
+        algorithm.execute([random.Random(1).randint(0, space["high"]) for space in optimizer.solver.gene_space()])
+        plan = algorithm.cache.get_table(Schedule)
+        now = self.zero_time + timedelta(hours=3)
+        cancelled = min((row for row in plan if row.start_time >= now), key=lambda row: row.start_time)
+
+        started = datetime.now()
+        diff = reschedule(cache, plan, cancelled=[cancelled.surgery_id], zero_time=now,
+                          algorithm_base=apply_features(Algorithm, RoomLimiter))
+        self.assertLess(datetime.now() - started, timedelta(seconds=1))
+
+        self.assertEqual([row.surgery_id for row in diff.removed], [cancelled.surgery_id])
+        self.assertLessEqual(len(diff.moved), 20)
+
+        def waiting(rows):
+            return sum(max(0, (row.start_time - now) // timedelta(minutes=1)) for row in rows)
+
+        # melhor que só tirar a cancelada do plano
+        self.assertLess(waiting(diff.plan), waiting(row for row in plan if row is not cancelled))
+        # o fim do plano aleatório já tem equipes sobrepostas; os reagendados não podem ter
+        for _, row in diff.moved:
+            end = row.start_time + timedelta(minutes=cache.get_by_id(Surgery, row.surgery_id).duration)
+            for other in diff.plan:
+                other_end = other.start_time + timedelta(minutes=cache.get_by_id(Surgery, other.surgery_id).duration)
+                if other.surgery_id != row.surgery_id and row.start_time < other_end and other.start_time < end:
+                    self.assertNotEqual(other.room_id, row.room_id)
+                    self.assertNotEqual(other.team_id, row.team_id)
+
+    def test_hill_climb(self):
+        """A busca local só aceita melhoras e para no prazo."""
+        gene_space = [{"low": 0, "high": 3}] * 4
+
+        def fitness_func(ga_instance, solutions, solutions_idx):
+            return [-sum(abs(gene - 2) for gene in genome) for genome in solutions]
+
+        self.assertEqual(hill_climb(fitness_func, [0, 0, 0, 0], gene_space, float("inf")), [2, 2, 2, 2])
+        self.assertEqual(hill_climb(fitness_func, [0, 0, 0, 0], gene_space, 0), [0, 0, 0, 0])
+
+        # genes que não começam em 0 nunca saem do intervalo
+        shifted = [{"low": 3, "high": 5}] * 4
+        self.assertEqual(hill_climb(fitness_func, [5, 5, 5, 5], shifted, float("inf")), [3, 3, 3, 3])
+
+    def test_exhaustive(self):
+        """A busca exaustiva acha o melhor genoma e, no prazo, devolve o melhor visto até ali (o de partida primeiro)."""
+        calls = []
+
+        def fitness_func(ga_instance, solutions, solutions_idx):
+            calls.extend(solutions)
+            return [-sum(abs(gene - 2) for gene in genome) for genome in solutions]
+
+        gene_space = [{"low": 1, "high": 3}] * 3
+        self.assertEqual(exhaustive(fitness_func, gene_space, float("inf")), [2, 2, 2])
+        self.assertEqual(len(calls), 27)
+        self.assertTrue(all(1 <= gene <= 3 for genome in calls for gene in genome))
+
+        calls.clear()
+        self.assertEqual(exhaustive(fitness_func, gene_space, 0, start=[3, 2, 2]), [3, 2, 2])
+        self.assertEqual(calls, [[3, 2, 2]])
+
+
+class CountingRunOptimizer(Optimizer):
+    """`Optimizer` que conta as suas execuções no `MoonLogger` (medições que voltam dos processos dos componentes)."""
+
+    def run(self):
+        MoonLogger.count("CountingRunOptimizer.run")
+        return super().run()
+
+
+class TestDecomposition(ConfiguredTestCase):
+    def setUp(self):
+        # dois grupos que não compartilham equipes nem salas: cirurgias 1-6 (equipes e salas 1-2) e 7-12 (3-4)
+        self.session = setup_test_session()
+        self.session.add_all([Team(id=i, name=f"Equipe {i}") for i in range(1, 5)])
+        self.session.add_all([Room(id=i, name=f"Sala {i}") for i in range(1, 5)])
+        self.session.add_all([Surgery(id=i, name=f"Cirurgia {i}", duration=15 * (i % 4 + 1), priority=i % 3 + 1)
+                              for i in range(1, 13)])
+        for i in range(1, 13):
+            group = 0 if i <= 6 else 2
+            self.session.add_all([SurgeryPossibleTeams(surgery_id=i, team_id=group + j) for j in (1, 2)])
+            self.session.add_all([SurgeryPossibleRooms(surgery_id=i, room_id=group + j) for j in (1, 2)])
+        self.session.commit()
+        self.cache = CacheInDict(session=self.session)
+        self.algorithm_base = apply_features(Algorithm, RoomLimiter)
+        self.configure(random_seed=1)
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_disjoint_set(self):
+        components = DisjointSet(range(6))
+        components.union(0, 1)
+        components.union(4, 5)
+        components.union(1, 5)
+        self.assertEqual(components.find(0), components.find(4))
+        self.assertEqual(sorted(map(sorted, components.groups())), [[0, 1, 4, 5], [2], [3]])
+
+    def test_components(self):
+        """Os grupos viram componentes só quando as salas também restringem as cirurgias."""
+        parts = Optimizer(cache=self.cache, algorithm_base=self.algorithm_base).components()
+        self.assertEqual([sorted(surgery.id for surgery in part.get_table(Surgery)) for part in parts],
+                         [list(range(1, 7)), list(range(7, 13))])
+        self.assertEqual([[team.id for team in part.get_table(Team)] for part in parts], [[1, 2], [3, 4]])
+        self.assertEqual([[room.id for room in part.get_table(Room)] for part in parts], [[1, 2], [3, 4]])
+
+        # sem RoomLimiter qualquer cirurgia usa qualquer sala, então tudo é um componente só
+        self.assertEqual(Optimizer(cache=self.cache).components(), [])
+
+    def test_solve_merges_components(self):
+        """O plano juntado tem todas as cirurgias, cada uma no seu grupo, e a mesma punição da soma das partes."""
+        optimizer = Optimizer(cache=self.cache, algorithm_base=self.algorithm_base)
+        algorithm = optimizer.solve()
+        schedules = algorithm.cache.get_table(Schedule)
+
+        self.assertEqual(sorted(schedule.surgery_id for schedule in schedules), list(range(1, 13)))
+        for schedule in schedules:
+            group = 0 if schedule.surgery_id <= 6 else 2
+            self.assertIn(schedule.team_id, (group + 1, group + 2))
+            self.assertIn(schedule.room_id, (group + 1, group + 2))
+        self.assertTrue(algorithm.rooms_according_to_time)
+
+        self.configure(decompose=False)
+        monolithic = Optimizer(cache=self.cache, algorithm_base=self.algorithm_base,
+                               zero_time=optimizer.zero_time).solve()
+        self.assertLessEqual(algorithm.cache.calculate_punishment(optimizer.zero_time),
+                             monolithic.cache.calculate_punishment(optimizer.zero_time))
+
+
+    def test_solve_keeps_optimizer_class(self):
+        """Os componentes são otimizados pela classe do otimizador que os separou, no processo e nos workers."""
+        self.configure(num_generations=2, stop_at_lower_bound=False)
+        for workers in (1, 2):
+            self.configure(workers=workers)
+            runs = MoonLogger.counter_dict.get("CountingRunOptimizer.run", 0)
+            CountingRunOptimizer(cache=self.cache, algorithm_base=self.algorithm_base).solve()
+            self.assertEqual(MoonLogger.counter_dict["CountingRunOptimizer.run"] - runs, 2)
+
+
+class TestIslandOptimizer(SmallInstanceTestCase):
+    def test_migrate(self):
+        """Os melhores de cada ilha substituem os piores da seguinte, em anel."""
+        populations = [[[0], [1], [2]], [[3], [4], [5]]]
+        fitness = [[-5.0, -1.0, -3.0], [-2.0, -9.0, -4.0]]
+        migrate(populations, fitness, 1)
+        self.assertEqual(populations, [[[3], [1], [2]], [[3], [1], [5]]])
+        self.assertEqual(fitness, [[-2.0, -1.0, -3.0], [-2.0, -1.0, -4.0]])
+
+    def test_run(self):
+        """Mesmo contrato do `Optimizer.run`: devolve um genoma válido, depois de todas as épocas."""
+        self.configure(random_seed=1, islands=2, num_generations=4, migration_interval=2, stop_at_lower_bound=False)
+        optimizer = IslandOptimizer(cache=self.cache)
+        solution = optimizer.run()
+
+        self.assertEqual(len(solution), len(optimizer.solver.mobile_surgeries))
+        self.assertEqual((optimizer.generations_run, optimizer.stop_reason), (4, "num_generations"))
+        algorithm = Algorithm(optimizer.solver.mobile_surgeries, copy(self.cache), optimizer.zero_time)
+        algorithm.execute(solution)
+        self.assertEqual(len(algorithm.cache.get_table(Schedule)), 8)
+
+    def test_unseeded_islands_differ(self):
+        """Sem `random_seed`, cada ilha, época e execução tem a sua semente, e as populações iniciais diferem."""
+        self.configure(random_seed=None)
+        optimizer = IslandOptimizer(cache=self.cache)
+        seeds = [optimizer.island_seed(island, epoch) for epoch in range(2) for island in range(3)]
+        self.assertEqual(len(set(seeds)), len(seeds))
+        self.assertEqual(optimizer.island_seed(0, 0), seeds[0])
+        self.assertNotEqual(IslandOptimizer(cache=self.cache).island_seed(0, 0), seeds[0])
+
+        populations = []
+        for seed in seeds[:2]:
+            # o estado aleatório que todos os processos das ilhas herdam do pai
+            np.random.seed(0)
+            random.seed(0)
+            ga_instance = optimizer.build_ga(optimizer.batch_fitness_function(), random_seed=seed)
+            populations.append(ga_instance.initial_population.tolist())
+        self.assertNotEqual(populations[0], populations[1])
+
+
+
+class TestEngines(SmallInstanceTestCase):
+    def test_move(self):
+        """Um movimento troca um só gene por outro valor dentro do `gene_space`; genes fixos nunca mudam."""
+        gene_space = [{"low": 0, "high": 2}, {"low": 0, "high": 0}, {"low": 0, "high": 1}]
+        engine = Engine(None, gene_space, StopCriteria(), 10, seed=1)
+        for _ in range(50):
+            i, value = engine.move([1, 0, 1])
+            self.assertIn(i, (0, 2))
+            self.assertNotEqual(value, [1, 0, 1][i])
+            self.assertTrue(0 <= value <= gene_space[i]["high"])
+
+    def test_search(self):
+        """Os motores acham o ótimo de um problema separável e respeitam o limite de avaliações."""
+        target = [3, 0, 2, 1, 3, 2]
+        gene_space = [{"low": 0, "high": 3} for _ in target]
+
+        def fitness_func(ga_instance, solutions, solutions_idx):
+            return [-sum(abs(a - b) for a, b in zip(solution, target)) for solution in solutions]
+
+        for name, engine_class in ENGINES.items():
+            with self.subTest(engine=name):
+                engine = engine_class(fitness_func, gene_space, StopCriteria(lower_bound=0), 1000, seed=1)
+                genome, fitness = engine.search([0] * len(target))
+                self.assertEqual((genome, fitness), (target, 0))
+                self.assertEqual(engine.criteria.reason, "lower_bound")
+
+                engine = engine_class(fitness_func, gene_space, StopCriteria(), 30, seed=1)
+                engine.search([0] * len(target))
+                self.assertEqual(engine.criteria.reason, "evaluations")
+                self.assertLess(engine.evaluated, 30 + DefaultConfig.tabu_neighbours)
+
+    def test_run_engine(self):
+        """`DefaultConfig.engine` troca o algoritmo genético; a busca nunca piora o genoma de partida."""
+        self.configure(random_seed=1, engine_evaluations=40)
+        for name in ENGINES:
+            with self.subTest(engine=name), configured(engine=name):
+                optimizer = Optimizer(cache=self.cache)
+                start = optimizer.start_genome()
+                solution = optimizer.run()
+
+                fitness = optimizer.batch_fitness_function()(None, [start, solution], None)
+                self.assertGreaterEqual(fitness[1], fitness[0])
+                algorithm = Algorithm(optimizer.solver.mobile_surgeries, copy(self.cache), optimizer.zero_time)
+                algorithm.execute(solution)
+                self.assertEqual(len(algorithm.cache.get_table(Schedule)), 8)
+
+    def test_polish(self):
+        """Com `polish_engine`, a solução do algoritmo genético é refinada sem piorar."""
+        self.configure(random_seed=1, num_generations=2, engine_evaluations=40)
+        ga_solution = Optimizer(cache=self.cache).run()
+        self.configure(polish_engine="tabu")
+        optimizer = Optimizer(cache=self.cache)
+        solution = optimizer.run()
+
+        fitness = optimizer.batch_fitness_function()(None, [list(ga_solution), solution], None)
+        self.assertGreaterEqual(fitness[1], fitness[0])
+        self.assertIn(optimizer.stop_reason, ("evaluations", "lower_bound"))
+
+
+class TestCheckpoint(SmallInstanceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "optimizer.ckpt")
+        self.configure(random_seed=1, num_generations=4, stop_at_lower_bound=False, fitness_cache_size=0)
+
+    def test_resume(self):
+        """Uma execução interrompida e retomada do checkpoint chega ao mesmo genoma que a execução inteira."""
+        zero_time = datetime.now()
+        expected = Optimizer(cache=self.cache, zero_time=zero_time).run()
+
+        on_generation = StopCriteria.on_generation
+
+        def killed(criteria, ga_instance):
+            if ga_instance.generations_completed == 3:
+                raise RuntimeError("killed")
+            return on_generation(criteria, ga_instance)
+
+        self.configure(checkpoint_path=self.path, checkpoint_interval=2)
+        with patch.object(StopCriteria, "on_generation", killed):
+            Optimizer(cache=self.cache, zero_time=zero_time).run()
+        with open(self.path, "rb") as file:
+            self.assertEqual(pickle.load(file).generations, 2)
+
+        generations = []
+
+        def resumed(criteria, ga_instance):
+            generations.append(ga_instance.generations_completed)
+            return on_generation(criteria, ga_instance)
+
+        optimizer = Optimizer(cache=self.cache, zero_time=zero_time)
+        with patch.object(StopCriteria, "on_generation", resumed):
+            solution = optimizer.run()
+        self.assertEqual(generations, [3, 4])
+        self.assertEqual(list(solution), list(expected))
+        self.assertEqual(optimizer.generations_run, 4)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_other_instance(self):
+        """Um checkpoint de outra instância, ou um arquivo inválido, é ignorado."""
+        Checkpoint("other", 2, [[0]], [0.0], np.random.get_state(), random.getstate()).save(self.path)
+        self.assertIsNone(Checkpoint.load(self.path, "instance"))
+        self.assertIsNotNone(Checkpoint.load(self.path, "other"))
+        with open(self.path, "wb") as file:
+            file.write(b"truncated")
+        self.assertIsNone(Checkpoint.load(self.path, "other"))
+        self.assertIsNone(Checkpoint.load(os.path.join(self.directory.name, "missing"), "other"))
+
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.session = setup_test_session()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_generate_instance(self):
+        """A instância gerada respeita o que o algoritmo exige e os parâmetros pedidos."""
+        zero_time = datetime(2024, 1, 1, 8)
+        generate_instance(self.session, 40, 6, 4, eligibility=0.3, fixed_ratio=0.25, room_restriction_ratio=0.5,
+                          zero_time=zero_time, seed=3)
+        self.session.commit()
+        cache = CacheInDict(session=self.session)
+
+        self.assertEqual((len(cache.get_table(Surgery)), len(cache.get_table(Team)), len(cache.get_table(Room))),
+                         (40, 6, 4))
+        for surgery in cache.get_table(Surgery):
+            self.assertTrue(cache.get_by_attribute(SurgeryPossibleTeams, "surgery_id", surgery.id))
+            self.assertTrue(cache.get_by_attribute(SurgeryPossibleRooms, "surgery_id", surgery.id))
+        for team in cache.get_table(Team):
+            self.assertTrue(cache.get_by_attribute(SurgeryPossibleTeams, "team_id", team.id))
+        for room in cache.get_table(Room):
+            self.assertTrue(cache.get_by_attribute(SurgeryPossibleRooms, "room_id", room.id))
+        self.assertLess(len(cache.get_table(SurgeryPossibleRooms)), 40 * 4)
+
+        fixed = sorted(cache.get_table(Schedule), key=lambda schedule: schedule.start_time)
+        self.assertEqual(len(fixed), 10)
+        for previous, schedule in zip(fixed, fixed[1:]):
+            end = previous.start_time + timedelta(minutes=cache.get_by_id(Surgery, previous.surgery_id).duration)
+            self.assertGreaterEqual(schedule.start_time, end)
+        self.assertTrue(all(schedule.fixed and schedule.start_time > zero_time for schedule in fixed))
+
+        other = instance_cache(40, 6, 4, eligibility=0.3, fixed_ratio=0.25, room_restriction_ratio=0.5,
+                               zero_time=zero_time, seed=3)
+        self.assertEqual([surgery.duration for surgery in other.get_table(Surgery)],
+                         [surgery.duration for surgery in cache.get_table(Surgery)])
+        self.assertEqual(len(other.get_table(SurgeryPossibleTeams)), len(cache.get_table(SurgeryPossibleTeams)))
+
+    def test_report(self):
+        """O relatório tem uma medição por benchmark e combinação de features e as curvas de escala."""
+        args = parse_args(["--sizes", "8", "12", "--budget", "0", "--generations", "1", "--optimizer-max-size", "8",
+                           "--no-memory"])
+        report = Benchmark(args).run()
+
+        self.assertEqual(len(report["runs"]), 2 * len(feature_sets()) * 2 + len(feature_sets()))
+        for run in report["runs"]:
+            rate = run.get("decodes_per_second", run.get("evaluations_per_second"))
+            self.assertGreater(rate, 0)
+            self.assertIsNone(run["peak_memory_mb"])
+        self.assertEqual(report["scaling"]["decode/FixedSchedules"]["surgeries"], [8, 12])
+        self.assertIsInstance(report["scaling"]["decode/FixedSchedules"]["exponent"], float)
+        self.assertIsNone(report["scaling"]["optimizer"]["exponent"])
+        self.assertEqual(json.loads(json.dumps(report)), report)